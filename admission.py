@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 공급자/모델 버전별 기본 한도
+#   concurrency: 동시에 진행할 수 있는 호출 수 (0이면 제한 없음)
+#   rate/burst: 초당 호출 수와 순간 허용량 (토큰 버킷, rate 0이면 제한 없음)
+# 'replicate:<version id>' 로 모델 버전별 한도를, 'replicate:*' 로 버전별 기본 한도를 지정
+DEFAULT_LIMITS = {
+    "openai": {"concurrency": 8, "rate": 5, "burst": 10},
+    "replicate": {"concurrency": 8, "rate": 5, "burst": 10},
+}
+ADMISSION_LIMITS = json.loads(os.getenv('ADMISSION_LIMITS', json.dumps(DEFAULT_LIMITS)))
+
+# 대기 중인 잡이 이 수를 넘으면 새 요청을 429로 거절 (0이면 제한 없음)
+ADMISSION_MAX_QUEUED = int(os.getenv('ADMISSION_MAX_QUEUED', 100))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 30))
+ADMISSION_ACQUIRE_TIMEOUT = float(os.getenv('ADMISSION_ACQUIRE_TIMEOUT', 600))
+
+# 런타임에 바꾼 한도를 저장하는 파일 (API와 워커 프로세스가 공유하고, 바뀌면 다시 읽음)
+ADMISSION_LIMITS_PATH = os.getenv('ADMISSION_LIMITS_PATH', './data/admission_limits.json')
+ADMISSION_RELOAD_INTERVAL = float(os.getenv('ADMISSION_RELOAD_INTERVAL', 1))
+
+# 한도는 공급자 계정 전체 기준이지만 Limiter는 프로세스 안에만 있음 (프로세스끼리 조율하지 않음).
+# 한도를 쓰는 프로세스(워커 + 임베디드 워커를 켠 API) 수를 지정하면 프로세스마다 1/N씩 나눠 가져서 합이 계정 한도를 넘지 않음
+ADMISSION_PROCESS_COUNT = max(1, int(os.getenv('ADMISSION_PROCESS_COUNT', 1)))
+
+LIMIT_FIELDS = ("concurrency", "rate", "burst")
+
+
+class AdmissionTimeoutError(RuntimeError):
+    pass
+
+
+class Limiter:
+    # 동시 실행 수 제한 + 토큰 버킷. 한도는 실행 중에도 바꿀 수 있다.
+
+    def __init__(self, name: str, concurrency: int = 0, rate: float = 0, burst: int = 1):
+        self.name = name
+        self.in_use = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self.configure(concurrency, rate, burst)
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+
+    def configure(self, concurrency: int = 0, rate: float = 0, burst: int = 1):
+        with self._cond:
+            self.concurrency = max(0, int(concurrency))
+            self.rate = max(0.0, float(rate))
+            self.burst = max(1, int(burst))
+            self._tokens = min(getattr(self, '_tokens', self.burst), self.burst)
+            self._cond.notify_all()
+
+    def _take_token(self) -> float:
+        # 토큰을 가져가면 0, 아니면 다음 토큰까지 기다릴 시간
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline: float):
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.concurrency and self.in_use >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionTimeoutError(f"Timed out waiting for a {self.name} slot")
+                    self._cond.wait(remaining)
+                self.in_use += 1
+            finally:
+                self.waiting -= 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._take_token()
+                if not wait:
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise AdmissionTimeoutError(f"Timed out waiting for {self.name} rate limit")
+                time.sleep(wait)
+        except Exception:
+            self.release()
+            raise
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {"concurrency": self.concurrency, "rate": self.rate, "burst": self.burst,
+                    "inUse": self.in_use, "waiting": self.waiting}
+
+
+class AdmissionController:
+    # 공급자/모델 버전별 Limiter 모음과 API 측 대기열 상한
+
+    def __init__(self, limits: dict = ADMISSION_LIMITS, max_queued: int = ADMISSION_MAX_QUEUED,
+                 path: str = ADMISSION_LIMITS_PATH, process_count: int = ADMISSION_PROCESS_COUNT):
+        self.path = path
+        self.process_count = max(1, process_count)
+        self.limits = {key: dict(value) for key, value in limits.items()}
+        self.max_queued = max_queued
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._reload()
+
+    def _resolve(self, key: str) -> dict:
+        # 정확한 키 → 'provider:*' 기본값 → 제한 없음
+        if key in self.limits:
+            return self.limits[key]
+        return self.limits.get(f"{key.split(':', 1)[0]}:*", {}) if ':' in key else {}
+
+    def _share(self, key: str) -> dict:
+        # 계정 한도 중 이 프로세스 몫 (동시 실행 수와 burst는 최소 1은 남김)
+        limits = self._resolve(key)
+        count = self.process_count
+        share = {}
+        if limits.get("concurrency"):
+            share["concurrency"] = max(1, int(limits["concurrency"]) // count)
+        if limits.get("rate"):
+            share["rate"] = float(limits["rate"]) / count
+        if "burst" in limits:
+            share["burst"] = max(1, int(limits["burst"]) // count)
+        return share
+
+    def limiter(self, key: str) -> Limiter:
+        self._reload_if_changed()
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = Limiter(key, **self._share(key))
+            return limiter
+
+    @contextmanager
+    def limit(self, *keys: str, timeout: float = ADMISSION_ACQUIRE_TIMEOUT):
+        # 항상 넘겨받은 순서(세부 키 → 공급자 키)로 잡아서 교착을 피함
+        deadline = time.monotonic() + timeout
+        started = time.monotonic()
+        acquired = []
+        try:
+            for key in keys:
+                limiter = self.limiter(key)
+                limiter.acquire(deadline)
+                acquired.append(limiter)
+            metrics.observe(f"admission_{keys[-1].split(':', 1)[0]}", time.monotonic() - started)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    def update(self, limits: Optional[dict] = None, max_queued: Optional[int] = None):
+        # 런타임 한도 변경: 검증 후 파일에 저장하고 현재 프로세스에 바로 적용
+        with self._lock:
+            merged = {key: dict(value) for key, value in self.limits.items()}
+            for key, value in (limits or {}).items():
+                if value is None:
+                    merged.pop(key, None)
+                    continue
+                unknown = set(value) - set(LIMIT_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unknown limit fields for {key}: {sorted(unknown)}")
+                merged[key] = {**merged.get(key, {}), **{field: float(value[field]) if field == 'rate' else int(value[field])
+                                                         for field in value}}
+            data = {"limits": merged, "maxQueued": self.max_queued if max_queued is None else int(max_queued)}
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        self._reload()
+        logging.info(f"Admission limits updated: {data}")
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < ADMISSION_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading admission limits from {self.path}: {e}")
+            return
+        with self._lock:
+            self._loaded_mtime = mtime
+            self.limits = data.get("limits", self.limits)
+            self.max_queued = data.get("maxQueued", self.max_queued)
+            for key, limiter in self._limiters.items():
+                limiter.configure(**self._share(key))
+
+    def queue_full(self, depth: int) -> bool:
+        self._reload_if_changed()
+        return bool(self.max_queued) and depth >= self.max_queued
+
+    def snapshot(self) -> dict:
+        self._reload_if_changed()
+        with self._lock:
+            limiters = dict(self._limiters)
+            limits = dict(self.limits)
+        return {
+            "maxQueued": self.max_queued,
+            "processCount": self.process_count,
+            "limits": limits,
+            "limiters": {key: limiter.snapshot() for key, limiter in limiters.items()},
+        }
+
+
+# 프로세스 전체에서 공유하는 컨트롤러
+controller = AdmissionController()
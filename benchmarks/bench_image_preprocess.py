@@ -0,0 +1,76 @@
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import image_preprocess
+
+
+# 비전 호출 전 이미지 정규화의 효과 측정 (페이로드 크기, 전처리 시간, 선택적으로 GPT 지연시간)
+#   python benchmarks/bench_image_preprocess.py photo1.jpg photo2.png
+#   python benchmarks/bench_image_preprocess.py --call-gpt photo.jpg   (OPENAI_KEY 필요, 과금 발생)
+# 이미지를 주지 않으면 4032x3024 합성 이미지(휴대폰 사진 크기)로 측정한다.
+
+
+def synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    img = Image.effect_noise((width, height), 64).convert('RGB')
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=95)
+    return output.getvalue()
+
+
+def measure(data: bytes, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        normalized, mime_type = image_preprocess.normalize_image(data)
+        timings.append(time.perf_counter() - started)
+    return {
+        "raw_bytes": len(data),
+        "raw_base64_bytes": len(base64.b64encode(data)),
+        "normalized_bytes": len(normalized),
+        "normalized_base64_bytes": len(base64.b64encode(normalized)),
+        "mime_type": mime_type,
+        "reduction": 1 - len(normalized) / len(data),
+        "preprocess_ms_p50": statistics.median(timings) * 1000,
+        "preprocess_ms_max": max(timings) * 1000,
+    }, normalized, mime_type
+
+
+def gpt_latency(data: bytes, mime_type: str) -> float:
+    import extract_profile
+
+    prompt = "Describe the person's hairstyle in one sentence."
+    started = time.perf_counter()
+    extract_profile.request_gpt_response(prompt, base64.b64encode(data).decode('utf-8'), mime_type)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--call-gpt', action='store_true')
+    args = parser.parse_args()
+
+    inputs = [(path, open(path, 'rb').read()) for path in args.images] or [("synthetic-4032x3024.jpg", synthetic_photo())]
+    report = {}
+    for name, data in inputs:
+        result, normalized, mime_type = measure(data, args.runs)
+        if args.call_gpt:
+            result["gpt_seconds_raw"] = gpt_latency(data, 'image/jpeg')
+            result["gpt_seconds_normalized"] = gpt_latency(normalized, mime_type)
+        report[name] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
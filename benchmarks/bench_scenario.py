@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import make_scenario
+
+
+# structured / chained 시나리오 생성 모드의 지연시간과 토큰 사용량 비교
+#   python benchmarks/bench_scenario.py --runs 5
+# OPENAI_BASE_URL을 가짜 서버로 지정하면 과금 없이 실행할 수 있다.
+
+SAMPLE_DIARY = (
+    "오늘은 아침 일찍 일어나서 한강 공원으로 자전거를 타러 갔다. "
+    "점심에는 친구와 편의점 라면을 먹었고, 오후에는 카페에서 책을 읽었다. "
+    "저녁에는 노을을 보며 집으로 돌아왔다."
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['structured', 'chained'])
+    parser.add_argument('--diary', default=SAMPLE_DIARY)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        for _ in range(args.runs):
+            make_scenario.get_gpt_response('bench', args.diary, mode=mode)
+
+    report = {}
+    for mode, stats in make_scenario.get_scenario_stats().items():
+        if not stats["calls"]:
+            continue
+        report[mode] = dict(
+            stats,
+            avg_seconds=stats["seconds"] / stats["calls"],
+            avg_prompt_tokens=stats["prompt_tokens"] / stats["calls"],
+            avg_completion_tokens=stats["completion_tokens"] / stats["calls"],
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
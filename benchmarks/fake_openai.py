@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+# 오프라인 테스트용 가짜 OpenAI chat completions 서버
+#   uvicorn benchmarks.fake_openai:app --port 5102
+# 후 OPENAI_BASE_URL=http://localhost:5102/v1 로 실행하면 과금 없이 GPT 호출을 재현할 수 있다.
+
+FAKE_OPENAI_LATENCY = float(os.getenv('FAKE_OPENAI_LATENCY', 1.0))  # 응답 1건 처리 시간(초)
+FAKE_OPENAI_JITTER = float(os.getenv('FAKE_OPENAI_JITTER', 0.2))
+FAKE_OPENAI_FAILURE_RATE = float(os.getenv('FAKE_OPENAI_FAILURE_RATE', 0.0))
+# stream=true 요청: 첫 토큰까지 걸리는 시간 비율 (나머지 시간 동안 내용을 나눠서 전송)
+FAKE_OPENAI_FIRST_TOKEN_RATIO = float(os.getenv('FAKE_OPENAI_FIRST_TOKEN_RATIO', 0.1))
+FAKE_OPENAI_STREAM_CHUNK = 16  # 청크 하나에 담을 글자 수
+
+CHARACTER_INFO = {
+    "gender": "female",
+    "age_group": "adult",
+    "face_shape": "oval",
+    "hairstyle": {"length": "long", "color": "black", "texture": "straight", "shape": "layered", "parting": "side"},
+}
+
+app = FastAPI()
+
+stats = {"requests": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _scene(n: int) -> dict:
+    return {"scene": f"The character is doing moment {n} of the diary.", "background": f"A quiet place, scene {n}."}
+
+
+def _content(body: dict) -> str:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps({"scenes": [_scene(n) for n in range(1, 5)]})
+    last = body["messages"][-1]["content"]
+    if isinstance(last, list):
+        # 비전 호출 (캐릭터 특징 추출)
+        return json.dumps(CHARACTER_INFO)
+    return f"Scene:\n\tThe character is doing {last}.\nBackground:\n\tA quiet place."
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+async def _stream(body: dict, content: str, latency: float, prompt_tokens: int, completion_tokens: int):
+    # 첫 토큰 이후 남은 시간 동안 내용을 조금씩 나눠서 SSE로 전송 (실제 API처럼 앞 장면이 먼저 도착)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    pieces = [content[i:i + FAKE_OPENAI_STREAM_CHUNK] for i in range(0, len(content), FAKE_OPENAI_STREAM_CHUNK)]
+    interval = latency * (1 - FAKE_OPENAI_FIRST_TOKEN_RATIO) / max(1, len(pieces))
+
+    def chunk(choices: list, usage=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id, "object": "chat.completion.chunk", "created": created,
+            "model": body.get("model"), "choices": choices, "usage": usage,
+        }) + "\n\n"
+
+    await asyncio.sleep(latency * FAKE_OPENAI_FIRST_TOKEN_RATIO)
+    yield chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None, "logprobs": None}])
+    for piece in pieces:
+        yield chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None, "logprobs": None}])
+        await asyncio.sleep(interval)
+    yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}])
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield chunk([], _usage(prompt_tokens, completion_tokens))
+    yield "data: [DONE]\n\n"
+
+
+@app.post('/v1/chat/completions')
+async def chat_completions(body: dict = Body(...)):
+    stats["requests"] += 1
+    latency = max(0.0, FAKE_OPENAI_LATENCY + random.uniform(-FAKE_OPENAI_JITTER, FAKE_OPENAI_JITTER))
+    if random.random() < FAKE_OPENAI_FAILURE_RATE:
+        await asyncio.sleep(latency)
+        stats["failures"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Fake failure", "type": "server_error"}})
+
+    content = _content(body)
+    prompt_tokens = sum(len(json.dumps(message.get("content", ""))) for message in body["messages"]) // 4
+    completion_tokens = len(content) // 4
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, content, latency, prompt_tokens, completion_tokens), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": _usage(prompt_tokens, completion_tokens),
+    }
+
+
+@app.get('/_stats')
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 5102)), log_level="warning")
@@ -0,0 +1,182 @@
+import asyncio
+import base64
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import FastAPI, Body, Response
+from fastapi.responses import JSONResponse
+
+
+# 오프라인 테스트용 가짜 Replicate 서버
+#   uvicorn benchmarks.fake_replicate:app --port 5101
+# 후 REPLICATE_BASE_URL=http://localhost:5101 로 실행하면 실제 과금 없이 예측 흐름을 재현할 수 있다.
+
+FAKE_REPLICATE_LATENCY = float(os.getenv('FAKE_REPLICATE_LATENCY', 2.0))  # 예측 1건 처리 시간(초)
+FAKE_REPLICATE_JITTER = float(os.getenv('FAKE_REPLICATE_JITTER', 0.5))  # 처리 시간 편차(초)
+FAKE_REPLICATE_FAILURE_RATE = float(os.getenv('FAKE_REPLICATE_FAILURE_RATE', 0.0))
+# 콜드 워커 재현: 이 비율의 예측은 starting 상태로 FAKE_REPLICATE_SLOW_EXTRA초 더 머문 뒤 실행됨
+FAKE_REPLICATE_SLOW_RATE = float(os.getenv('FAKE_REPLICATE_SLOW_RATE', 0.0))
+FAKE_REPLICATE_SLOW_EXTRA = float(os.getenv('FAKE_REPLICATE_SLOW_EXTRA', 10.0))
+FAKE_REPLICATE_PUBLIC_URL = os.getenv('FAKE_REPLICATE_PUBLIC_URL', 'http://localhost:5101')
+
+# 1x1 WebP 이미지
+WEBP_BYTES = base64.b64decode("UklGRiQAAABXRUJQVlA4IBgAAAAwAQCdASoBAAEAAwA0JaQAA3AA/vuUAAA=")
+
+app = FastAPI()
+
+predictions = {}
+stats = {"created": 0, "polled": 0, "canceled": 0, "webhooks": 0, "model_lookups": 0, "version_lookups": 0}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _advance(prediction: dict) -> dict:
+    # 경과 시간에 따라 상태를 진행시킨다
+    state = prediction["_state"]
+    if prediction["status"] in ("succeeded", "failed", "canceled"):
+        return prediction
+    elapsed = time.monotonic() - state["created"]
+    if elapsed >= state["duration"]:
+        if state["fail"]:
+            prediction["status"] = "failed"
+            prediction["error"] = "Fake prediction failure"
+        else:
+            prediction["status"] = "succeeded"
+            prediction["output"] = [f"{FAKE_REPLICATE_PUBLIC_URL}/files/{prediction['id']}.webp"]
+        prediction["logs"] = f"Using seed: {state['seed']}\n"
+        prediction["completed_at"] = _now()
+    elif elapsed >= state["boot"] + min(0.1, state["duration"] - state["boot"]):
+        prediction["status"] = "processing"
+        prediction["started_at"] = prediction["started_at"] or _now()
+    return prediction
+
+
+def _public(prediction: dict) -> dict:
+    return {k: v for k, v in prediction.items() if not k.startswith("_")}
+
+
+async def _deliver_webhook(prediction_id: str):
+    prediction = predictions[prediction_id]
+    await asyncio.sleep(max(0.0, prediction["_state"]["duration"] - (time.monotonic() - prediction["_state"]["created"])))
+    _advance(prediction)
+    if prediction["status"] not in ("succeeded", "failed", "canceled"):
+        return
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            await client.post(prediction["_state"]["webhook"], json=_public(prediction))
+        stats["webhooks"] += 1
+    except Exception as e:
+        logging.error(f"Fake webhook delivery failed: {e}")
+
+
+@app.post('/v1/predictions', status_code=201)
+async def create_prediction(body: dict = Body(...)):
+    prediction_id = uuid.uuid4().hex
+    inputs = body.get("input", {})
+    seed = inputs.get("seed") or random.randint(1, 2 ** 31)
+    duration = max(0.0, FAKE_REPLICATE_LATENCY + random.uniform(-FAKE_REPLICATE_JITTER, FAKE_REPLICATE_JITTER))
+    boot = FAKE_REPLICATE_SLOW_EXTRA if random.random() < FAKE_REPLICATE_SLOW_RATE else 0.0
+    duration += boot
+    prediction = {
+        "id": prediction_id,
+        "version": body.get("version"),
+        "input": inputs,
+        "status": "starting",
+        "output": None,
+        "error": None,
+        "logs": "",
+        "created_at": _now(),
+        "started_at": None,
+        "completed_at": None,
+        "urls": {
+            "get": f"{FAKE_REPLICATE_PUBLIC_URL}/v1/predictions/{prediction_id}",
+            "cancel": f"{FAKE_REPLICATE_PUBLIC_URL}/v1/predictions/{prediction_id}/cancel",
+        },
+        "_state": {
+            "created": time.monotonic(),
+            "duration": duration,
+            "boot": boot,
+            "seed": seed,
+            "fail": random.random() < FAKE_REPLICATE_FAILURE_RATE,
+            "webhook": body.get("webhook"),
+        },
+    }
+    predictions[prediction_id] = prediction
+    stats["created"] += 1
+    if body.get("webhook"):
+        asyncio.create_task(_deliver_webhook(prediction_id))
+    return _public(prediction)
+
+
+@app.get('/v1/predictions/{prediction_id}')
+async def get_prediction(prediction_id: str):
+    prediction = predictions.get(prediction_id)
+    if prediction is None:
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    stats["polled"] += 1
+    return _public(_advance(prediction))
+
+
+@app.post('/v1/predictions/{prediction_id}/cancel')
+async def cancel_prediction(prediction_id: str):
+    prediction = predictions.get(prediction_id)
+    if prediction is None:
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    _advance(prediction)
+    if prediction["status"] not in ("succeeded", "failed", "canceled"):
+        prediction["status"] = "canceled"
+        prediction["completed_at"] = _now()
+        stats["canceled"] += 1
+    return _public(prediction)
+
+
+@app.get('/v1/models/{owner}/{name}')
+async def get_model(owner: str, name: str):
+    stats["model_lookups"] += 1
+    return {
+        "url": f"https://replicate.com/{owner}/{name}",
+        "owner": owner,
+        "name": name,
+        "description": "Fake model",
+        "visibility": "private",
+        "github_url": None,
+        "paper_url": None,
+        "license_url": None,
+        "run_count": 0,
+        "cover_image_url": None,
+        "default_example": None,
+        "latest_version": None,
+    }
+
+
+@app.get('/v1/models/{owner}/{name}/versions/{version_id}')
+async def get_version(owner: str, name: str, version_id: str):
+    stats["version_lookups"] += 1
+    return {
+        "id": version_id,
+        "created_at": "2024-01-01T00:00:00Z",
+        "cog_version": "0.9.0",
+        "openapi_schema": {},
+    }
+
+
+@app.get('/files/{filename}')
+async def get_file(filename: str):
+    return Response(content=WEBP_BYTES, media_type="image/webp")
+
+
+@app.get('/_stats')
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 5101)), log_level="warning")
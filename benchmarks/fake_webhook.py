@@ -0,0 +1,45 @@
+import asyncio
+import os
+import random
+import time
+
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse
+
+
+# 백엔드 웹훅 수신기 대역 (apiDomainUrl로 지정)
+#   uvicorn benchmarks.fake_webhook:app --port 5104
+
+FAKE_WEBHOOK_LATENCY = float(os.getenv('FAKE_WEBHOOK_LATENCY', 0.05))
+FAKE_WEBHOOK_FAILURE_RATE = float(os.getenv('FAKE_WEBHOOK_FAILURE_RATE', 0.0))
+
+app = FastAPI()
+
+received = []
+stats = {"requests": 0, "failures": 0}
+
+
+@app.post('/api/v1/webhook/ai/{kind:path}')
+async def receive(kind: str, body=Body(...)):
+    stats["requests"] += 1
+    await asyncio.sleep(FAKE_WEBHOOK_LATENCY)
+    if random.random() < FAKE_WEBHOOK_FAILURE_RATE:
+        stats["failures"] += 1
+        return JSONResponse(status_code=503, content={"message": "Fake failure"})
+    received.append({"kind": kind, "receivedAt": time.time(), "body": body})
+    return {"message": "ok"}
+
+
+@app.get('/_received')
+async def get_received():
+    return received
+
+
+@app.get('/_stats')
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 5104)), log_level="warning")
@@ -0,0 +1,281 @@
+import argparse
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, 'benchmarks', 'results', 'history.jsonl')
+
+# 실제 FastAPI 앱을 가짜 OpenAI / Replicate / S3(moto) / 웹훅 수신기에 붙여 부하를 거는 벤치마크
+#   python benchmarks/run_load.py --concurrency 1 4 16 --jobs 20
+# 결과는 benchmarks/results/history.jsonl 에 쌓이고, 같은 설정의 직전 실행과 비교해 출력한다.
+# 추가 의존성: pip install -r benchmarks/requirements.txt
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--kind', choices=['webtoon', 'profile'], default='webtoon')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--jobs', type=int, default=20, help='jobs per concurrency level')
+    parser.add_argument('--openai-latency', type=float, default=1.0)
+    parser.add_argument('--replicate-latency', type=float, default=3.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='failure rate for every fake backend')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of Replicate predictions that hit a slow worker')
+    parser.add_argument('--slow-extra', type=float, default=10.0, help='extra seconds a slow Replicate prediction takes')
+    parser.add_argument('--worker-concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=300, help='per-job timeout in seconds')
+    parser.add_argument('--base-port', type=int, default=5100)
+    parser.add_argument('--label', default='', help='free-form label stored with the results')
+    parser.add_argument('--regression-threshold', type=float, default=0.1)
+    return parser.parse_args()
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def peak_rss_mb(pid: int) -> float:
+    # Linux 전용: 프로세스의 최대 RSS(VmHWM)
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def sample_image() -> bytes:
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.effect_noise((1200, 1600), 64).convert('RGB').save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    args = parse_args()
+    ports = {name: args.base_port + offset for offset, name in enumerate(['app', 'replicate', 'openai', 's3', 'webhook'])}
+
+    # 가짜 서버 모듈은 import 시점에 환경 변수를 읽으므로 먼저 설정
+    os.environ.update(
+        FAKE_REPLICATE_LATENCY=str(args.replicate_latency),
+        FAKE_REPLICATE_JITTER=str(args.replicate_latency * 0.3),
+        FAKE_REPLICATE_FAILURE_RATE=str(args.failure_rate),
+        FAKE_REPLICATE_SLOW_RATE=str(args.slow_rate),
+        FAKE_REPLICATE_SLOW_EXTRA=str(args.slow_extra),
+        FAKE_REPLICATE_PUBLIC_URL=f"http://127.0.0.1:{ports['replicate']}",
+        FAKE_OPENAI_LATENCY=str(args.openai_latency),
+        FAKE_OPENAI_JITTER=str(args.openai_latency * 0.2),
+        FAKE_OPENAI_FAILURE_RATE=str(args.failure_rate),
+        FAKE_WEBHOOK_FAILURE_RATE=str(args.failure_rate),
+    )
+    sys.path.insert(0, ROOT)
+    from benchmarks import fake_openai, fake_replicate, fake_webhook
+    from moto.server import ThreadedMotoServer
+
+    start_server(fake_replicate.app, ports['replicate'])
+    start_server(fake_openai.app, ports['openai'])
+    start_server(fake_webhook.app, ports['webhook'])
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    moto = ThreadedMotoServer(ip_address='127.0.0.1', port=ports['s3'], verbose=False)
+    moto.start()
+
+    bucket = 'bench-bucket'
+    s3_endpoint = f"http://127.0.0.1:{ports['s3']}"
+    aws_env = dict(AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench', AWS_REGION='ap-northeast-2',
+                   AWS_DEFAULT_REGION='ap-northeast-2', AWS_ENDPOINT_URL=s3_endpoint)
+    requests.put(f"{s3_endpoint}/{bucket}", timeout=5)
+
+    workdir = tempfile.mkdtemp(prefix='ai-image-bench-')
+    env = dict(
+        os.environ,
+        **aws_env,
+        PYTHONPATH=ROOT,
+        OPENAI_KEY='bench',
+        OPENAI_BASE_URL=f"http://127.0.0.1:{ports['openai']}/v1",
+        REPLICATE_API_TOKEN='bench',
+        REPLICATE_BASE_URL=f"http://127.0.0.1:{ports['replicate']}",
+        BUCKET_NAME=bucket,
+        JOB_QUEUE_PATH=os.path.join(workdir, 'jobs.db'),
+        LLM_CACHE_PATH=os.path.join(workdir, 'llm_cache.db'),
+        UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+        WORKER_CONCURRENCY=str(args.worker_concurrency),
+        JOB_POLL_INTERVAL='0.05',
+    )
+    app_url = f"http://127.0.0.1:{ports['app']}"
+    app_process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(ports['app']), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    image = sample_image() if args.kind == 'profile' else None
+    webhook = f"127.0.0.1:{ports['webhook']}"
+
+    try:
+        wait_ready(f"{app_url}/docs")
+        levels = []
+        for concurrency in args.concurrency:
+            levels.append(run_level(args, concurrency, app_url, webhook, image, fake_webhook.received, app_process.pid))
+            print(json.dumps(levels[-1]))
+    finally:
+        app_process.terminate()
+        app_process.wait(timeout=30)
+        moto.stop()
+
+    record = {
+        "timestamp": time.time(),
+        "revision": git_revision(),
+        "label": args.label,
+        "config": {
+            "kind": args.kind,
+            "jobs": args.jobs,
+            "openai_latency": args.openai_latency,
+            "replicate_latency": args.replicate_latency,
+            "failure_rate": args.failure_rate,
+            "slow_rate": args.slow_rate,
+            "slow_extra": args.slow_extra,
+            "worker_concurrency": args.worker_concurrency,
+        },
+        "levels": levels,
+    }
+    compare_with_previous(record, args.regression_threshold)
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'a') as results:
+        results.write(json.dumps(record) + '\n')
+
+
+def run_level(args, concurrency: int, app_url: str, webhook: str, image, received: list, app_pid: int) -> dict:
+    # 동시 클라이언트 concurrency개가 잡을 하나씩 제출하고, 웹훅을 받으면 다음 잡을 제출하는 closed-loop 부하
+    lock = threading.Lock()
+    seen = {}
+    cursor = [0]
+
+    def collect():
+        with lock:
+            while cursor[0] < len(received):
+                item = received[cursor[0]]
+                cursor[0] += 1
+                body = item["body"]
+                key = (body.get("memberId"), body.get("date"))
+                seen.setdefault(key, item)
+
+    def one_job(n: int):
+        member_id = f"bench{concurrency}x{n}"
+        date = f"{int(time.time() * 1000)}-{n}"
+        started = time.time()
+        try:
+            if args.kind == 'webtoon':
+                requests.post(f"{app_url}/webtoon", timeout=30, json={
+                    "memberId": member_id, "date": date, "content": f"Benchmark diary {member_id} {date}",
+                    "characterInfo": "black long hair", "seedNum": 42, "characterStyle": "romance",
+                    "apiDomainUrl": webhook,
+                }).raise_for_status()
+                key = (member_id, date)
+            else:
+                requests.post(f"{app_url}/character", timeout=30, data={
+                    "memberId": member_id, "characterStyle": "romance", "apiDomainUrl": webhook,
+                }, files={"userImage": (f"{member_id}.jpg", image + date.encode(), "image/jpeg")}).raise_for_status()
+                key = (member_id, None)
+        except requests.RequestException:
+            return None, False
+
+        deadline = started + args.timeout
+        while time.time() < deadline:
+            collect()
+            with lock:
+                item = seen.get(key)
+            if item:
+                body = item["body"]
+                ok = bool(body.get("webtoonImages")) and len(body["webtoonImages"]) == 4 if args.kind == 'webtoon' \
+                    else bool(body.get("characterProfileImageUrl"))
+                return item["receivedAt"] - started, ok
+            time.sleep(0.02)
+        return None, False
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one_job, range(args.jobs)))
+    elapsed = time.time() - started
+
+    latencies = [latency for latency, ok in outcomes if latency is not None]
+    return {
+        "concurrency": concurrency,
+        "jobs": args.jobs,
+        "completed": len(latencies),
+        "failed": sum(1 for latency, ok in outcomes if not ok),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(app_pid),
+    }
+
+
+def compare_with_previous(record: dict, threshold: float):
+    if not os.path.exists(RESULTS_PATH):
+        return
+    previous = None
+    with open(RESULTS_PATH) as results:
+        for line in results:
+            item = json.loads(line)
+            if item.get("config") == record["config"]:
+                previous = item
+    if previous is None:
+        return
+
+    before = {level["concurrency"]: level for level in previous["levels"]}
+    print(f"Compared with {previous['revision']} ({time.ctime(previous['timestamp'])}):")
+    for level in record["levels"]:
+        old = before.get(level["concurrency"])
+        if not old or not old["p95"]:
+            continue
+        p95_change = level["p95"] / old["p95"] - 1
+        throughput_change = level["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        flag = "  REGRESSION" if p95_change > threshold or throughput_change < -threshold else ""
+        print(f"  c={level['concurrency']}: p95 {old['p95']:.2f}s -> {level['p95']:.2f}s ({p95_change:+.0%}), "
+              f"throughput {old['throughput']:.2f} -> {level['throughput']:.2f} jobs/s ({throughput_change:+.0%}){flag}")
+
+
+if __name__ == "__main__":
+    main()
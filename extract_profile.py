@@ -2,6 +2,12 @@ from dotenv import load_dotenv
 import os
 from openai import OpenAI
 import logging
+import llm_cache
+import admission
+import metrics
+import resilience
+import job_control
+import image_preprocess
 
 # 로컬 개발 환경에서만 .env 파일을 로드
 dotenv_path = '.env'
@@ -19,12 +25,19 @@ if not OPENAI_KEY:
     raise ValueError("OPENAI_KEY is not set. Please set it in the environment variables.")
 
 # OpenAI 클라이언트 생성
+# 재시도는 resilience 모듈이 담당하므로 SDK 자체 재시도는 끔
 client = OpenAI(
-    api_key=OPENAI_KEY
+    api_key=OPENAI_KEY,
+    max_retries=0
 )
 
+PROFILE_MODEL = 'gpt-4o-mini'
+# 프롬프트를 바꾸면 버전을 올려서 이전 캐시를 무효화
+PROMPT_VERSION = 'v3'
 
-def get_gpt_response(user_id, user_img):
+
+@metrics.track('gpt_extraction')
+def get_gpt_response(user_id, user_img, mime_type='image/webp', image_sha256=None):
     prompt = (
         # "You are responsible for extracting features from the user's photos.\n"
         # "The data you extracted is used to create a 2D character profile picture through the RoLA model.\n"
@@ -136,27 +149,41 @@ def get_gpt_response(user_id, user_img):
 
     )
 
-    response = client.chat.completions.create(
-        model='gpt-4o-mini',
-        messages =[
-            {
-                'role': 'system',
-                'content': prompt
-            },
-            {
-                'role': 'user',
-                'content': [
-                    {
-                        'type': 'image_url',
-                        'image_url': {
-                            "url": f"data:image/webp;base64, {user_img}"
-                        }
-                    }
-                ] ,
-            }
-        ],
-        max_tokens=1000,
-        temperature = 0.5,
+    # 같은 이미지를 다시 올린 경우 캐시된 응답 사용 (업로드 시 계산한 원본 해시가 있으면 그 값으로 키 생성)
+    # 원본 해시는 전처리 전 값이라 전처리 설정이 바뀌면 모델이 보는 이미지도 달라지므로 설정을 키에 함께 넣음
+    content = f"{image_sha256}|{image_preprocess.preprocess_key()}" if image_sha256 else user_img
+    gpt = llm_cache.cache.get_or_compute(
+        'extract_profile', content, PROMPT_VERSION, PROFILE_MODEL,
+        lambda: request_gpt_response(prompt, user_img, mime_type),
+        cacheable=bool,
     )
-    gpt = response.choices[0].message.content
     return user_id, gpt
+
+
+def request_gpt_response(prompt, user_img, mime_type='image/webp'):
+    with admission.controller.limit('openai'):
+        response = resilience.openai.call(
+            client.chat.completions.create,
+            model=PROFILE_MODEL,
+            messages =[
+                {
+                    'role': 'system',
+                    'content': prompt
+                },
+                {
+                    'role': 'user',
+                    'content': [
+                        {
+                            'type': 'image_url',
+                            'image_url': {
+                                "url": f"data:{mime_type};base64, {user_img}"
+                            }
+                        }
+                    ] ,
+                }
+            ],
+            max_tokens=1000,
+            temperature = 0.5,
+            timeout=job_control.timeout('gpt_extraction'),
+        )
+    return response.choices[0].message.content
@@ -0,0 +1,147 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from dotenv import load_dotenv
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 커넥션 풀 설정
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 20))  # 풀을 유지할 호스트 수
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 16))  # 호스트당 최대 연결 수
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))  # 비동기 클라이언트 전체 최대 연결 수
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 60))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 60))
+
+
+class ConnectionStats:
+    # 요청 수 대비 새로 연 연결 수로 커넥션 재사용률을 계산
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, client: str, field: str):
+        with self._lock:
+            counts = self._counts.setdefault(client, {"requests": 0, "connections": 0})
+            counts[field] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {client: dict(counts) for client, counts in self._counts.items()}
+        for counts in result.values():
+            requests_count = counts["requests"]
+            counts["reuse_rate"] = max(0.0, 1 - counts["connections"] / requests_count) if requests_count else 0.0
+        return result
+
+
+connection_stats = ConnectionStats()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        connection_stats.record("sync", "connections")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        connection_stats.record("sync", "connections")
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    # 호스트별 커넥션 풀 (pool_block=True로 호스트당 연결 수를 HTTP_POOL_MAXSIZE로 제한)
+
+    def __init__(self):
+        super().__init__(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE, pool_block=True)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    # 모든 잡이 공유하는 동기 세션 (requests.Session은 스레드 간 공유해도 커넥션 풀은 안전)
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = PooledAdapter()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.hooks["response"].append(lambda response, *args, **kwargs: connection_stats.record("sync", "requests"))
+            _session = session
+        return _session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+class CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    # httpcore trace 이벤트로 새 TCP 연결 수를 센다
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                connection_stats.record("async", "connections")
+
+        request.extensions = dict(request.extensions, trace=trace)
+        connection_stats.record("async", "requests")
+        return await super().handle_async_request(request)
+
+
+def create_async_client(**kwargs) -> httpx.AsyncClient:
+    # 비동기 클라이언트는 만든 이벤트 루프에서만 써야 하므로 루프마다 하나씩 생성
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    kwargs.setdefault("timeout", httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT))
+    return httpx.AsyncClient(transport=CountingAsyncTransport(limits=limits), **kwargs)
+
+
+def startup():
+    get_session()
+    logging.info(f"HTTP client pools ready (hosts: {HTTP_POOL_HOSTS}, per host: {HTTP_POOL_MAXSIZE})")
+
+
+def shutdown():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    logging.info(f"HTTP client pools closed: {connection_stats.snapshot()}")
+
+
+def stats() -> dict:
+    return connection_stats.snapshot()
@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import job_queue
+import job_registry
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 멱등 키 설정 (기본값은 잡 큐와 같은 백엔드/DB 파일)
+IDEMPOTENCY_BACKEND = os.getenv('IDEMPOTENCY_BACKEND', job_queue.JOB_QUEUE_BACKEND)  # sqlite | redis
+IDEMPOTENCY_PATH = os.getenv('IDEMPOTENCY_PATH', job_queue.JOB_QUEUE_PATH)
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))  # 완료된 결과를 재사용할 기간(초)
+
+
+class IdempotencyKeyReusedError(ValueError):
+    # 같은 Idempotency-Key로 내용이 다른 요청이 들어옴
+    pass
+
+
+def derive_key(kind: str, *parts) -> str:
+    # Idempotency-Key 헤더가 없을 때 요청 내용으로 키 생성 (요청 본문 지문에도 사용)
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return f"{kind}:{digest.hexdigest()}"
+
+
+def client_key(kind: str, member_id: str, key: str) -> str:
+    # 클라이언트가 보낸 Idempotency-Key는 엔드포인트와 회원 범위로 한정 (다른 엔드포인트나 다른 회원의 같은 키와 섞이지 않음)
+    return derive_key(kind, 'client', member_id, key)
+
+
+class IdempotencyStore:
+    # 멱등 키 -> (job_id, 요청 본문 지문) 매핑 (single-flight)
+    # claim은 키를 처음 차지한 요청이면 None, 이미 다른 잡이 있으면 (그 job_id, 지문)을 반환한다.
+
+    def claim(self, key: str, job_id: str, fingerprint: Optional[str] = None) -> Optional[tuple]:
+        raise NotImplementedError
+
+    def replace(self, key: str, old_job_id: str, new_job_id: str, fingerprint: Optional[str] = None) -> bool:
+        # 실패한 잡의 키를 새 잡으로 넘김 (동시에 여러 요청이 와도 하나만 성공)
+        raise NotImplementedError
+
+    def release(self, key: str, job_id: str):
+        # 잡 등록에 실패했을 때 키를 풀어줌
+        raise NotImplementedError
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+
+    def __init__(self, path: str = IDEMPOTENCY_PATH, ttl: float = IDEMPOTENCY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+            " key TEXT PRIMARY KEY,"
+            " job_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        # 요청 본문 지문 컬럼 (이전 버전 DB에는 없으므로 추가)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(idempotency_keys)")}
+        if 'fingerprint' not in columns:
+            conn.execute("ALTER TABLE idempotency_keys ADD COLUMN fingerprint TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key: str, job_id: str, fingerprint: Optional[str] = None) -> Optional[tuple]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM idempotency_keys WHERE key=? AND created_at < ?", (key, now - self.ttl))
+            conn.execute(
+                "INSERT OR IGNORE INTO idempotency_keys (key, job_id, fingerprint, created_at) VALUES (?, ?, ?, ?)",
+                (key, job_id, fingerprint, now),
+            )
+            existing = conn.execute("SELECT job_id, fingerprint FROM idempotency_keys WHERE key=?", (key,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if existing[0] == job_id else tuple(existing)
+
+    def replace(self, key: str, old_job_id: str, new_job_id: str, fingerprint: Optional[str] = None) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE idempotency_keys SET job_id=?, fingerprint=?, created_at=? WHERE key=? AND job_id=?",
+            (new_job_id, fingerprint, time.time(), key, old_job_id),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, key: str, job_id: str):
+        self._connect().execute("DELETE FROM idempotency_keys WHERE key=? AND job_id=?", (key, job_id))
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    # 값은 "job_id" 또는 "job_id:지문" (job_id에는 ':'가 없음)
+
+    RELEASE_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value and string.match(value, '^[^:]+') == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    REPLACE_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value and string.match(value, '^[^:]+') == ARGV[1] then
+        redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, url: str = job_queue.REDIS_URL, name: str = job_queue.JOB_QUEUE_NAME, ttl: float = IDEMPOTENCY_TTL):
+        import redis  # 선택 의존성: IDEMPOTENCY_BACKEND=redis 일 때만 필요
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.name = name
+        self.ttl = int(ttl)
+        self._replace = self.redis.register_script(self.REPLACE_SCRIPT)
+        self._release = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    @staticmethod
+    def _value(job_id: str, fingerprint: Optional[str]) -> str:
+        return f"{job_id}:{fingerprint}" if fingerprint else job_id
+
+    def claim(self, key: str, job_id: str, fingerprint: Optional[str] = None) -> Optional[tuple]:
+        redis_key = f"{self.name}:idempotency:{key}"
+        if self.redis.set(redis_key, self._value(job_id, fingerprint), nx=True, ex=self.ttl):
+            return None
+        value = self.redis.get(redis_key)
+        if value is None:
+            return self.claim(key, job_id, fingerprint)
+        existing, _, existing_fingerprint = value.partition(':')
+        return existing, existing_fingerprint or None
+
+    def replace(self, key: str, old_job_id: str, new_job_id: str, fingerprint: Optional[str] = None) -> bool:
+        return bool(self._replace(keys=[f"{self.name}:idempotency:{key}"],
+                                  args=[old_job_id, self._value(new_job_id, fingerprint), self.ttl]))
+
+    def release(self, key: str, job_id: str):
+        self._release(keys=[f"{self.name}:idempotency:{key}"], args=[job_id])
+
+
+def create_store(backend: str = IDEMPOTENCY_BACKEND) -> IdempotencyStore:
+    if backend == 'redis':
+        return RedisIdempotencyStore()
+    if backend == 'sqlite':
+        return SQLiteIdempotencyStore()
+    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND: {backend}")
+
+
+# 프로세스 전체에서 공유하는 저장소
+store = create_store()
+
+
+def resolve(key: str, job_id: str, fingerprint: Optional[str] = None) -> Optional[dict]:
+    # 새 잡이면 None, 중복 요청이면 이어붙을 기존 잡 정보를 반환
+    # 기존 잡이 실패했거나 취소됐으면 키를 새 잡으로 넘기고 None 반환
+    # fingerprint(요청 본문 지문)를 주면, 같은 키를 다른 내용으로 다시 쓴 요청은 IdempotencyKeyReusedError
+    while True:
+        claimed = store.claim(key, job_id, fingerprint)
+        if claimed is None:
+            return None
+        existing, existing_fingerprint = claimed
+        if fingerprint and existing_fingerprint and fingerprint != existing_fingerprint:
+            raise IdempotencyKeyReusedError(f"Idempotency key {key} was already used for a different request")
+        job = job_registry.registry.get(existing)
+        if job is None:
+            # 먼저 온 요청이 아직 잡을 등록하는 중
+            return {"jobId": existing, "status": job_registry.QUEUED, "result": None}
+        if job["status"] not in (job_registry.FAILED, job_registry.CANCELED):
+            logging.info(f"Duplicate request for key {key} attached to job {existing} ({job['status']})")
+            return job
+        if store.replace(key, existing, job_id, fingerprint):
+            logging.info(f"Idempotency key {key} moved from job {existing} to {job_id}")
+            return None
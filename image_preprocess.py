@@ -0,0 +1,61 @@
+import io
+import logging
+import os
+
+from PIL import Image, ImageOps
+
+
+# 비전 호출 전에 업로드 이미지를 정규화하는 설정
+IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', 1024))  # 긴 변 최대 픽셀
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP').upper()  # WEBP | JPEG
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+IMAGE_FACE_CROP = os.getenv('IMAGE_FACE_CROP', 'false').lower() in ('1', 'true', 'yes')  # opencv 필요
+IMAGE_FACE_MARGIN = float(os.getenv('IMAGE_FACE_MARGIN', 1.0))  # 얼굴 크기 대비 여백 (머리 스타일 포함용)
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+# 정규화 방식을 바꾸면 버전을 올려서 원본 해시로 만든 이전 캐시를 무효화
+PREPROCESS_VERSION = 'v1'
+
+
+def preprocess_key() -> str:
+    # 비전 모델이 받는 이미지를 바꾸는 설정 모음 (원본 해시와 함께 캐시 키에 사용)
+    return f"{PREPROCESS_VERSION}|{IMAGE_MAX_EDGE}|{IMAGE_FORMAT}|{IMAGE_QUALITY}|{IMAGE_FACE_CROP}|{IMAGE_FACE_MARGIN}"
+
+
+def crop_to_face(img: Image.Image, margin: float = IMAGE_FACE_MARGIN) -> Image.Image:
+    # 가장 큰 얼굴 주변을 잘라냄. opencv가 없거나 얼굴을 못 찾으면 원본 반환
+    try:
+        import cv2  # 선택 의존성: IMAGE_FACE_CROP=true 일 때만 필요
+        import numpy as np
+    except ImportError:
+        logging.error("IMAGE_FACE_CROP is set but opencv-python is not installed. Skipping face crop.")
+        return img
+
+    gray = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2GRAY)
+    detector = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+    faces = detector.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(64, 64))
+    if len(faces) == 0:
+        return img
+
+    x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+    pad_x, pad_y = int(w * margin), int(h * margin)
+    box = (max(0, x - pad_x), max(0, y - pad_y), min(img.width, x + w + pad_x), min(img.height, y + h + pad_y))
+    return img.crop(box)
+
+
+def normalize_image(data: bytes, max_edge: int = IMAGE_MAX_EDGE, image_format: str = IMAGE_FORMAT,
+                    quality: int = IMAGE_QUALITY, face_crop: bool = IMAGE_FACE_CROP) -> tuple:
+    # 이미지를 한 번만 디코딩해서 EXIF 회전 보정 -> (얼굴 크롭) -> 축소 -> 메모리에서 재인코딩
+    # (인코딩된 바이트, MIME 타입)을 반환
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (max_edge, max_edge))  # JPEG는 디코딩 단계에서 미리 축소
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGB')
+    if face_crop:
+        img = crop_to_face(img)
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    img.save(output, format=image_format, quality=quality)
+    return output.getvalue(), MIME_TYPES.get(image_format, 'image/webp')
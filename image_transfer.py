@@ -0,0 +1,63 @@
+import logging
+import os
+
+import requests
+from boto3.s3.transfer import TransferConfig
+
+import http_client
+
+
+# 스트리밍 전송 사용 여부 (false면 기존 ./uploads 경유 방식만 사용)
+S3_STREAMING_TRANSFER = os.getenv('S3_STREAMING_TRANSFER', 'true').lower() in ('1', 'true', 'yes')
+
+# 메모리 사용량 상한 ~= TRANSFER_PART_SIZE * TRANSFER_MAX_CONCURRENCY
+TRANSFER_PART_SIZE = int(os.getenv('TRANSFER_PART_SIZE', 8 * 1024 * 1024))  # S3 멀티파트 최소 크기(5MB) 이상
+TRANSFER_MAX_CONCURRENCY = int(os.getenv('TRANSFER_MAX_CONCURRENCY', 2))
+TRANSFER_READ_CHUNK_SIZE = int(os.getenv('TRANSFER_READ_CHUNK_SIZE', 256 * 1024))
+TRANSFER_TIMEOUT = float(os.getenv('TRANSFER_TIMEOUT', 60))
+
+transfer_config = TransferConfig(
+    multipart_threshold=TRANSFER_PART_SIZE,
+    multipart_chunksize=TRANSFER_PART_SIZE,
+    max_concurrency=TRANSFER_MAX_CONCURRENCY,
+    io_chunksize=TRANSFER_READ_CHUNK_SIZE,
+    use_threads=TRANSFER_MAX_CONCURRENCY > 1,
+)
+
+
+class ResponseStream:
+    # requests 응답 본문을 청크 단위로 읽는 file-like 객체 (전송한 바이트 수 기록)
+
+    def __init__(self, response: requests.Response, chunk_size: int = TRANSFER_READ_CHUNK_SIZE):
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._buffer = bytearray()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer.extend(chunk)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self.bytes_read += len(data)
+        return data
+
+
+def stream_url_to_s3(s3_client, url: str, bucket: str, object_name: str, content_type: str = 'image/webp') -> int:
+    # HTTP 응답 본문을 임시 파일 없이 S3 업로드로 바로 흘려보낸다. 전송한 바이트 수를 반환
+    with http_client.get(url, stream=True, timeout=(http_client.HTTP_CONNECT_TIMEOUT, TRANSFER_TIMEOUT)) as response:
+        response.raise_for_status()
+        stream = ResponseStream(response)
+        s3_client.upload_fileobj(
+            stream,
+            bucket,
+            object_name,
+            ExtraArgs={'ContentType': content_type},
+            Config=transfer_config,
+        )
+    logging.info(f"Streamed {stream.bytes_read} bytes from {url} to s3://{bucket}/{object_name}")
+    return stream.bytes_read
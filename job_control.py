@@ -0,0 +1,246 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+import job_registry
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 잡 종류별 전체 마감 시간 (초, 워커가 잡을 꺼낸 시점부터). 배치 안의 일기는 'webtoon' 값과 배치 잡의 남은 시간 중 짧은 쪽
+JOB_DEADLINES = {'profile': 600, 'webtoon': 900, 'webtoon_batch': 3600,
+                 **json.loads(os.getenv('JOB_DEADLINES', '{}'))}
+JOB_DEADLINE_DEFAULT = float(os.getenv('JOB_DEADLINE_DEFAULT', 900))
+
+# 단계별 마감 시간 (초). 실제 한도는 단계 한도와 잡의 남은 시간 중 짧은 쪽
+STAGE_DEADLINES = {'gpt_extraction': 120, 'scenario': 180, 'prediction': 600,
+                   **json.loads(os.getenv('STAGE_DEADLINES', '{}'))}
+
+# 다른 프로세스(API)에서 들어온 취소 요청과 지난 마감을 확인하는 주기 (초)
+JOB_CANCEL_POLL_INTERVAL = float(os.getenv('JOB_CANCEL_POLL_INTERVAL', 1))
+
+# 현재 스레드가 처리 중인 잡 (패널 스레드로는 컨텍스트를 복사해서 전달)
+current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class JobCancelledError(RuntimeError):
+    pass
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class JobContext:
+    # 처리 중인 잡 하나의 마감 시각과 취소 상태
+    # 취소되거나 마감이 지나면 등록된 콜백(진행 중인 Replicate 예측 취소 등)을 부르고, 하위 잡(배치 안의 일기)에도 전파한다.
+
+    def __init__(self, job_id: str, deadline: float, parent: Optional['JobContext'] = None, last_attempt: bool = True):
+        self.job_id = job_id
+        self.parent = parent
+        self.deadline = min(deadline, parent.deadline) if parent else deadline
+        # 큐의 마지막 시도인지 (아니면 일시적 오류는 워커에 넘겨서 잡 전체를 다시 실행)
+        self.last_attempt = parent.last_attempt if parent else last_attempt
+        self.reason = None  # 취소 사유 (None이면 취소되지 않음)
+        self.requested = False  # API로 취소를 요청받았는지 (실패가 아니라 canceled 상태로 기록)
+        self.children = []
+        self._callbacks = set()
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.reason is not None or self.remaining() <= 0
+
+    def error(self, stage: Optional[str] = None) -> Exception:
+        where = f" during {stage}" if stage else ""
+        if self.reason is None or self.remaining() <= 0:
+            return DeadlineExceededError(f"Job {self.job_id} exceeded its deadline{where}")
+        return JobCancelledError(f"Job {self.job_id} canceled{where}: {self.reason}")
+
+    def check(self, stage: Optional[str] = None):
+        if self.done:
+            raise self.error(stage)
+
+    def timeout(self, stage: str) -> Optional[float]:
+        # 단계 한도와 잡의 남은 시간 중 짧은 쪽 (이미 끝났으면 예외)
+        self.check(stage)
+        limit = STAGE_DEADLINES.get(stage)
+        return self.remaining() if limit is None else min(limit, self.remaining())
+
+    def cancel(self, reason: str, requested: bool = False):
+        with self._lock:
+            self.requested = self.requested or requested
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, children = list(self._callbacks), list(self.children)
+        logging.info(f"Job {self.job_id} canceled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Error in cancel callback for job {self.job_id}: {type(e).__name__}: {e}")
+        for child in children:
+            child.cancel(reason, requested)
+
+    @contextmanager
+    def on_cancel(self, callback: Callable):
+        # 블록을 실행하는 동안 잡이 취소되거나 마감이 지나면 callback 호출 (이미 끝난 잡이면 바로 호출)
+        with self._lock:
+            self._callbacks.add(callback)
+            fire = self.reason is not None
+        if fire:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.discard(callback)
+
+    def was_requested(self) -> bool:
+        return self.requested or (self.parent is not None and self.parent.was_requested())
+
+    def find(self, job_id: str) -> Optional['JobContext']:
+        if self.job_id == job_id:
+            return self
+        for child in self.children:
+            found = child.find(job_id)
+            if found:
+                return found
+        return None
+
+
+class JobControl:
+    # 이 프로세스에서 처리 중인 잡의 마감과 취소를 관리한다.
+    # 취소 요청은 잡 레지스트리에 기록되므로, 별도 워커 프로세스는 주기적으로 확인해서 반영한다.
+
+    def __init__(self, poll_interval: float = JOB_CANCEL_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._active = {}  # job_id → JobContext
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+
+    @contextmanager
+    def job(self, job_id: str, kind: Optional[str] = None, seconds: Optional[float] = None, last_attempt: bool = True):
+        parent = current_job.get()
+        seconds = seconds or float(JOB_DEADLINES.get(kind, JOB_DEADLINE_DEFAULT))
+        context = JobContext(job_id, time.monotonic() + seconds, parent, last_attempt)
+        if parent:
+            with parent._lock:
+                parent.children.append(context)
+            if parent.reason is not None:
+                context.cancel(parent.reason, parent.requested)
+        with self._lock:
+            self._active[job_id] = context
+            self._start_poller()
+        # 큐에 있는 동안 취소된 잡은 시작하자마자 취소 상태
+        self._apply_requests([context])
+        token = current_job.set(context)
+        try:
+            yield context
+        finally:
+            current_job.reset(token)
+            with self._lock:
+                if self._active.get(job_id) is context:
+                    del self._active[job_id]
+
+    def cancel(self, job_id: str, reason: str = 'canceled by request') -> bool:
+        # API 요청에 의한 취소: 레지스트리에 기록하고, 이 프로세스에서 처리 중이면 바로 취소
+        job_registry.registry.request_cancel(job_id, reason)
+        with self._lock:
+            context = self._active.get(job_id)
+        if context:
+            context.cancel(reason, requested=True)
+        return context is not None
+
+    def _start_poller(self):
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll, name="job-control", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                contexts = list(self._active.values())
+            if not contexts:
+                continue
+            # 마감이 지난 잡은 블록된 호출(예측 대기 등)도 바로 풀리도록 취소 콜백 실행
+            for context in contexts:
+                if context.reason is None and context.remaining() <= 0:
+                    context.cancel('deadline exceeded')
+            try:
+                self._apply_requests(contexts)
+            except Exception as e:
+                logging.error(f"Error polling job cancel requests: {type(e).__name__}: {e}")
+
+    @staticmethod
+    def _apply_requests(contexts: list):
+        requests = job_registry.registry.cancel_requests([context.job_id for context in contexts])
+        for context in contexts:
+            if context.job_id in requests:
+                context.cancel(requests[context.job_id], requested=True)
+
+
+def current() -> Optional[JobContext]:
+    return current_job.get()
+
+
+def check(stage: Optional[str] = None):
+    # 잡 밖에서 직접 호출된 경우는 확인하지 않음
+    context = current_job.get()
+    if context:
+        context.check(stage)
+
+
+def timeout(stage: str, default: Optional[float] = None) -> Optional[float]:
+    context = current_job.get()
+    if context:
+        return context.timeout(stage)
+    return STAGE_DEADLINES.get(stage, default)
+
+
+def remaining() -> Optional[float]:
+    context = current_job.get()
+    return context.remaining() if context else None
+
+
+def retryable() -> bool:
+    # 현재 잡이 실패하면 워커가 다시 실행할 수 있는지 (큐의 마지막 시도이거나, 취소/마감됐거나, 잡 밖에서 직접 호출됐으면 False)
+    context = current_job.get()
+    return context is not None and not context.last_attempt and not context.done
+
+
+def abort(reason: str):
+    # 현재 잡이 다른 곳에서 실패했을 때 진행 중인 예측을 정리하도록 취소
+    context = current_job.get()
+    if context:
+        context.cancel(reason)
+
+
+def cancel_reason(job_id: Optional[str]) -> Optional[str]:
+    # job_id(현재 잡 또는 그 하위 잡)가 API 요청으로 취소됐으면 사유, 아니면 None
+    context = current_job.get()
+    while context and context.parent:
+        context = context.parent
+    found = context.find(job_id) if context and job_id else None
+    if not found or not found.was_requested():
+        return None
+    return found.reason
+
+
+# 프로세스 전체에서 공유하는 관리자
+control = JobControl()
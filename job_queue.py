@@ -0,0 +1,505 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 큐 설정
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite')  # sqlite | redis
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', './data/jobs.db')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+JOB_QUEUE_NAME = os.getenv('JOB_QUEUE_NAME', 'ai-image')
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+JOB_QUEUE_RETENTION = int(os.getenv('JOB_QUEUE_RETENTION', 7 * 24 * 3600))  # 끝난 잡(done/failed)을 큐에 남겨 두는 시간
+
+# 우선순위 클래스 (앞쪽일수록 먼저 처리). 높은 클래스에 대기 잡이 있으면 낮은 클래스는 기다린다.
+PRIORITY_CLASSES = ('interactive', 'standard', 'backfill')
+# 잡 종류별 기본 클래스: 사용자가 화면에서 기다리는 프로필 생성이 웹툰보다 먼저, 일괄 요청은 가장 나중
+JOB_PRIORITIES = {'profile': 'interactive', 'webtoon': 'standard', 'webtoon_batch': 'backfill'}
+
+# 같은 클래스 안에서는 memberId별 deficit round-robin: 차례가 올 때마다 DRR_QUANTUM만큼 적립하고,
+# 적립액이 잡 비용(예: 웹툰 패널 수) 이상이면 꺼낸다. 한 회원이 잡을 많이 넣어도 다른 회원과 번갈아 처리된다.
+DRR_QUANTUM = float(os.getenv('DRR_QUANTUM', 1))
+# 잡 종류별 기본 비용 (웹툰은 패널 4개를 생성하므로 프로필의 4배, 배치 잡은 묶은 일기 수만큼 enqueue 시 지정)
+JOB_COSTS = {'profile': 1, 'webtoon': 4}
+
+
+def priority_index(priority: Optional[str], kind: str) -> int:
+    name = priority or JOB_PRIORITIES.get(kind, 'standard')
+    if name not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class: {name}")
+    return PRIORITY_CLASSES.index(name)
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: dict = field(default_factory=dict)
+    attempts: int = 0
+    priority: int = 1
+    member_id: str = ''
+    enqueued_at: float = 0.0  # 마지막으로 대기열에 들어간 시각 (재시도면 다시 노출된 시각)
+
+    @property
+    def priority_class(self) -> str:
+        return PRIORITY_CLASSES[self.priority]
+
+
+class JobQueue:
+    # 큐 구현체가 지켜야 하는 인터페이스
+    # dequeue로 가져간 잡은 lease_seconds 동안 다른 워커에게 보이지 않고,
+    # 그 안에 ack되지 않으면(워커 장애 등) 다시 큐에 노출된다.
+    # dequeue 순서: 우선순위 클래스 → 같은 클래스 안에서는 memberId별 deficit round-robin
+
+    def enqueue(self, kind: str, payload: dict, job_id: Optional[str] = None,
+                priority: Optional[str] = None, cost: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+    def dequeue(self, lease_seconds: float) -> Optional[Job]:
+        raise NotImplementedError
+
+    def extend(self, job_id: str, lease_seconds: float):
+        raise NotImplementedError
+
+    def ack(self, job_id: str):
+        raise NotImplementedError
+
+    def nack(self, job_id: str, error: str = "", delay: float = 0):
+        raise NotImplementedError
+
+    def depth(self) -> int:
+        # 아직 처리를 시작하지 않은 잡 수 (재시도 대기 포함)
+        raise NotImplementedError
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 대기열에서의 순번 (1부터). 대기 중이 아니면 None
+        raise NotImplementedError
+
+    def prune(self, max_age: float = JOB_QUEUE_RETENTION):
+        # 오래된 끝난 잡과 대기 잡이 없는 회원의 DRR 상태 정리
+        pass
+
+
+class SQLiteJobQueue(JobQueue):
+    # 단일 호스트용 영속 큐 (API 프로세스와 워커 프로세스가 같은 DB 파일을 공유)
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, max_attempts: int = JOB_MAX_ATTEMPTS, quantum: float = DRR_QUANTUM):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.quantum = quantum
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " available_at REAL NOT NULL,"
+                " lease_until REAL,"
+                " last_error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            # 우선순위/공정 분배 컬럼 (이전 버전 DB에는 없으므로 추가)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in (("priority", "INTEGER NOT NULL DEFAULT 1"),
+                                     ("member_id", "TEXT NOT NULL DEFAULT ''"),
+                                     ("cost", "REAL NOT NULL DEFAULT 1")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_fair ON jobs (status, priority, member_id, available_at)")
+            # 클래스별 회원의 DRR 적립액과 차례 (turn이 작을수록 먼저)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fair_share ("
+                " priority INTEGER NOT NULL,"
+                " member_id TEXT NOT NULL,"
+                " deficit REAL NOT NULL,"
+                " turn INTEGER NOT NULL,"
+                " PRIMARY KEY (priority, member_id))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: dict, job_id: Optional[str] = None,
+                priority: Optional[str] = None, cost: Optional[float] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        cost = JOB_COSTS.get(kind, 1) if cost is None else cost
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, kind, payload, status, attempts, available_at, created_at, updated_at, priority, member_id, cost)"
+            " VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), now, now, now, priority_index(priority, kind),
+             str(payload.get('memberId', '')), cost),
+        )
+        logging.info(f"Job enqueued: {job_id} ({kind}, {priority or JOB_PRIORITIES.get(kind, 'standard')})")
+        return job_id
+
+    def dequeue(self, lease_seconds: float) -> Optional[Job]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 리스가 만료된 잡 중 재시도 횟수를 넘긴 것은 실패 처리하고, 나머지는 대기열로 되돌림
+            conn.execute(
+                "UPDATE jobs SET status='failed', last_error='lease expired', updated_at=?"
+                " WHERE status='running' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            conn.execute(
+                "UPDATE jobs SET status='queued', available_at=lease_until, lease_until=NULL, updated_at=?"
+                " WHERE status='running' AND lease_until < ?",
+                (now, now),
+            )
+            job = self._pick(conn, now)
+            if job is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status='running', attempts=attempts+1, lease_until=?, updated_at=? WHERE id=?",
+                (now + lease_seconds, now, job.id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    def _pick(self, conn: sqlite3.Connection, now: float) -> Optional[Job]:
+        # 가장 높은 클래스에서 회원별 맨 앞 잡을 모아 DRR로 하나 선택
+        row = conn.execute("SELECT MIN(priority) FROM jobs WHERE status='queued' AND available_at <= ?", (now,)).fetchone()
+        if row[0] is None:
+            return None
+        priority = row[0]
+        heads = conn.execute(
+            "SELECT h.id, h.kind, h.payload, h.attempts, h.member_id, h.cost, h.available_at, h.remaining,"
+            "       COALESCE(f.deficit, 0), COALESCE(f.turn, 0)"
+            " FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY member_id ORDER BY available_at) AS n,"
+            "              COUNT(*) OVER (PARTITION BY member_id) AS remaining"
+            "       FROM jobs WHERE status='queued' AND available_at <= ? AND priority = ?) h"
+            " LEFT JOIN fair_share f ON f.priority = ? AND f.member_id = h.member_id"
+            " WHERE h.n = 1 ORDER BY COALESCE(f.turn, 0), h.available_at",
+            (now, priority, priority),
+        ).fetchall()
+
+        # 차례대로 돌며 quantum씩 적립했을 때 처음으로 비용을 감당하는 회원 계산
+        # (한 바퀴를 여러 번 돌아야 하는 경우도 반복 없이 계산)
+        def visits_needed(head) -> int:
+            cost, deficit = head[5], head[8]
+            return max(1, math.ceil((cost - deficit) / self.quantum))
+
+        chosen_index = min(range(len(heads)), key=lambda i: ((visits_needed(heads[i]) - 1) * len(heads) + i))
+        rounds = visits_needed(heads[chosen_index])
+        max_turn = conn.execute("SELECT COALESCE(MAX(turn), 0) FROM fair_share WHERE priority=?", (priority,)).fetchone()[0]
+        for i, head in enumerate(heads):
+            visits = rounds if i <= chosen_index else rounds - 1
+            deficit = head[8] + visits * self.quantum
+            turn = head[9]
+            if i <= chosen_index:
+                # 다음 차례는 선택된 회원 바로 뒤부터: 앞쪽 회원과 선택된 회원을 순서대로 맨 뒤로 보냄
+                turn = max_turn + 1 + i
+            if i == chosen_index:
+                # 다음 잡이 없으면 DRR 규칙대로 적립액을 비움
+                deficit = deficit - head[5] if head[7] > 1 else 0
+            if visits or i <= chosen_index:
+                conn.execute(
+                    "INSERT INTO fair_share (priority, member_id, deficit, turn) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (priority, member_id) DO UPDATE SET deficit=excluded.deficit, turn=excluded.turn",
+                    (priority, head[4], deficit, turn),
+                )
+        head = heads[chosen_index]
+        return Job(id=head[0], kind=head[1], payload=json.loads(head[2]), attempts=head[3] + 1,
+                   priority=priority, member_id=head[4], enqueued_at=head[6])
+
+    def extend(self, job_id: str, lease_seconds: float):
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET lease_until=?, updated_at=? WHERE id=? AND status='running'",
+            (now + lease_seconds, now, job_id),
+        )
+
+    def ack(self, job_id: str):
+        self._connect().execute(
+            "UPDATE jobs SET status='done', lease_until=NULL, updated_at=? WHERE id=?",
+            (time.time(), job_id),
+        )
+
+    def nack(self, job_id: str, error: str = "", delay: float = 0):
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+            " available_at=?, lease_until=NULL, last_error=?, updated_at=? WHERE id=?",
+            (self.max_attempts, now + delay, error, now, job_id),
+        )
+
+    def depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 대략적인 순번: 더 높은 클래스의 잡 + 같은 클래스에서 먼저 들어온 잡
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs j, (SELECT priority, available_at FROM jobs WHERE id=? AND status='queued') me"
+            " WHERE j.status='queued'"
+            " AND (j.priority < me.priority OR (j.priority = me.priority AND j.available_at <= me.available_at))",
+            (job_id,),
+        ).fetchone()
+        return row[0] or None
+
+    def prune(self, max_age: float = JOB_QUEUE_RETENTION):
+        # 대기 잡이 없는 회원의 차례/적립액도 지움 (적립액은 대기열이 빌 때 이미 0이고, 다시 들어오면 새 회원처럼 시작)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - max_age,))
+            conn.execute(
+                "DELETE FROM fair_share WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.status IN ('queued', 'running')"
+                " AND j.priority = fair_share.priority AND j.member_id = fair_share.member_id)"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RedisJobQueue(JobQueue):
+    # 여러 호스트에서 워커를 띄울 때 사용하는 Redis 호환 큐
+    #   {name}:jobs              hash   job_id -> 잡 JSON
+    #   {name}:meta              hash   job_id -> "클래스|비용|memberId" (Lua 스크립트용)
+    #   {name}:members:{클래스}  list   처리 대기 잡이 있는 memberId (DRR 차례 순서)
+    #   {name}:q:{클래스}:{회원} list   회원별 처리 대기 job_id
+    #   {name}:deficit           hash   "클래스:memberId" -> DRR 적립액
+    #   {name}:ready_at          hash   job_id -> 대기열에 들어간 시각
+    #   {name}:depth             hash   클래스 -> 처리 대기 잡 수
+    #   {name}:delayed           zset   재시도 대기 중인 job_id (score = 노출 시각)
+    #   {name}:leases            zset   처리 중인 job_id (score = 리스 만료 시각)
+    #   {name}:finished          zset   실패로 끝난 job_id (score = 끝난 시각, prune으로 정리)
+    # 회원별 키를 스크립트 안에서 만들기 때문에 Redis Cluster가 아닌 단일 인스턴스를 가정
+
+    # 잡을 회원별 대기열 뒤에 붙이고, 대기열이 비어 있던 회원이면 차례 목록에 추가
+    PUSH_FUNCTION = """
+    local prefix = KEYS[1]
+    local function push(id, ready_at)
+        local meta = redis.call('HGET', prefix .. ':meta', id)
+        if not meta then return end
+        local p, member = string.match(meta, '^(%d+)|[^|]*|(.*)$')
+        local q = prefix .. ':q:' .. p .. ':' .. member
+        if redis.call('LLEN', q) == 0 then
+            redis.call('RPUSH', prefix .. ':members:' .. p, member)
+        end
+        redis.call('RPUSH', q, id)
+        redis.call('HSET', prefix .. ':ready_at', id, ready_at)
+        redis.call('HINCRBY', prefix .. ':depth', p, 1)
+    end
+    """
+
+    ENQUEUE_SCRIPT = PUSH_FUNCTION + """
+    redis.call('HSET', prefix .. ':jobs', ARGV[1], ARGV[2])
+    redis.call('HSET', prefix .. ':meta', ARGV[1], ARGV[3])
+    push(ARGV[1], ARGV[4])
+    """
+
+    # 만료된 리스/지연 잡을 대기열로 옮기고, 높은 클래스부터 DRR로 하나를 골라 리스를 거는 작업을 원자적으로 처리
+    DEQUEUE_SCRIPT = PUSH_FUNCTION + """
+    local now = tonumber(ARGV[1])
+    local lease = tonumber(ARGV[2])
+    local quantum = tonumber(ARGV[3])
+    for _, key in ipairs({prefix .. ':delayed', prefix .. ':leases'}) do
+        local due = redis.call('ZRANGEBYSCORE', key, '-inf', now, 'WITHSCORES')
+        for i = 1, #due, 2 do
+            redis.call('ZREM', key, due[i])
+            push(due[i], due[i + 1])
+        end
+    end
+    for p = 0, tonumber(ARGV[4]) - 1 do
+        local members = prefix .. ':members:' .. p
+        local guard = 0
+        while redis.call('LLEN', members) > 0 and guard < 10000 do
+            guard = guard + 1
+            local member = redis.call('LINDEX', members, 0)
+            local q = prefix .. ':q:' .. p .. ':' .. member
+            local field = p .. ':' .. member
+            local id = redis.call('LINDEX', q, 0)
+            if not id then
+                redis.call('LPOP', members)
+                redis.call('HDEL', prefix .. ':deficit', field)
+            else
+                local meta = redis.call('HGET', prefix .. ':meta', id) or ''
+                local cost = tonumber(string.match(meta, '^%d+|([^|]*)|')) or 1
+                local deficit = tonumber(redis.call('HINCRBYFLOAT', prefix .. ':deficit', field, quantum))
+                -- 차례가 끝난 회원은 맨 뒤로
+                redis.call('RPUSH', members, redis.call('LPOP', members))
+                if cost <= deficit then
+                    redis.call('LPOP', q)
+                    redis.call('HINCRBY', prefix .. ':depth', p, -1)
+                    if redis.call('LLEN', q) == 0 then
+                        redis.call('LREM', members, -1, member)
+                        redis.call('HDEL', prefix .. ':deficit', field)
+                    else
+                        redis.call('HINCRBYFLOAT', prefix .. ':deficit', field, -cost)
+                    end
+                    redis.call('ZADD', prefix .. ':leases', now + lease, id)
+                    return {id, tostring(p), redis.call('HGET', prefix .. ':ready_at', id) or tostring(now)}
+                end
+            end
+        end
+    end
+    return nil
+    """
+
+    def __init__(self, url: str = REDIS_URL, name: str = JOB_QUEUE_NAME, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 quantum: float = DRR_QUANTUM):
+        import redis  # 선택 의존성: JOB_QUEUE_BACKEND=redis 일 때만 필요
+
+        self.redis = redis.Redis.from_url(url)
+        self.max_attempts = max_attempts
+        self.quantum = quantum
+        self.prefix = name
+        self.jobs_key = f"{name}:jobs"
+        self.meta_key = f"{name}:meta"
+        self.ready_at_key = f"{name}:ready_at"
+        self.depth_key = f"{name}:depth"
+        self.leases_key = f"{name}:leases"
+        self.delayed_key = f"{name}:delayed"
+        self.finished_key = f"{name}:finished"
+        self._enqueue = self.redis.register_script(self.ENQUEUE_SCRIPT)
+        self._dequeue = self.redis.register_script(self.DEQUEUE_SCRIPT)
+
+    def enqueue(self, kind: str, payload: dict, job_id: Optional[str] = None,
+                priority: Optional[str] = None, cost: Optional[float] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        cost = JOB_COSTS.get(kind, 1) if cost is None else cost
+        index = priority_index(priority, kind)
+        member_id = str(payload.get('memberId', ''))
+        job = {"id": job_id, "kind": kind, "payload": payload, "attempts": 0, "status": "queued",
+               "priority": index, "member_id": member_id, "cost": cost}
+        self._enqueue(keys=[self.prefix], args=[job_id, json.dumps(job), f"{index}|{cost}|{member_id}", time.time()])
+        logging.info(f"Job enqueued: {job_id} ({kind}, {PRIORITY_CLASSES[index]})")
+        return job_id
+
+    def dequeue(self, lease_seconds: float) -> Optional[Job]:
+        while True:
+            picked = self._dequeue(
+                keys=[self.prefix],
+                args=[time.time(), lease_seconds, self.quantum, len(PRIORITY_CLASSES)],
+            )
+            if picked is None:
+                return None
+            job_id, priority, ready_at = (value.decode() if isinstance(value, bytes) else value for value in picked)
+            raw = self.redis.hget(self.jobs_key, job_id)
+            if raw is None:
+                self.redis.zrem(self.leases_key, job_id)
+                continue
+            job = json.loads(raw)
+            job["attempts"] += 1
+            if job["attempts"] > self.max_attempts:
+                # 리스 만료가 반복된 잡은 실패 처리
+                self._finish(job, "failed", "lease expired")
+                continue
+            job["status"] = "running"
+            self.redis.hset(self.jobs_key, job_id, json.dumps(job))
+            return Job(id=job_id, kind=job["kind"], payload=job["payload"], attempts=job["attempts"],
+                       priority=int(priority), member_id=job.get("member_id", ''), enqueued_at=float(ready_at))
+
+    def extend(self, job_id: str, lease_seconds: float):
+        self.redis.zadd(self.leases_key, {job_id: time.time() + lease_seconds}, xx=True)
+
+    def _finish(self, job: dict, status: str, error: str = ""):
+        job.update(status=status, last_error=error)
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leases_key, job["id"])
+        pipe.hset(self.jobs_key, job["id"], json.dumps(job))
+        pipe.hdel(self.meta_key, job["id"])
+        pipe.hdel(self.ready_at_key, job["id"])
+        pipe.zadd(self.finished_key, {job["id"]: time.time()})
+        pipe.execute()
+
+    def ack(self, job_id: str):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leases_key, job_id)
+        pipe.hdel(self.jobs_key, job_id)
+        pipe.hdel(self.meta_key, job_id)
+        pipe.hdel(self.ready_at_key, job_id)
+        pipe.execute()
+
+    def nack(self, job_id: str, error: str = "", delay: float = 0):
+        raw = self.redis.hget(self.jobs_key, job_id)
+        if raw is None:
+            return
+        job = json.loads(raw)
+        if job["attempts"] >= self.max_attempts:
+            self._finish(job, "failed", error)
+            return
+        job.update(status="queued", last_error=error)
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leases_key, job_id)
+        pipe.hset(self.jobs_key, job_id, json.dumps(job))
+        pipe.zadd(self.delayed_key, {job_id: time.time() + delay})
+        pipe.execute()
+
+    def depth(self) -> int:
+        pipe = self.redis.pipeline()
+        pipe.hvals(self.depth_key)
+        pipe.zcard(self.delayed_key)
+        counts, delayed = pipe.execute()
+        return sum(int(count) for count in counts) + delayed
+
+    def position(self, job_id: str) -> Optional[int]:
+        # 대략적인 순번: 더 높은 클래스의 잡 + (회원 대기열 안 순번 x 같은 클래스 회원 수)
+        meta = self.redis.hget(self.meta_key, job_id)
+        if meta is None:
+            return None
+        priority, _, member_id = meta.decode().split('|', 2)
+        index = self.redis.lpos(f"{self.prefix}:q:{priority}:{member_id}", job_id)
+        if index is None:
+            return None
+        counts = self.redis.hgetall(self.depth_key)
+        ahead = sum(int(count) for p, count in counts.items() if int(p) < int(priority))
+        members = self.redis.llen(f"{self.prefix}:members:{priority}")
+        return ahead + min(index * max(1, members) + 1, int(counts.get(priority.encode(), 0)))
+
+    def prune(self, max_age: float = JOB_QUEUE_RETENTION):
+        # 성공한 잡은 ack 때 지우고, 회원별 적립액은 대기열이 빌 때 DEQUEUE_SCRIPT가 지우므로 실패한 잡만 정리
+        expired = self.redis.zrangebyscore(self.finished_key, '-inf', time.time() - max_age)
+        if expired:
+            pipe = self.redis.pipeline()
+            pipe.hdel(self.jobs_key, *expired)
+            pipe.zrem(self.finished_key, *expired)
+            pipe.execute()
+
+
+def create_queue(backend: str = JOB_QUEUE_BACKEND) -> JobQueue:
+    if backend == 'redis':
+        return RedisJobQueue()
+    if backend == 'sqlite':
+        return SQLiteJobQueue()
+    raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+
+
+# 프로세스 전체에서 공유하는 큐
+queue = create_queue()
+logging.info(f"Job queue backend: {JOB_QUEUE_BACKEND}")
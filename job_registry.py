@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import job_queue
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 잡 상태 저장소 설정 (기본값은 잡 큐와 같은 백엔드/DB 파일)
+JOB_REGISTRY_BACKEND = os.getenv('JOB_REGISTRY_BACKEND', job_queue.JOB_QUEUE_BACKEND)  # sqlite | redis
+JOB_REGISTRY_PATH = os.getenv('JOB_REGISTRY_PATH', job_queue.JOB_QUEUE_PATH)
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+
+# 잡 상태 값
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELED = 'canceled'
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELED)
+
+
+class JobRegistry:
+    # 잡 상태와 단계별 이벤트를 기록하는 저장소 인터페이스
+    # 이벤트는 잡 안에서 단조 증가하는 seq를 가지며, SSE 스트림은 seq 이후 이벤트를 읽어간다.
+
+    def create(self, job_id: str, kind: str, member_id: str):
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        raise NotImplementedError
+
+    def emit(self, job_id: str, stage: str, status: str = RUNNING, **data):
+        # stage: 처리 단계 이름, status: 잡 전체 상태, data: 단계별 부가 정보
+        raise NotImplementedError
+
+    def note(self, job_id: str, stage: str, **data):
+        # 잡 상태와 단계는 그대로 두고 이벤트만 추가 (이벤트의 status는 기록 시점의 잡 상태)
+        # 잡 처리와 따로 도는 일(콜백 전송 등)의 결과를 남길 때 사용
+        raise NotImplementedError
+
+    def complete(self, job_id: str, result: dict):
+        self.emit(job_id, 'completed', status=SUCCEEDED, result=result)
+
+    def fail(self, job_id: str, error: str):
+        self.emit(job_id, 'failed', status=FAILED, error=error)
+
+    def cancel(self, job_id: str, reason: str):
+        self.emit(job_id, 'canceled', status=CANCELED, reason=reason)
+
+    def request_cancel(self, job_id: str, reason: str):
+        # 취소 요청 기록 (잡을 처리 중인 프로세스가 cancel_requests로 확인)
+        raise NotImplementedError
+
+    def cancel_requests(self, job_ids: list) -> dict:
+        # job_ids 중 취소 요청이 있는 잡 → 사유
+        raise NotImplementedError
+
+    def prune(self, max_age: float = JOB_RETENTION_SECONDS):
+        pass
+
+
+class SQLiteJobRegistry(JobRegistry):
+
+    def __init__(self, path: str = JOB_REGISTRY_PATH):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_status ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " member_id TEXT,"
+            " status TEXT NOT NULL,"
+            " stage TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " data TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_cancels ("
+            " job_id TEXT PRIMARY KEY,"
+            " reason TEXT,"
+            " requested_at REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, kind: str, member_id: str):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO job_status (id, kind, member_id, status, stage, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, member_id, QUEUED, now, now),
+        )
+        conn.execute(
+            "INSERT INTO job_events (job_id, stage, status, data, created_at) VALUES (?, 'queued', ?, '{}', ?)",
+            (job_id, QUEUED, now),
+        )
+        conn.execute("COMMIT")
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT id, kind, member_id, status, stage, result, error, created_at, updated_at"
+            " FROM job_status WHERE id=?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row[0],
+            "kind": row[1],
+            "memberId": row[2],
+            "status": row[3],
+            "stage": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "createdAt": row[7],
+            "updatedAt": row[8],
+        }
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        rows = self._connect().execute(
+            "SELECT seq, stage, status, data, created_at FROM job_events WHERE job_id=? AND seq>? ORDER BY seq",
+            (job_id, after),
+        ).fetchall()
+        return [
+            {"seq": seq, "stage": stage, "status": status, "data": json.loads(data or '{}'), "createdAt": created_at}
+            for seq, stage, status, data, created_at in rows
+        ]
+
+    def emit(self, job_id: str, stage: str, status: str = RUNNING, **data):
+        now = time.time()
+        result = data.get('result') if status == SUCCEEDED else None
+        error = data.get('error') if status == FAILED else None
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO job_events (job_id, stage, status, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, stage, status, json.dumps(data, ensure_ascii=False), now),
+            )
+            conn.execute(
+                "UPDATE job_status SET status=?, stage=?, result=COALESCE(?, result), error=COALESCE(?, error),"
+                " updated_at=? WHERE id=?",
+                (status, stage, json.dumps(result, ensure_ascii=False) if result is not None else None, error, now, job_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def note(self, job_id: str, stage: str, **data):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM job_status WHERE id=?", (job_id,)).fetchone()
+            if row is not None:
+                conn.execute(
+                    "INSERT INTO job_events (job_id, stage, status, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, stage, row[0], json.dumps(data, ensure_ascii=False), now),
+                )
+                conn.execute("UPDATE job_status SET updated_at=? WHERE id=?", (now, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def request_cancel(self, job_id: str, reason: str):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO job_cancels (job_id, reason, requested_at) VALUES (?, ?, ?)",
+            (job_id, reason, time.time()),
+        )
+
+    def cancel_requests(self, job_ids: list) -> dict:
+        if not job_ids:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT job_id, reason FROM job_cancels WHERE job_id IN ({','.join('?' * len(job_ids))})",
+            list(job_ids),
+        ).fetchall()
+        return dict(rows)
+
+    def prune(self, max_age: float = JOB_RETENTION_SECONDS):
+        cutoff = time.time() - max_age
+        conn = self._connect()
+        conn.execute("DELETE FROM job_cancels WHERE requested_at < ?", (cutoff,))
+        conn.execute("DELETE FROM job_events WHERE job_id IN (SELECT id FROM job_status WHERE updated_at < ?)", (cutoff,))
+        conn.execute("DELETE FROM job_status WHERE updated_at < ?", (cutoff,))
+
+
+class RedisJobRegistry(JobRegistry):
+    #   {name}:status:{job_id}  hash  잡 상태
+    #   {name}:events:{job_id}  list  이벤트 JSON (seq = 리스트 인덱스 + 1)
+    #   {name}:cancel:{job_id}  string  취소 요청 사유
+
+    def __init__(self, url: str = job_queue.REDIS_URL, name: str = job_queue.JOB_QUEUE_NAME,
+                 retention: int = JOB_RETENTION_SECONDS):
+        import redis  # 선택 의존성: JOB_REGISTRY_BACKEND=redis 일 때만 필요
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.name = name
+        self.retention = retention
+
+    def _status_key(self, job_id: str) -> str:
+        return f"{self.name}:status:{job_id}"
+
+    def _events_key(self, job_id: str) -> str:
+        return f"{self.name}:events:{job_id}"
+
+    def _cancel_key(self, job_id: str) -> str:
+        return f"{self.name}:cancel:{job_id}"
+
+    def create(self, job_id: str, kind: str, member_id: str):
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._status_key(job_id), mapping={
+            "kind": kind, "member_id": member_id, "status": QUEUED, "stage": "queued",
+            "created_at": now, "updated_at": now,
+        })
+        pipe.rpush(self._events_key(job_id), json.dumps({"stage": "queued", "status": QUEUED, "data": {}, "createdAt": now}))
+        pipe.expire(self._status_key(job_id), self.retention)
+        pipe.expire(self._events_key(job_id), self.retention)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self.redis.hgetall(self._status_key(job_id))
+        if not row:
+            return None
+        return {
+            "jobId": job_id,
+            "kind": row.get("kind"),
+            "memberId": row.get("member_id"),
+            "status": row.get("status"),
+            "stage": row.get("stage"),
+            "result": json.loads(row["result"]) if row.get("result") else None,
+            "error": row.get("error"),
+            "createdAt": float(row["created_at"]),
+            "updatedAt": float(row["updated_at"]),
+        }
+
+    def events(self, job_id: str, after: int = 0) -> list:
+        rows = self.redis.lrange(self._events_key(job_id), after, -1)
+        return [dict(json.loads(raw), seq=after + i + 1) for i, raw in enumerate(rows)]
+
+    def emit(self, job_id: str, stage: str, status: str = RUNNING, **data):
+        now = time.time()
+        fields = {"status": status, "stage": stage, "updated_at": now}
+        if status == SUCCEEDED and data.get('result') is not None:
+            fields["result"] = json.dumps(data['result'], ensure_ascii=False)
+        if status == FAILED and data.get('error'):
+            fields["error"] = data['error']
+        pipe = self.redis.pipeline()
+        pipe.rpush(self._events_key(job_id), json.dumps(
+            {"stage": stage, "status": status, "data": data, "createdAt": now}, ensure_ascii=False))
+        pipe.hset(self._status_key(job_id), mapping=fields)
+        pipe.execute()
+
+    def note(self, job_id: str, stage: str, **data):
+        now = time.time()
+        status = self.redis.hget(self._status_key(job_id), "status")
+        if status is None:
+            return
+        pipe = self.redis.pipeline()
+        pipe.rpush(self._events_key(job_id), json.dumps(
+            {"stage": stage, "status": status, "data": data, "createdAt": now}, ensure_ascii=False))
+        pipe.hset(self._status_key(job_id), "updated_at", now)
+        pipe.execute()
+
+    def request_cancel(self, job_id: str, reason: str):
+        self.redis.set(self._cancel_key(job_id), reason, ex=self.retention)
+
+    def cancel_requests(self, job_ids: list) -> dict:
+        if not job_ids:
+            return {}
+        reasons = self.redis.mget([self._cancel_key(job_id) for job_id in job_ids])
+        return {job_id: reason for job_id, reason in zip(job_ids, reasons) if reason is not None}
+
+
+def create_registry(backend: str = JOB_REGISTRY_BACKEND) -> JobRegistry:
+    if backend == 'redis':
+        return RedisJobRegistry()
+    if backend == 'sqlite':
+        return SQLiteJobRegistry()
+    raise ValueError(f"Unknown JOB_REGISTRY_BACKEND: {backend}")
+
+
+# 프로세스 전체에서 공유하는 레지스트리
+registry = create_registry()
+logging.info(f"Job registry backend: {JOB_REGISTRY_BACKEND}")
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+import metrics
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# GPT 응답 캐시 설정
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', './data/llm_cache.db')
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))  # 초
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 10000))
+
+
+class LLMCache:
+    # 입력 내용(이미지/일기) 해시 + 프롬프트 버전 + 모델 이름을 키로 GPT 결과를 저장하는 캐시
+    # TTL이 지난 항목은 미스로 처리하고, 최대 개수를 넘으면 가장 오래 안 쓴 항목부터 지운다(LRU).
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {}
+        if not enabled:
+            return
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " namespace TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._connect().execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(namespace: str, content, prompt_version: str, model: str) -> str:
+        digest = hashlib.sha256(content.encode('utf-8') if isinstance(content, str) else content).hexdigest()
+        return hashlib.sha256(f"{namespace}|{prompt_version}|{model}|{digest}".encode('utf-8')).hexdigest()
+
+    def _count(self, namespace: str, field: str):
+        with self._lock:
+            stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+            stats[field] += 1
+        if field in ("hits", "misses"):
+            metrics.cache_lookup(namespace, field == "hits")
+
+    def get(self, namespace: str, key: str):
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+            self._count(namespace, "misses")
+            return None
+        conn.execute("UPDATE llm_cache SET accessed_at=? WHERE key=?", (now, key))
+        self._count(namespace, "hits")
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, namespace, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, namespace, json.dumps(value, ensure_ascii=False), now, now),
+        )
+        self.evict()
+
+    def evict(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            rows = conn.execute(
+                "SELECT key, namespace FROM llm_cache ORDER BY accessed_at LIMIT ?", (overflow,)
+            ).fetchall()
+            conn.executemany("DELETE FROM llm_cache WHERE key=?", [(key,) for key, _ in rows])
+            for _, namespace in rows:
+                self._count(namespace, "evictions")
+
+    def get_or_compute(self, namespace: str, content, prompt_version: str, model: str,
+                       compute: Callable[[], object], cacheable: Optional[Callable[[object], bool]] = None):
+        # 캐시에 있으면 그대로 반환하고, 없으면 compute 결과를 저장 (cacheable이 False면 저장하지 않음)
+        if not self.enabled:
+            return compute()
+        key = self.make_key(namespace, content, prompt_version, model)
+        try:
+            cached = self.get(namespace, key)
+        except Exception as e:
+            logging.error(f"Error reading LLM cache ({namespace}): {e}")
+            cached = None
+        if cached is not None:
+            logging.info(f"LLM cache hit ({namespace}): {key[:12]}")
+            return cached
+
+        value = compute()
+        if cacheable is None or cacheable(value):
+            try:
+                self.set(namespace, key, value)
+            except Exception as e:
+                logging.error(f"Error writing LLM cache ({namespace}): {e}")
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {namespace: dict(values) for namespace, values in self._stats.items()}
+        for values in stats.values():
+            total = values["hits"] + values["misses"]
+            values["hit_rate"] = values["hits"] / total if total else 0.0
+        return stats
+
+
+# 프로세스 전체에서 공유하는 캐시
+cache = LLMCache()
@@ -1,17 +1,30 @@
-from fastapi import FastAPI, Body, UploadFile, File, Form, BackgroundTasks
-import base64
-import extract_profile
-import make_profile
-import make_scenario
-import make_webtoon
+from fastapi import FastAPI, Body, UploadFile, File, Form, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import threading
+import uuid
+from typing import Optional
+import pipeline
+import prediction_manager
+import http_client
+import job_queue
+import job_registry
+import job_control
+import idempotency
+import admission
+import model_registry
+import upload_intake
+import workspace
+import resilience
+import metrics
+import tracing
+import webhook_outbox
+import worker
 import logging
 import os
-import requests
-from typing import Optional
-import boto3
 from dotenv import load_dotenv
-import posixpath
-import re
 
 
 # 로컬 개발 환경에서만 .env 파일을 로드
@@ -22,7 +35,56 @@ if os.path.exists(dotenv_path):
 else:
     logging.info(f".env 파일({dotenv_path})이 존재하지 않습니다. 환경 변수를 직접 설정합니다.")
 
-app = FastAPI()
+# API 프로세스 안에서도 잡을 처리할지 여부 (워커를 따로 띄우면 false로 설정)
+RUN_EMBEDDED_WORKER = os.getenv('RUN_EMBEDDED_WORKER', 'true').lower() in ('1', 'true', 'yes')
+
+# SSE 스트림 설정
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', 0.5))
+JOB_EVENTS_KEEPALIVE = float(os.getenv('JOB_EVENTS_KEEPALIVE', 15))
+
+# /webtoon/batch 설정
+WEBTOON_BATCH_GROUP_SIZE = max(1, int(os.getenv('WEBTOON_BATCH_GROUP_SIZE', 8)))  # 배치 잡 하나(콜백 한 번)에 묶을 최대 일기 수
+WEBTOON_BATCH_MAX_LINE_BYTES = int(os.getenv('WEBTOON_BATCH_MAX_LINE_BYTES', 1024 * 1024))
+WEBTOON_BATCH_FIELDS = {"memberId": str, "date": str, "content": str, "characterInfo": str,
+                        "seedNum": int, "characterStyle": str, "apiDomainUrl": str}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 공유 HTTP 커넥션 풀과 Replicate 예측 매니저(공유 이벤트 루프) 시작/종료
+    tracing.setup()
+    http_client.startup()
+    prediction_manager.manager.start()
+    webhook_outbox.dispatcher.start()
+    job_registry.registry.prune()
+    job_queue.queue.prune()
+    workspace.manager.sweep((pipeline.UPLOAD_FOLDER,))
+    # 모델 버전 조회는 Replicate 응답을 기다리므로 시작을 막지 않도록 백그라운드에서
+    threading.Thread(target=model_registry.registry.warm, name="model-registry-warm", daemon=True).start()
+    embedded_worker = None
+    if RUN_EMBEDDED_WORKER:
+        embedded_worker = worker.Worker(job_queue.queue)
+        embedded_worker.start()
+    yield
+    if embedded_worker:
+        embedded_worker.stop()
+    webhook_outbox.dispatcher.stop()
+    prediction_manager.manager.stop()
+    http_client.shutdown()
+    tracing.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+# 업로드 크기 제한은 폼 파싱 전에 적용 (큰 본문을 임시 파일에 다 받기 전에 413으로 끊음)
+app.add_middleware(upload_intake.UploadSizeLimitMiddleware, paths=('/character',))
+
+if not tracing.FRAMEWORK_SERVER_SPANS:
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        # 요청마다 서버 스팬 생성 (호출 측 traceparent가 있으면 이어서 기록)
+        with tracing.span(f"{request.method} {request.url.path}", context=tracing.extract(dict(request.headers)),
+                          **{"http.method": request.method, "http.target": request.url.path}):
+            response = await call_next(request)
+            tracing.set_attributes(**{"http.status_code": response.status_code})
+            return response
 
 for handler in logging.root.handlers[:]:
     logging.root.removeHandler(handler)
@@ -37,230 +99,29 @@ logging.basicConfig(
     ]
 )
 
-# 환경 변수 로드
-models = dict()
-models['romance'] = ["tpals0409/romance-webtoon-character", "64ad94c7f1fe7cfe73ee7b3d0f7deae8a59d201689eb12d07f74baa9325949e0"]
-models['pixar'] = ["tpals0409/test_pixar", "32c27ef90bb8b1b2c272809059306a6ecc3e7b903b694857fefa0175d7726ca6"]
-
-# 업로드할 파일 경로
-UPLOAD_FOLDER = './uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# AWS 설정
-AWS_REGION = os.getenv('AWS_REGION', 'ap-northeast-2')
-BUCKET_NAME = os.getenv('BUCKET_NAME')
-
-# 로드된 환경 변수 로그에 출력
-logging.info(f"AWS_REGION: {AWS_REGION}")
-logging.info(f"BUCKET_NAME: {BUCKET_NAME}")
-
-# S3 클라이언트 생성
-s3_client = boto3.client('s3', region_name=AWS_REGION)
-
-DEFAULT_PATH = 'webtoon-ai/'  # 디폴트 경로 설정
-
-def encode_image(image_path: str) -> str:
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-
-def sanitize_member_id(member_id: str) -> str:
-    # 허용할 문자 패턴을 정의 (예: 알파벳 소문자, 숫자, 언더스코어)
-    sanitized = re.sub(r'[^a-zA-Z0-9_]', '', member_id)
-    logging.info(f"Sanitized memberId: {sanitized}")
-    return sanitized
-
-def upload_image_to_s3(file_path: str, member_id: str, date: Optional[str] = None, is_profile: bool = True) -> Optional[str]:
-    logging.info(f"Original member_id: {member_id}")
-    member_id = sanitize_member_id(member_id)
-    logging.info(f"Sanitized member_id: {member_id}")
-
-    logging.info(f"Uploading {'profile' if is_profile else 'webtoon'} image for member_id: {member_id}")
-    logging.info(f"DEFAULT_PATH: {DEFAULT_PATH}")
-    logging.info(f"File Path: {file_path}")
-
-    if not BUCKET_NAME:
-        logging.error("BUCKET_NAME is not set. Cannot upload to S3.")
-        return None
-
-    if not isinstance(file_path, str):
-        logging.error(f"Invalid file_path type: {type(file_path)}. Expected str.")
-        return None
-
-    if not os.path.isfile(file_path):
-        logging.error(f"Error: File {file_path} does not exist.")
-        return None
-
-    # S3에 저장할 객체 이름 설정 (posixpath 사용)
-    if is_profile:
-        # 프로필 이미지의 경우, 'profile_leo.webp'로 명명
-        filename = f"temp_profile.webp"
-        object_name = posixpath.join(DEFAULT_PATH, member_id, filename)
-    elif date:
-        # 웹툰 이미지의 경우, 날짜 폴더 안에 저장
-        object_name = posixpath.join(DEFAULT_PATH, member_id, date, os.path.basename(file_path))
-    else:
-        logging.error("Invalid parameters: either date should be provided for webtoon images or is_profile should be True.")
-        return None
-
-    logging.info(f"Object Name: {object_name}")
-
-    try:
-        s3_client.upload_file(
-            file_path,
-            BUCKET_NAME,
-            object_name,
-            ExtraArgs={'ContentType': 'image/webp'}
-        )
-
-        s3_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
-        logging.info(f"Image successfully uploaded to S3: {s3_url}")
-        return s3_url
-    except Exception as e:
-        logging.error(f"Error uploading image to S3: {type(e).__name__}: {e}")
-        return None
-
-def download_webp(url: str, imgName: str) -> Optional[str]:
-    default_path = './uploads'
-    if not os.path.exists(default_path):
-        os.makedirs(default_path)
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # 요청 에러가 있는 경우 예외 발생
-        file_path = os.path.join(default_path, f'{imgName}.webp')
-        with open(file_path, "wb") as f:
-            f.write(response.content)
-        logging.info(f"File downloaded successfully and saved to {file_path}")
-        return file_path
-    except Exception as e:
-        logging.error(f"Error downloading file from {url}: {type(e).__name__}: {e}")
-        return None
-
-def process_profile_background(memberId: str, file_path: str, characterStyle: str, apiDomainUrl: str):
-    model_type = models[characterStyle][0]
-    version_type = models[characterStyle][1]
-
-    try:
-        logging.info(f"Processing profile for memberId: {memberId}")
-        # 이미지 Base64 인코딩
-        base64_image = encode_image(file_path)
-
-        # extract_profile 모듈을 사용해 GPT 응답 받기
-        user_id_response, gpt = extract_profile.get_gpt_response(memberId, base64_image)
-        logging.info(f"Character Info: {gpt}")
-
-        if user_id_response != memberId:
-            logging.error("User ID mismatch")
-            return
-
-        # make_profile 모듈을 사용해 프로필 생성
-        seed, image = make_profile.create_profile(model_type, version_type, gpt)
-        logging.info(f"Seed: {seed}")
-        logging.info(f"Image: {image}")
-
-        # image는 단일 URL 문자열로 가정
-        image_url = image
-
-        if not image_url:
-            logging.error("No image URL returned from create_profile")
-            return
-
-        # 이미지 URL을 로컬에 다운로드
-        local_image_path = download_webp(image_url, f"temp_profile")
-        if not local_image_path:
-            logging.error(f"Failed to download profile image from URL: {image_url}")
-            return
-
-        # 이미지 S3에 업로드 (다운로드한 로컬 파일 경로 사용)
-        logging.info(f"Uploading profile image: {local_image_path} for memberId: {memberId}")
-        s3_url = upload_image_to_s3(local_image_path, memberId, is_profile=True)
-        if s3_url:
-            logging.info(f"Profile image uploaded to S3: {s3_url}")
-            os.remove(local_image_path)
-            logging.info(f"Local profile image {local_image_path} deleted after successful upload.")
-        else:
-            logging.error("Failed to upload profile image to S3.")
-
-        # 원본 파일 삭제
-        os.remove(file_path)
-        logging.info(f"Local file {file_path} deleted after successful upload.")
-
-        # 결과 데이터 준비
-        result_data = {
-            "memberId": sanitize_member_id(memberId),
-            "characterInfo": gpt,
-            "characterStyle": "romance",
-            "seedNum": seed,
-            "characterProfileImageUrl": s3_url
-        }
-        try:
-            webhook_url = f"http://{apiDomainUrl}/api/v1/webhook/ai/character"  # 수정된 부분
-            response = requests.post(webhook_url, json=result_data)  # 수정된 부분
-            # response = requests.post(f"http://localhost:8080/api/v1/webhook/ai/character", json=result_data)
-            if response.status_code == 200:
-                logging.info("Profile data successfully posted")
-            else:
-                logging.error(f"Failed to post profile data. Status code: {response.status_code}")
-        except Exception as e:
-            logging.error(f"Error while posting profile data: {e}")
-
-    except Exception as e:
-        logging.error(f"Error in process_profile_background: {e}")
-
-def process_webtoon_background(memberId: str, date: str, content: str, characterInfo: str, seedNum: int, characterStyle: str, apiDomainUrl: str):
-    try:
-        logging.info(f"Processing webtoon for memberId: {memberId}, date: {date}")
-        # 시나리오 생성
-        user_id_response, scenario = make_scenario.get_gpt_response(memberId, content)
-        logging.info(f"Scenario: {scenario}")
-        model_type = models[characterStyle][0]
-        version_type = models[characterStyle][1]
-        results = []
-        for i, scene in enumerate(scenario):
-            logging.info(f"Processing scenario {i}: {scene}")
-            image_urls = make_webtoon.create_webtoon(memberId, characterInfo, seedNum, scene, model_type, version_type)
-            logging.info(f"Webtoon images created: {image_urls}")
-
-            # image_urls는 리스트라고 가정합니다.
-            for j, image_url in enumerate(image_urls):
-                logging.info(f"Processing image {j} for scenario {i}: {image_url}")
-
-                # 이미지 다운로드
-                local_image_path = download_webp(image_url, f"{i+1}")
-                if local_image_path:
-                    # S3에 이미지 업로드 (memberId를 문자열로 변환)
-                    logging.info(f"Uploading webtoon image: {local_image_path} for memberId: {memberId}")
-                    s3_url = upload_image_to_s3(local_image_path, memberId, date=date, is_profile=False)
-                    if s3_url:
-                        logging.info(f"Webtoon image uploaded to S3: {s3_url}")
-                        results.append({"scenario": scene, "image": s3_url})
-                        # 로컬 파일 삭제
-                        os.remove(local_image_path)
-                        logging.info(f"Local file {local_image_path} deleted after successful upload.")
-                    else:
-                        logging.error(f"Failed to upload webtoon image {j} for scenario {i} to S3.")
-                else:
-                    logging.error(f"Failed to download image from {image_url}")
-
-        # 결과를 POST 요청으로 다른 서비스에 전송
-        result_data = {
-            "memberId": memberId,
-            "date": date,
-            "webtoonFolderUrl": f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{DEFAULT_PATH}{memberId}/{date}/",
-            "webtoonImages": results
-        }
-        try:
-            webhook_url = f"http://{apiDomainUrl}/api/v1/webhook/ai/webtoon"  # 수정된 부분
-            response = requests.post(webhook_url, json=result_data)  # 수정된 부분
-            # response = requests.post("http://localhost:8080/api/v1/webhook/ai/webtoon", json=result_data)
-            if response.status_code == 200:
-                logging.info("Webtoon data successfully posted")
-            else:
-                logging.error(f"Failed to post webtoon data. Status code: {response.status_code}")
-        except Exception as e:
-            logging.error(f"Error while posting webtoon data: {e}")
-
-    except Exception as e:
-        logging.error(f"Error in process_webtoon_background: {e}")
+def duplicate_response(label: str, job: dict) -> dict:
+    # 중복 요청: 진행 중이면 기존 잡에 붙이고, 완료됐으면 저장된 결과 반환
+    if job["status"] == job_registry.SUCCEEDED:
+        return {"message": f"{label} already processed", "jobId": job["jobId"], "result": job["result"]}
+    return {"message": f"{label} processing already in progress", "jobId": job["jobId"]}
+
+def register_job(kind: str, member_id: str, payload: dict, job_id: str, priority: Optional[str] = None) -> Optional[int]:
+    # 잡 레지스트리와 큐에 등록하고 대기열 순번 반환 (SQLite 쓰기가 이벤트 루프를 막지 않도록 asyncio.to_thread로 호출)
+    job_registry.registry.create(job_id, kind, member_id)
+    job_queue.queue.enqueue(kind, payload, job_id=job_id, priority=priority)
+    return job_queue.queue.position(job_id)
+
+def key_reused_response() -> JSONResponse:
+    # 같은 Idempotency-Key를 내용이 다른 요청에 다시 쓰면 기존 잡에 붙이지 않고 거절
+    return JSONResponse(status_code=422, content={"message": "Idempotency-Key was already used for a different request"})
+
+def queue_full_response(depth: int) -> JSONResponse:
+    # 대기열이 가득 차면 잡을 받지 않고 나중에 다시 시도하도록 안내
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(admission.ADMISSION_RETRY_AFTER)},
+        content={"message": "Too many jobs waiting, retry later", "queueDepth": depth},
+    )
 
 @app.post('/character', summary="프로필 이미지 처리", description="사용자의 프로필 이미지를 처리하고 S3에 업로드합니다.")
 async def process_profile(
@@ -268,22 +129,58 @@ async def process_profile(
     characterStyle: str = Form(...),
     userImage: UploadFile = File(...),
     apiDomainUrl: str = Form(...),
-    background_tasks: BackgroundTasks = None
+    idempotencyKey: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
+    key, job_id, stored = None, uuid.uuid4().hex, None
     try:
         logging.info(f"Received /ai/character request for memberId: {memberId}")
-        # 파일 저장 경로 설정 및 저장
-        file_path = os.path.join(UPLOAD_FOLDER, userImage.filename)
-        with open(file_path, "wb") as buffer:
-            buffer.write(await userImage.read())
-        logging.info(f"File saved to {file_path}")
-
-        # 백그라운드 작업 실행
-        background_tasks.add_task(process_profile_background, memberId, file_path, characterStyle, apiDomainUrl)
-
-        return {"message": "Profile processing started"}
+        # 업로드를 청크 단위로 고유한 파일에 저장하면서 형식/크기 확인과 해시 계산
+        try:
+            stored = await upload_intake.save_upload(userImage, pipeline.UPLOAD_FOLDER)
+        except upload_intake.UnsupportedImageError as e:
+            return JSONResponse(status_code=415, content={"message": str(e)})
+        except upload_intake.UploadTooLargeError as e:
+            return JSONResponse(status_code=413, content={"message": str(e)})
+
+        # 같은 요청이 이미 처리 중이거나 최근에 끝났으면 기존 잡 사용
+        # 클라이언트 키는 회원 범위로 한정하고, 같은 키로 내용이 다른 요청이 오면 거절하도록 본문 지문을 함께 저장
+        if idempotencyKey:
+            key = idempotency.client_key('profile', memberId, idempotencyKey)
+            fingerprint = idempotency.derive_key('profile', memberId, characterStyle, stored.sha256, apiDomainUrl)
+        else:
+            key, fingerprint = idempotency.derive_key('profile', memberId, characterStyle, stored.sha256), None
+        try:
+            existing = await asyncio.to_thread(idempotency.resolve, key, job_id, fingerprint)
+        except idempotency.IdempotencyKeyReusedError:
+            await asyncio.to_thread(upload_intake.discard, stored.path)
+            return key_reused_response()
+        if existing:
+            await asyncio.to_thread(upload_intake.discard, stored.path)
+            return duplicate_response("Profile", existing)
+
+        depth = await asyncio.to_thread(job_queue.queue.depth)
+        if await asyncio.to_thread(admission.controller.queue_full, depth):
+            await asyncio.to_thread(idempotency.store.release, key, job_id)
+            await asyncio.to_thread(upload_intake.discard, stored.path)
+            return queue_full_response(depth)
+
+        # 잡 큐에 등록 (워커가 처리)
+        position = await asyncio.to_thread(register_job, 'profile', memberId, {
+            "memberId": memberId,
+            "file_path": stored.path,
+            "characterStyle": characterStyle,
+            "apiDomainUrl": apiDomainUrl,
+            "imageSha256": stored.sha256,
+            tracing.PAYLOAD_KEY: tracing.inject(),
+        }, job_id)
+
+        return {"message": "Profile processing started", "jobId": job_id, "queuePosition": position}
     except Exception as e:
         logging.error(f"Error in /ai/character endpoint: {e}")
+        if key:
+            await asyncio.to_thread(idempotency.store.release, key, job_id)
+        if stored:
+            await asyncio.to_thread(upload_intake.discard, stored.path)
         return {"message": "Failed to start profile processing"}
 
 @app.post('/webtoon', summary="웹툰 생성", description="웹툰을 생성하고 S3에 업로드합니다.")
@@ -295,22 +192,303 @@ async def process_webtoon(
     seedNum: int = Body(...),
     characterStyle: str = Body(...),
     apiDomainUrl: str = Body(...),
-    background_tasks: BackgroundTasks = None
+    priority: Optional[str] = Body(None),  # interactive | standard | backfill (기본 standard)
+    progressiveCallbacks: Optional[bool] = Body(None),  # true면 패널마다 /webtoon/panel 콜백 (기본 WEBTOON_PROGRESSIVE_CALLBACKS)
+    idempotencyKey: Optional[str] = Header(None, alias='Idempotency-Key')
 ):
+    if priority is not None and priority not in job_queue.PRIORITY_CLASSES:
+        return JSONResponse(status_code=400, content={"message": f"Unknown priority: {priority}"})
+    key, job_id = None, uuid.uuid4().hex
     try:
         logging.info(f"Received /ai/webtoon request for memberId: {memberId}, date: {date}")
         # 로그 남기기
         logging.info(f"Received parameters: memberId={memberId}, date={date}, content={content}, "
                      f"characterInfo={characterInfo}, seedNum={seedNum}, characterStyle={characterStyle}")
 
-        # 백그라운드 작업 실행
-        background_tasks.add_task(process_webtoon_background, memberId, date, content, characterInfo, seedNum, characterStyle, apiDomainUrl)
-
-        return {"message": "Webtoon processing started"}
+        # 같은 요청이 이미 처리 중이거나 최근에 끝났으면 기존 잡 사용
+        # 클라이언트 키는 회원 범위로 한정하고, 같은 키로 내용이 다른 요청이 오면 거절하도록 본문 지문을 함께 저장
+        if idempotencyKey:
+            key = idempotency.client_key('webtoon', memberId, idempotencyKey)
+            fingerprint = idempotency.derive_key('webtoon', memberId, date, characterStyle, seedNum, characterInfo, content,
+                                                 apiDomainUrl, priority, progressiveCallbacks)
+        else:
+            key, fingerprint = idempotency.derive_key('webtoon', memberId, date, characterStyle, seedNum, characterInfo, content), None
+        try:
+            existing = await asyncio.to_thread(idempotency.resolve, key, job_id, fingerprint)
+        except idempotency.IdempotencyKeyReusedError:
+            return key_reused_response()
+        if existing:
+            return duplicate_response("Webtoon", existing)
+
+        depth = await asyncio.to_thread(job_queue.queue.depth)
+        if await asyncio.to_thread(admission.controller.queue_full, depth):
+            await asyncio.to_thread(idempotency.store.release, key, job_id)
+            return queue_full_response(depth)
+
+        # 잡 큐에 등록 (워커가 처리)
+        position = await asyncio.to_thread(register_job, 'webtoon', memberId, {
+            "memberId": memberId,
+            "date": date,
+            "content": content,
+            "characterInfo": characterInfo,
+            "seedNum": seedNum,
+            "characterStyle": characterStyle,
+            "apiDomainUrl": apiDomainUrl,
+            "progressiveCallbacks": progressiveCallbacks,
+            tracing.PAYLOAD_KEY: tracing.inject(),
+        }, job_id, priority)
+
+        return {"message": "Webtoon processing started", "jobId": job_id, "queuePosition": position}
     except Exception as e:
         logging.error(f"Error in /ai/webtoon endpoint: {e}")
+        if key:
+            await asyncio.to_thread(idempotency.store.release, key, job_id)
         return {"message": "Failed to start webtoon processing"}
 
+async def ndjson_lines(request: Request):
+    # 요청 본문을 버퍼링하지 않고 줄 단위로 읽음
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            yield line
+        if len(buffer) > WEBTOON_BATCH_MAX_LINE_BYTES:
+            raise ValueError(f"Line longer than {WEBTOON_BATCH_MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield buffer
+
+def parse_batch_item(line: bytes) -> dict:
+    # /webtoon 요청 본문과 같은 필드를 가진 JSON 한 줄
+    item = json.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object")
+    missing = [name for name in WEBTOON_BATCH_FIELDS if name not in item]
+    if missing:
+        raise ValueError(f"missing fields {missing}")
+    try:
+        item = {name: cast(item[name]) for name, cast in WEBTOON_BATCH_FIELDS.items()}
+    except (TypeError, ValueError):
+        raise ValueError("seedNum must be an integer")
+    if item["characterStyle"] not in model_registry.registry.styles():
+        raise ValueError(f"unknown characterStyle {item['characterStyle']}")
+    return item
+
+def enqueue_batch_group(batch_id: str, entries: list, priority: str) -> list:
+    # 같은 회원이 같은 모델/캐릭터/콜백 주소로 보낸 일기들을 배치 잡 하나로 등록하고 줄별 응답을 반환
+    # (묶음 잡도 memberId로 큐에 넣어야 회원별 공정 분배(DRR)가 배치에도 적용됨)
+    # entries: [(줄 번호, 항목, 멱등성 키, 잡 ID)]
+    first = entries[0][1]
+    depth = job_queue.queue.depth()
+    if admission.controller.queue_full(depth):
+        for _, _, key, job_id in entries:
+            idempotency.store.release(key, job_id)
+        return [{"line": line_no, "status": 429, "message": "Too many jobs waiting, retry later", "queueDepth": depth}
+                for line_no, *_ in entries]
+    group_job_id = uuid.uuid4().hex
+    try:
+        for _, item, _, job_id in entries:
+            job_registry.registry.create(job_id, 'webtoon', item["memberId"])
+        job_registry.registry.create(group_job_id, 'webtoon_batch', first["memberId"])
+        job_queue.queue.enqueue('webtoon_batch', {
+            "batchId": batch_id,
+            "memberId": first["memberId"],
+            "items": [{"jobId": job_id, "memberId": item["memberId"], "date": item["date"],
+                       "content": item["content"], "seedNum": item["seedNum"]} for _, item, _, job_id in entries],
+            "characterStyle": first["characterStyle"],
+            "characterInfo": first["characterInfo"],
+            "apiDomainUrl": first["apiDomainUrl"],
+            tracing.PAYLOAD_KEY: tracing.inject(),
+        }, job_id=group_job_id, priority=priority, cost=job_queue.JOB_COSTS['webtoon'] * len(entries))
+    except Exception as e:
+        logging.error(f"Error enqueueing webtoon batch {batch_id}: {e}")
+        for _, _, key, job_id in entries:
+            idempotency.store.release(key, job_id)
+        return [{"line": line_no, "status": 500, "message": "Failed to start webtoon processing"} for line_no, *_ in entries]
+    return [{"line": line_no, "status": 202, "message": "Webtoon processing started", "jobId": job_id}
+            for line_no, _, _, job_id in entries]
+
+@app.post('/webtoon/batch', summary="웹툰 일괄 생성",
+          description="/webtoon 요청 본문을 한 줄에 하나씩 담은 NDJSON을 받아 웹툰을 일괄 생성합니다. "
+                      "본문은 도착하는 대로 줄 단위로 처리하고, 같은 모델/캐릭터의 일기는 묶어서 처리하며 완료 콜백도 묶어서 보냅니다.")
+async def process_webtoon_batch(request: Request, priority: str = 'backfill'):
+    if priority not in job_queue.PRIORITY_CLASSES:
+        return JSONResponse(status_code=400, content={"message": f"Unknown priority: {priority}"})
+    batch_id = uuid.uuid4().hex
+    logging.info(f"Received /ai/webtoon/batch request (batchId: {batch_id}, priority: {priority})")
+
+    groups, items = {}, []
+    line_no = 0
+    try:
+        try:
+            async for line in ndjson_lines(request):
+                line_no += 1
+                if not line.strip():
+                    continue
+                try:
+                    item = parse_batch_item(line)
+                except ValueError as e:
+                    items.append({"line": line_no, "status": 400, "message": f"Invalid item: {e}"})
+                    continue
+
+                # 일기별 중복 판정은 /webtoon과 같은 키를 사용 (단건으로 이미 요청한 일기도 중복 처리)
+                job_id = uuid.uuid4().hex
+                key = idempotency.derive_key('webtoon', item["memberId"], item["date"], item["characterStyle"],
+                                             item["seedNum"], item["characterInfo"], item["content"])
+                existing = await asyncio.to_thread(idempotency.resolve, key, job_id)
+                if existing:
+                    items.append({"line": line_no, "status": 200, **duplicate_response("Webtoon", existing)})
+                    continue
+
+                # 다 찬 묶음은 본문을 끝까지 읽기 전에 먼저 큐에 등록
+                group_key = (item["memberId"], item["characterStyle"], item["characterInfo"], item["apiDomainUrl"])
+                group = groups.setdefault(group_key, [])
+                group.append((line_no, item, key, job_id))
+                if len(group) >= WEBTOON_BATCH_GROUP_SIZE:
+                    items.extend(await asyncio.to_thread(enqueue_batch_group, batch_id, groups.pop(group_key), priority))
+        except ValueError as e:
+            # 줄이 너무 길면 더 읽지 않음 (그때까지 읽은 줄은 아래에서 등록)
+            items.append({"line": line_no + 1, "status": 413, "message": str(e)})
+
+        while groups:
+            items.extend(await asyncio.to_thread(enqueue_batch_group, batch_id, groups.pop(next(iter(groups))), priority))
+    finally:
+        # 클라이언트가 중간에 끊으면 아직 등록하지 않은 일기의 멱등성 키를 풀어서 다시 요청할 수 있게 함
+        for entries in groups.values():
+            for _, _, key, job_id in entries:
+                await asyncio.to_thread(idempotency.store.release, key, job_id)
+
+    items.sort(key=lambda outcome: outcome["line"])
+    summary = {
+        "accepted": sum(1 for outcome in items if outcome["status"] == 202),
+        "duplicate": sum(1 for outcome in items if outcome["status"] == 200),
+        "rejected": sum(1 for outcome in items if outcome["status"] >= 400),
+    }
+    logging.info(f"Webtoon batch {batch_id} accepted: {summary}")
+    return {"message": "Webtoon batch processing started", "batchId": batch_id, **summary, "items": items}
+
+@app.get('/jobs/{job_id}', summary="잡 상태 조회", description="잡의 현재 상태와 처리 단계, 결과를 반환합니다.")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_registry.registry.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    return job
+
+@app.post('/jobs/{job_id}/cancel', summary="잡 취소", description="대기 중이거나 처리 중인 잡을 취소합니다. 진행 중인 Replicate 예측도 함께 취소됩니다.")
+async def cancel_job(job_id: str, reason: Optional[str] = Body(None, embed=True)):
+    job = await asyncio.to_thread(job_registry.registry.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    if job["status"] in job_registry.TERMINAL_STATUSES:
+        return JSONResponse(status_code=409, content={"message": f"Job already {job['status']}", "jobId": job_id, "status": job["status"]})
+
+    reason = reason or 'canceled by request'
+    # 처리 중인 잡은 처리하는 프로세스가 예측을 취소한 뒤 canceled로 기록하고, 대기 중인 잡은 바로 canceled로 기록 (워커는 건너뜀)
+    running = await asyncio.to_thread(job_control.control.cancel, job_id, reason)
+    if job["status"] == job_registry.QUEUED and not running:
+        await asyncio.to_thread(job_registry.registry.cancel, job_id, reason)
+    logging.info(f"Cancel requested for job {job_id} ({job['status']}): {reason}")
+    return {"message": "Job cancellation requested", "jobId": job_id, "status": job["status"]}
+
+@app.get('/jobs/{job_id}/events', summary="잡 진행 이벤트 스트림", description="잡의 처리 단계를 Server-Sent Events로 전달합니다.")
+async def stream_job_events(job_id: str, request: Request):
+    job = await asyncio.to_thread(job_registry.registry.get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+
+    # 재연결 시 Last-Event-ID 이후 이벤트부터 전달
+    try:
+        last_seq = int(request.headers.get('last-event-id', 0))
+    except ValueError:
+        last_seq = 0
+
+    async def event_stream():
+        nonlocal last_seq
+        idle = 0.0
+        while True:
+            events = await asyncio.to_thread(job_registry.registry.events, job_id, last_seq)
+            for event in events:
+                last_seq = event["seq"]
+                yield f"id: {event['seq']}\nevent: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event["status"] in job_registry.TERMINAL_STATUSES:
+                    return
+            if await request.is_disconnected():
+                return
+            if events:
+                idle = 0.0
+            else:
+                idle += JOB_EVENTS_POLL_INTERVAL
+                if idle >= JOB_EVENTS_KEEPALIVE:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get('/stats/http', summary="HTTP 커넥션 통계", description="공유 커넥션 풀의 요청 수, 새 연결 수, 재사용률을 반환합니다.")
+async def get_http_stats():
+    return http_client.stats()
+
+@app.get('/stats/dependencies', summary="외부 의존성 회로 상태", description="OpenAI, Replicate, 다운로드, S3, 웹훅 호출의 회로 차단기 상태를 반환합니다.")
+async def get_dependency_stats():
+    return resilience.snapshot()
+
+@app.get('/stats/webhooks', summary="웹훅 아웃박스 상태", description="전송 대기, 전송 완료, 전송 포기(dead)한 콜백 수와 가장 오래 기다린 콜백의 대기 시간을 반환합니다.")
+async def get_webhook_stats():
+    return await asyncio.to_thread(webhook_outbox.outbox.stats)
+
+@app.get('/admission', summary="처리량 제한 상태", description="공급자/모델 버전별 동시 실행 한도와 초당 호출 한도, 현재 사용량을 반환합니다.")
+async def get_admission():
+    return admission.controller.snapshot()
+
+@app.put('/admission/limits', summary="처리량 제한 변경", description="공급자/모델 버전별 한도와 대기열 상한을 실행 중에 변경합니다. 워커 프로세스에도 반영됩니다.")
+async def update_admission_limits(limits: Optional[dict] = Body(None), maxQueued: Optional[int] = Body(None)):
+    try:
+        admission.controller.update(limits, maxQueued)
+    except (TypeError, ValueError) as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid limits: {e}"})
+    return admission.controller.snapshot()
+
+@app.get('/models', summary="모델 목록", description="characterStyle별 Replicate 모델과 버전, 버전 정보 캐시 상태를 반환합니다.")
+async def get_models():
+    return model_registry.registry.snapshot()
+
+@app.post('/models/reload', summary="모델 목록 다시 읽기", description="모델 버전 캐시를 비우고 목록을 다시 읽습니다. models로 characterStyle을 추가/변경(null이면 삭제)할 수 있으며, 워커 프로세스에도 반영됩니다.")
+async def reload_models(models: Optional[dict] = Body(None, embed=True)):
+    try:
+        await asyncio.to_thread(model_registry.registry.reload, models)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid models: {e}"})
+    return model_registry.registry.snapshot()
+
+@app.get('/metrics', summary="Prometheus 지표", description="단계별 소요 시간, 실패/재시도/캐시 적중 횟수, 처리 중인 잡 수를 Prometheus 형식으로 반환합니다.")
+async def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        return JSONResponse(status_code=503, content={"message": "Metrics are disabled (prometheus_client not installed)"})
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.post('/replicate/webhook', summary="Replicate 완료 웹훅", description="Replicate 예측 완료 알림을 받아 대기 중인 작업을 깨웁니다.")
+async def receive_replicate_webhook(request: Request):
+    body = await request.body()
+    if not prediction_manager.verify_webhook_signature(
+        body,
+        request.headers.get('webhook-id'),
+        request.headers.get('webhook-timestamp'),
+        request.headers.get('webhook-signature'),
+    ):
+        logging.error("Invalid Replicate webhook signature")
+        return JSONResponse(status_code=401, content={"message": "Invalid signature"})
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"message": "Invalid payload"})
+
+    matched = prediction_manager.manager.handle_webhook(payload)
+    logging.info(f"Replicate webhook received for prediction {payload.get('id')}: {payload.get('status')} (matched: {matched})")
+    return {"message": "Webhook received"}
+
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "0.0.0.0")
@@ -1,7 +1,17 @@
 from dotenv import load_dotenv
 import os
+import json
+import re
+import time
+import threading
 from openai import OpenAI
 import logging
+import llm_cache
+import admission
+import metrics
+import tracing
+import resilience
+import job_control
 
 # 로컬 개발 환경에서만 .env 파일을 로드
 dotenv_path = '.env'
@@ -19,12 +29,302 @@ if not OPENAI_KEY:
     raise ValueError("OPENAI_KEY is not set. Please set it in the environment variables.")
 
 # OpenAI 클라이언트 생성
+# 재시도는 resilience 모듈이 담당하므로 SDK 자체 재시도는 끔
 client = OpenAI(
-    api_key=OPENAI_KEY
+    api_key=OPENAI_KEY,
+    max_retries=0
 )
 
+SCENARIO_MODEL = 'gpt-4o-mini'
+# 프롬프트를 바꾸면 버전을 올려서 이전 캐시를 무효화
+PROMPT_VERSION = 'v2'
+SCENE_COUNT = 4
 
-def get_gpt_response(user_id, diary_text):
+# 시나리오 생성 방식: structured(한 번의 호출로 4장면 JSON 생성) | chained(장면마다 호출)
+SCENARIO_MODE = os.getenv('SCENARIO_MODE', 'structured')
+# 웹툰 생성 시 장면이 나오는 대로 패널 렌더링을 시작할지 여부 (false면 4장면을 모두 받은 뒤 시작)
+SCENARIO_STREAMING = os.getenv('SCENARIO_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+
+# structured 모드 응답 스키마
+SCENARIO_SCHEMA = {
+    "name": "webtoon_scenario",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "scenes": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "scene": {"type": "string"},
+                        "background": {"type": "string"},
+                    },
+                    "required": ["scene", "background"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["scenes"],
+        "additionalProperties": False,
+    },
+}
+
+# 모드별 호출 시간/토큰 누적값 (벤치마크 비교용)
+scenario_stats = {
+    mode: {"calls": 0, "requests": 0, "failures": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+    for mode in ("structured", "chained")
+}
+_stats_lock = threading.Lock()
+
+
+def record_stats(mode, seconds, usages, failed=False):
+    with _stats_lock:
+        stats = scenario_stats[mode]
+        stats["calls"] += 1
+        stats["requests"] += len(usages)
+        stats["failures"] += int(failed)
+        stats["seconds"] += seconds
+        for usage in usages:
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens
+                stats["completion_tokens"] += usage.completion_tokens
+    logging.info(f"Scenario generation ({mode}): {seconds:.2f}s, requests: {len(usages)}, failed: {failed}")
+
+
+def get_scenario_stats():
+    with _stats_lock:
+        return {mode: dict(stats) for mode, stats in scenario_stats.items()}
+
+
+def format_scene(scene, background):
+    # chained 모드 출력과 같은 형태로 맞춤
+    return f"Scene:\n\t{scene.strip()}\nBackground:\n\t{background.strip()}"
+
+
+def parse_structured_scenario(content):
+    data = json.loads(content)
+    scenes = data.get("scenes") if isinstance(data, dict) else None
+    if not isinstance(scenes, list) or len(scenes) != SCENE_COUNT:
+        raise ValueError(f"Expected {SCENE_COUNT} scenes, got {len(scenes) if isinstance(scenes, list) else type(scenes).__name__}")
+    scenario = []
+    for item in scenes:
+        if not isinstance(item, dict) or not str(item.get("scene", "")).strip() or not str(item.get("background", "")).strip():
+            raise ValueError(f"Invalid scene item: {item}")
+        scenario.append(format_scene(item["scene"], item["background"]))
+    return scenario
+
+
+def structured_prompt(diary_text):
+    return (
+        "You are responsible for converting the user's diary into FOUR distinct SCENES, which will be used to train a LoRA model.\n"
+        "Instructions:\n"
+        "1. Split the diary into four visually distinct moments or key actions, in chronological order.\n"
+        "2. Clearly describe each **Scene** and **Background** in detail, emphasizing spatial layout and atmosphere.\n"
+        "3. Each scene must stand on its own: avoid referencing other scenes or characters (e.g., 'they', 'friends').\n"
+        "4. For each scene, 'scene' describes the key action or moment visually, and 'background' describes the setting, "
+        "including objects, time, and environment.\n"
+        "[User's Diary]:\n"
+        f"\t{diary_text}\n"
+    )
+
+
+def get_structured_scenario(diary_text):
+    # 한 번의 호출로 4개 장면을 JSON 스키마에 맞춰 생성
+    started = time.monotonic()
+    usage = None
+    try:
+        with admission.controller.limit('openai'):
+            response = resilience.openai.call(
+                client.chat.completions.create,
+                model=SCENARIO_MODEL,
+                messages=[
+                    {'role': 'system', 'content': structured_prompt(diary_text)},
+                    {'role': 'user', 'content': f'make {SCENE_COUNT} scenes'},
+                ],
+                max_tokens=2000,
+                temperature=0.5,
+                response_format={"type": "json_schema", "json_schema": SCENARIO_SCHEMA},
+                timeout=job_control.timeout('scenario'),
+            )
+        usage = response.usage
+        scenario = parse_structured_scenario(response.choices[0].message.content)
+    except Exception:
+        record_stats("structured", time.monotonic() - started, [usage], failed=True)
+        raise
+    record_stats("structured", time.monotonic() - started, [usage])
+    return scenario
+
+
+class SceneStreamParser:
+    # structured 응답을 스트리밍으로 받으면서 scenes 배열 안의 장면 객체가 닫힐 때마다 꺼낸다.
+    # 문자열 안의 괄호/이스케이프는 건너뛰고 깊이만 추적하므로 부분 JSON을 매번 다시 파싱하지 않는다.
+
+    def __init__(self):
+        self.buffer = ''
+        self._pos = None  # scenes 배열 안에서 다음에 볼 위치 (배열을 찾기 전에는 None)
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+        self.done = False
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        if self._pos is None:
+            match = re.search(r'"scenes"\s*:\s*\[', self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+        items = []
+        while self._pos < len(self.buffer) and not self.done:
+            char = self.buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._start = self._pos
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    self.done = True  # scenes 배열 끝
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        items.append(json.loads(self.buffer[self._start:self._pos + 1]))
+            self._pos += 1
+        return items
+
+
+def stream_structured_scenario(diary_text):
+    # get_structured_scenario와 같은 호출을 스트리밍으로 받아서 장면이 완성되는 대로 yield
+    started = time.monotonic()
+    usage = None
+    parser = SceneStreamParser()
+    count = 0
+    try:
+        with admission.controller.limit('openai'):
+            stream = resilience.openai.call(
+                client.chat.completions.create,
+                model=SCENARIO_MODEL,
+                messages=[
+                    {'role': 'system', 'content': structured_prompt(diary_text)},
+                    {'role': 'user', 'content': f'make {SCENE_COUNT} scenes'},
+                ],
+                max_tokens=2000,
+                temperature=0.5,
+                response_format={"type": "json_schema", "json_schema": SCENARIO_SCHEMA},
+                timeout=job_control.timeout('scenario'),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                job_control.check('scenario')
+                usage = chunk.usage or usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                for item in parser.feed(chunk.choices[0].delta.content):
+                    if not isinstance(item, dict) or not str(item.get("scene", "")).strip() or not str(item.get("background", "")).strip():
+                        raise ValueError(f"Invalid scene item: {item}")
+                    count += 1
+                    if count <= SCENE_COUNT:
+                        yield format_scene(item["scene"], item["background"])
+        # 스트림이 끝난 뒤 전체 응답으로 장면 수 확인
+        parse_structured_scenario(parser.buffer)
+    except Exception:
+        record_stats("structured", time.monotonic() - started, [usage], failed=True)
+        raise
+    record_stats("structured", time.monotonic() - started, [usage])
+
+
+def stream_scenario(user_id, diary_text, mode=None):
+    # 장면을 순서대로 하나씩 yield. 첫 장면이 나오면 바로 렌더링을 시작할 수 있다.
+    # structured 스트림이 장면을 하나도 내보내기 전에 실패하면 chained 모드로 4장면을 새로 만듦.
+    # 장면을 내보낸 뒤에 실패하면 그대로 실패시킴 (chained 장면은 일기를 다르게 나누므로 이어 붙이면 장면이 겹치거나 빠짐)
+    mode = mode or SCENARIO_MODE
+    key = llm_cache.cache.make_key('make_scenario', diary_text, f"{PROMPT_VERSION}-{mode}", SCENARIO_MODEL)
+    try:
+        cached = llm_cache.cache.get('make_scenario', key)
+    except Exception as e:
+        logging.error(f"Error reading LLM cache (make_scenario): {e}")
+        cached = None
+    if cached is not None:
+        logging.info(f"LLM cache hit (make_scenario): {key[:12]}")
+        yield from cached
+        return
+
+    started = time.time()
+    scenario = []
+    try:
+        if mode == "structured":
+            try:
+                for scene in stream_structured_scenario(diary_text):
+                    if not scenario:
+                        metrics.observe('scenario_first_scene', time.time() - started)
+                    scenario.append(scene)
+                    yield scene
+            except Exception as e:
+                if scenario:
+                    logging.error(f"Structured scenario streaming failed after {len(scenario)} scenes: {type(e).__name__}: {e}")
+                    raise
+                logging.error(f"Structured scenario streaming failed, falling back to chained mode: {type(e).__name__}: {e}")
+        if not scenario:
+            for scene in iter_chained_scenes(diary_text):
+                if not scenario:
+                    metrics.observe('scenario_first_scene', time.time() - started)
+                scenario.append(scene)
+                yield scene
+    except Exception:
+        metrics.failure('scenario')
+        raise
+    finally:
+        # 장면 생성 구간 스팬은 끝난 뒤에 기록 (yield 사이에 렌더링 스팬이 자식으로 붙지 않도록)
+        metrics.observe('scenario', time.time() - started)
+        tracing.record_span('scenario', started, time.time(), mode=mode, scenes=len(scenario))
+
+    if len(scenario) != SCENE_COUNT:
+        return
+    try:
+        llm_cache.cache.set('make_scenario', key, scenario)
+    except Exception as e:
+        logging.error(f"Error writing LLM cache (make_scenario): {e}")
+
+
+@metrics.track('scenario')
+def get_gpt_response(user_id, diary_text, mode=None):
+    mode = mode or SCENARIO_MODE
+    # 같은 일기로 재시도한 경우 캐시된 시나리오 사용
+    scenario = llm_cache.cache.get_or_compute(
+        'make_scenario', diary_text, f"{PROMPT_VERSION}-{mode}", SCENARIO_MODEL,
+        lambda: generate_scenario(user_id, diary_text, mode),
+        cacheable=lambda result: len(result) == SCENE_COUNT,
+    )
+    return user_id, scenario
+
+
+def generate_scenario(user_id, diary_text, mode):
+    if mode == "structured":
+        try:
+            return get_structured_scenario(diary_text)
+        except Exception as e:
+            # 구조화 응답 파싱에 실패하면 기존 chained 모드로 재시도
+            logging.error(f"Structured scenario generation failed, falling back to chained mode: {type(e).__name__}: {e}")
+    return get_chained_response(user_id, diary_text)[1]
+
+
+def get_chained_response(user_id, diary_text):
+    return user_id, list(iter_chained_scenes(diary_text))
+
+
+def iter_chained_scenes(diary_text):
+    # 장면마다 호출하고, 응답이 오는 대로 장면을 yield
     prompt = (
         "You are responsible for converting the user's diary into FOUR distinct SCENES, which will be used to train a LoRA model.\n"
         "This request focuses on creating a specific numbered SCENE based on the provided diary and the sequence of scenes.\n"
@@ -42,7 +342,6 @@ def get_gpt_response(user_id, diary_text):
         "\tBackground:\n"
         "\t\t[Describe the setting, including objects, time, and environment for Scene {scene + 1}.]\n"
     )
-    scenario = []
     message = [
             {
                 'role': 'system',
@@ -53,22 +352,29 @@ def get_gpt_response(user_id, diary_text):
                 'content': 'make scene 1'
             }
         ]
+    started = time.monotonic()
+    usages = []
     for scene in range(1, 5):  # Adjusted to start from 1 since 'scene 1' is already in messages
         try:
-            response = client.chat.completions.create(
-                model='gpt-4o-mini',  # Check if the model name is correct
-                messages=message,
-                max_tokens=1000,
-                temperature=0.5,
-            )
-            context = response.choices[0].message.content.strip()  # Clean the response
-            scenario.append(context)
-            message.append({'role': 'assistant', 'content': context})
-            if scene < 4:  # Avoid unnecessary 'user' prompts after the last scene
-                message.append({'role': 'user', 'content': f'make scene {scene + 1}'})
+            # 일시적인 오류는 장면 단위로 재시도하고, 재시도로도 안 되면 잡 전체를 실패 처리
+            with admission.controller.limit('openai'):
+                response = resilience.openai.call(
+                    client.chat.completions.create,
+                    model=SCENARIO_MODEL,  # Check if the model name is correct
+                    messages=message,
+                    max_tokens=1000,
+                    temperature=0.5,
+                    timeout=job_control.timeout('scenario'),
+                )
         except Exception as e:
-            print(f"An error occurred: {e}")
-            scenario.append("Error generating scene.")  # Handle error gracefully
-            break
+            logging.error(f"Error generating scene {scene}: {type(e).__name__}: {e}")
+            record_stats("chained", time.monotonic() - started, usages, failed=True)
+            raise
+        usages.append(response.usage)
+        context = response.choices[0].message.content.strip()  # Clean the response
+        yield context
+        message.append({'role': 'assistant', 'content': context})
+        if scene < 4:  # Avoid unnecessary 'user' prompts after the last scene
+            message.append({'role': 'user', 'content': f'make scene {scene + 1}'})
 
-    return user_id, scenario
\ No newline at end of file
+    record_stats("chained", time.monotonic() - started, usages)
\ No newline at end of file
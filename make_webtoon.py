@@ -1,8 +1,7 @@
-import replicate
 import os
-import time
 from dotenv import load_dotenv
 import logging
+import prediction_manager
 
 # 로컬 개발 환경에서만 .env 파일을 로드
 dotenv_path = '.env'
@@ -12,24 +11,11 @@ if os.path.exists(dotenv_path):
 else:
     logging.info(f".env 파일({dotenv_path})이 존재하지 않습니다. 환경 변수를 직접 설정합니다.")
 
-# 환경 변수 로드
-REPLICATE_API_TOKEN = os.getenv('REPLICATE_API_TOKEN')
+# 느린 패널 예측을 같은 seed로 한 번 더 실행해서 먼저 끝난 쪽을 사용 (꼬리 지연 완화, 비용 상한은 prediction_manager 설정)
+WEBTOON_PANEL_HEDGING = os.getenv('WEBTOON_PANEL_HEDGING', 'false').lower() in ('1', 'true', 'yes')
 
-if not REPLICATE_API_TOKEN:
-    logging.error("REPLICATE_API_TOKEN이 설정되지 않았습니다. 환경 변수를 확인하세요.")
-    raise ValueError("REPLICATE_API_TOKEN is not set. Please set it in the environment variables.")
-
-# REPLICATE_API_TOKEN 설정
-os.environ["REPLICATE_API_TOKEN"] = REPLICATE_API_TOKEN
-
-# 모델 및 버전 가져오기
-models = dict()
-models['romance'] = ["tpals0409/romance-webtoon-character", "64ad94c7f1fe7cfe73ee7b3d0f7deae8a59d201689eb12d07f74baa9325949e0"]
-models['pixar'] = ["tpals0409/pixar-style", "f4cc445314637e21fcf76fd8330dbf6f2ffc178b10ae035db48c0e6f8c3f0acb"]
-
-def create_webtoon(user_id, character_info, seed_num, scene_info, model_type, version_type):
-    model = replicate.models.get(model_type)
-    version = model.versions.get(version_type)
+def create_webtoon(user_id, character_info, seed_num, scene_info, version_id):
+    # version_id: model_registry에서 조회한 characterStyle별 모델 버전
     prompt = {
         "model": "dev",
         "lora_scale": 1,
@@ -48,12 +34,7 @@ def create_webtoon(user_id, character_info, seed_num, scene_info, model_type, ve
                    "[scene]\n"+
                    f"{scene_info}\n"
     }
-    prediction = replicate.predictions.create(
-        version=version,
-        input=prompt
-    )
-    while prediction.status not in ["succeeded", "failed", "canceled"]:
-        time.sleep(5)
-        prediction.reload()
+    # 예측 생성 후 공유 이벤트 루프에서 완료까지 대기
+    prediction = prediction_manager.manager.run_sync(version_id, prompt, hedge=WEBTOON_PANEL_HEDGING)
 
-    return prediction.output
+    return prediction.get("output")
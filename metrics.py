@@ -0,0 +1,195 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import tracing
+
+try:
+    import prometheus_client  # 선택 의존성: 없으면 지표 수집을 건너뜀
+except ImportError:
+    prometheus_client = None
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 지표 설정
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes') and prometheus_client is not None
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'webtoon_ai')
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 0))  # 별도 워커 프로세스의 /metrics 포트 (0이면 사용 안 함)
+
+# GPT 호출과 Replicate 예측은 수십 초까지 걸리므로 버킷을 넓게 잡음
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+# 현재 잡의 characterStyle (잡을 처리하는 스레드에서 설정, 패널 스레드로는 컨텍스트를 복사해서 전달)
+character_style = contextvars.ContextVar('character_style', default='unknown')
+
+
+class _NoopMetric:
+    # prometheus_client가 없을 때 쓰는 대역
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def dec(self, *args, **kwargs):
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames: tuple, **kwargs):
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, namespace=METRICS_NAMESPACE, **kwargs)
+
+
+stage_seconds = _metric(
+    'Histogram', 'stage_duration_seconds',
+    'Time spent in each pipeline stage',
+    ('stage', 'character_style'), buckets=STAGE_BUCKETS,
+)
+failures = _metric(
+    'Counter', 'failures_total',
+    'Pipeline failures by stage',
+    ('stage', 'character_style'),
+)
+retries = _metric(
+    'Counter', 'job_retries_total',
+    'Jobs rescheduled after a failed attempt',
+    ('kind', 'character_style'),
+)
+cache_requests = _metric(
+    'Counter', 'llm_cache_requests_total',
+    'LLM cache lookups by result (hit/miss)',
+    ('namespace', 'result', 'character_style'),
+)
+queue_wait_seconds = _metric(
+    'Histogram', 'queue_wait_seconds',
+    'Time a job waited in the queue before a worker picked it up',
+    ('priority_class', 'kind'), buckets=STAGE_BUCKETS,
+)
+dependency_calls = _metric(
+    'Counter', 'dependency_calls_total',
+    'External calls by dependency and outcome (success/retry/failure/rejected)',
+    ('dependency', 'outcome'),
+)
+predictions_canceled = _metric(
+    'Counter', 'predictions_canceled_total',
+    'Replicate predictions canceled because the job was canceled, failed or ran out of time',
+    (),
+)
+prediction_hedges = _metric(
+    'Counter', 'prediction_hedges_total',
+    'Hedged Replicate predictions by outcome (won: duplicate finished first, lost: original finished first, skipped: over budget or limit)',
+    ('outcome',),
+)
+hedge_saved_seconds = _metric(
+    'Histogram', 'prediction_hedge_saved_seconds',
+    'Estimated latency saved (lower bound) when a hedged duplicate prediction finished first',
+    (), buckets=STAGE_BUCKETS,
+)
+jobs_in_flight = _metric(
+    'Gauge', 'jobs_in_flight',
+    'Jobs currently being processed',
+    ('kind', 'character_style'),
+)
+
+
+@contextmanager
+def job(kind: str, style: Optional[str]):
+    # 잡 하나를 처리하는 동안 in-flight 게이지를 올리고 characterStyle 라벨을 컨텍스트에 설정
+    style = style or 'unknown'
+    token = character_style.set(style)
+    gauge = jobs_in_flight.labels(kind, style)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+        character_style.reset(token)
+
+
+@contextmanager
+def track(stage: str):
+    # 단계 소요 시간 기록과 트레이스 스팬을 함께 남긴다. 예외가 나면 실패로도 센다 (데코레이터로도 사용 가능)
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    except Exception:
+        failure(stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def observe(stage: str, seconds: float):
+    stage_seconds.labels(stage, character_style.get()).observe(seconds)
+
+
+def failure(stage: str, style: Optional[str] = None):
+    failures.labels(stage, style or character_style.get()).inc()
+
+
+def retry(kind: str, style: Optional[str]):
+    retries.labels(kind, style or 'unknown').inc()
+
+
+def queue_wait(priority_class: str, kind: str, seconds: float):
+    queue_wait_seconds.labels(priority_class, kind).observe(max(0.0, seconds))
+
+
+def dependency_call(dependency: str, outcome: str):
+    dependency_calls.labels(dependency, outcome).inc()
+
+
+def prediction_canceled():
+    predictions_canceled.inc()
+
+
+def prediction_hedge(outcome: str):
+    prediction_hedges.labels(outcome).inc()
+
+
+def observe_hedge_saved(seconds: float):
+    hedge_saved_seconds.observe(seconds)
+
+
+def cache_lookup(namespace: str, hit: bool):
+    cache_requests.labels(namespace, 'hit' if hit else 'miss', character_style.get()).inc()
+
+
+def observe_prediction(created: Optional[float], started: Optional[float], completed: Optional[float], succeeded: bool):
+    # Replicate 예측의 대기 시간(created → started)과 실행 시간(started → completed)을 따로 기록
+    if created and started:
+        observe('replicate_queue', max(0.0, started - created))
+    if started and completed:
+        observe('replicate_run', max(0.0, completed - started))
+    if not succeeded:
+        failure('replicate')
+
+
+def render() -> tuple:
+    # (본문, Content-Type)
+    if not METRICS_ENABLED:
+        return b'', 'text/plain'
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_server(port: int = WORKER_METRICS_PORT):
+    # 별도 워커 프로세스용 /metrics HTTP 서버
+    if not METRICS_ENABLED or not port:
+        return
+    prometheus_client.start_http_server(port)
+    logging.info(f"Metrics server listening on port {port}")
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import replicate
+from dotenv import load_dotenv
+
+import resilience
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# characterStyle별 Replicate 모델과 LoRA 버전
+DEFAULT_MODELS = {
+    "romance": {"model": "tpals0409/romance-webtoon-character", "version": "64ad94c7f1fe7cfe73ee7b3d0f7deae8a59d201689eb12d07f74baa9325949e0"},
+    "pixar": {"model": "tpals0409/test_pixar", "version": "32c27ef90bb8b1b2c272809059306a6ecc3e7b903b694857fefa0175d7726ca6"},
+}
+MODEL_REGISTRY = json.loads(os.getenv('MODEL_REGISTRY', json.dumps(DEFAULT_MODELS)))
+
+# 실행 중에 추가/변경한 모델 목록을 저장하는 파일 (API와 워커 프로세스가 공유하고, 바뀌면 다시 읽음)
+MODEL_REGISTRY_PATH = os.getenv('MODEL_REGISTRY_PATH', './data/models.json')
+MODEL_REGISTRY_RELOAD_INTERVAL = float(os.getenv('MODEL_REGISTRY_RELOAD_INTERVAL', 5))
+
+# 조회한 버전 정보를 다시 확인하기 전까지 재사용하는 시간 (초)
+MODEL_VERSION_TTL = float(os.getenv('MODEL_VERSION_TTL', 3600))
+
+MODEL_FIELDS = ("model", "version")
+
+
+class UnknownStyleError(KeyError):
+    pass
+
+
+class ModelRegistry:
+    # characterStyle → (모델, 버전) 설정과 조회한 Replicate 버전 객체 캐시
+    # 예측마다 models.get / versions.get 두 번씩 부르던 메타데이터 조회를 TTL마다 한 번으로 줄인다.
+    # 조회가 실패하면 만료된 캐시라도 있으면 그대로 사용한다.
+
+    def __init__(self, models: dict = MODEL_REGISTRY, path: str = MODEL_REGISTRY_PATH, ttl: float = MODEL_VERSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.models = {style: dict(spec) for style, spec in models.items()}
+        self._versions = {}  # (model, version) → (버전 객체, 조회 시각)
+        self._resolving = {}  # (model, version) → 조회 중복을 막는 락
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._reload()
+
+    def styles(self) -> list:
+        self._reload_if_changed()
+        return list(self.models)
+
+    def spec(self, style: str) -> dict:
+        self._reload_if_changed()
+        try:
+            return self.models[style]
+        except KeyError:
+            raise UnknownStyleError(f"Unknown characterStyle: {style}")
+
+    def version(self, style: str):
+        # 캐시된 Replicate 버전 객체 (만료됐으면 다시 조회)
+        spec = self.spec(style)
+        key = (spec["model"], spec["version"])
+        with self._lock:
+            cached = self._versions.get(key)
+            if cached and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+            resolving = self._resolving.setdefault(key, threading.Lock())
+        with resolving:
+            # 같은 버전을 동시에 요청하면 먼저 들어온 스레드만 조회하고 나머지는 결과를 공유
+            with self._lock:
+                cached = self._versions.get(key)
+                if cached and time.monotonic() - cached[1] < self.ttl:
+                    return cached[0]
+            try:
+                version = self._fetch(*key)
+            except Exception as e:
+                if cached:
+                    logging.error(f"Error refreshing {key[0]}:{key[1]}, using cached version: {type(e).__name__}: {e}")
+                    return cached[0]
+                raise
+            with self._lock:
+                self._versions[key] = (version, time.monotonic())
+            logging.info(f"Model version resolved for {style}: {key[0]}:{version.id}")
+            return version
+
+    @staticmethod
+    def _fetch(model_name: str, version_id: str):
+        model = resilience.replicate.call(replicate.models.get, model_name)
+        return resilience.replicate.call(model.versions.get, version_id)
+
+    def warm(self):
+        # 시작 시 모든 스타일의 버전을 미리 조회 (실패해도 첫 요청에서 다시 시도)
+        for style in self.styles():
+            try:
+                self.version(style)
+            except Exception as e:
+                logging.error(f"Error resolving model version for {style}: {type(e).__name__}: {e}")
+
+    def reload(self, models: Optional[dict] = None):
+        # 모델 목록을 바꾸고(None이면 스타일 삭제) 버전 캐시를 비운다. 새 버전은 먼저 조회해서 확인한 뒤 저장
+        with self._lock:
+            merged = {style: dict(spec) for style, spec in self.models.items()}
+        for style, spec in (models or {}).items():
+            if spec is None:
+                merged.pop(style, None)
+                continue
+            if not isinstance(spec, dict) or set(spec) != set(MODEL_FIELDS) or not all(isinstance(spec[field], str) for field in MODEL_FIELDS):
+                raise ValueError(f"{style} must have string fields {list(MODEL_FIELDS)}")
+            try:
+                self._fetch(spec["model"], spec["version"])
+            except Exception as e:
+                raise ValueError(f"Cannot resolve {spec['model']}:{spec['version']} for {style}: {type(e).__name__}: {e}")
+            merged[style] = dict(spec)
+
+        # 다른 프로세스도 파일 변경을 보고 캐시를 비우도록 변경이 없어도 파일을 다시 씀
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"models": merged, "reloadedAt": time.time()}, f)
+        os.replace(temp_path, self.path)
+        self._reload()
+        logging.info(f"Model registry reloaded: {merged}")
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now - self._checked_at < MODEL_REGISTRY_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading model registry from {self.path}: {e}")
+            return
+        with self._lock:
+            self._loaded_mtime = mtime
+            self.models = data.get("models", self.models)
+            self._versions.clear()
+
+    def snapshot(self) -> dict:
+        self._reload_if_changed()
+        now = time.monotonic()
+        with self._lock:
+            cached = {key: now - resolved_at for key, (_, resolved_at) in self._versions.items()}
+            return {
+                style: {**spec, "cachedForSeconds": cached.get((spec["model"], spec["version"]))}
+                for style, spec in self.models.items()
+            }
+
+
+# 프로세스 전체에서 공유하는 레지스트리
+registry = ModelRegistry()
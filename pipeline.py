@@ -0,0 +1,491 @@
+import base64
+import contextvars
+import extract_profile
+import make_profile
+import make_scenario
+import make_webtoon
+import model_registry
+import image_transfer
+import image_preprocess
+import job_registry
+import job_control
+import metrics
+import tracing
+import resilience
+import webhook_outbox
+import workspace
+import logging
+import os
+import http_client
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+import posixpath
+import re
+import uuid
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 업로드할 파일 경로
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# AWS 설정
+AWS_REGION = os.getenv('AWS_REGION', 'ap-northeast-2')
+BUCKET_NAME = os.getenv('BUCKET_NAME')
+
+# 로드된 환경 변수 로그에 출력
+logging.info(f"AWS_REGION: {AWS_REGION}")
+logging.info(f"BUCKET_NAME: {BUCKET_NAME}")
+
+# S3 클라이언트 생성 (재시도는 resilience 모듈이 담당하므로 botocore 자체 재시도는 끔)
+s3_client = boto3.client('s3', region_name=AWS_REGION, config=Config(retries={'mode': 'standard', 'max_attempts': 1}))
+
+DEFAULT_PATH = 'webtoon-ai/'  # 디폴트 경로 설정
+
+# 웹툰 잡 하나에서 동시에 생성할 패널 개수
+WEBTOON_PANEL_CONCURRENCY = max(1, int(os.getenv('WEBTOON_PANEL_CONCURRENCY', 4)))
+logging.info(f"WEBTOON_PANEL_CONCURRENCY: {WEBTOON_PANEL_CONCURRENCY}")
+
+# 진행형 콜백 기본값: 패널이 업로드될 때마다 /webtoon/panel로 이벤트를 보냄 (요청의 progressiveCallbacks가 없을 때 사용)
+WEBTOON_PROGRESSIVE_CALLBACKS = os.getenv('WEBTOON_PROGRESSIVE_CALLBACKS', 'false').lower() in ('1', 'true', 'yes')
+
+# 배치 잡 하나에서 동시에 생성할 웹툰(일기) 개수 (일기마다 패널은 WEBTOON_PANEL_CONCURRENCY개씩 병렬)
+WEBTOON_BATCH_CONCURRENCY = max(1, int(os.getenv('WEBTOON_BATCH_CONCURRENCY', 2)))
+
+def encode_image(image_path: str) -> tuple:
+    # 비전 호출 전에 이미지를 정규화(회전 보정, 축소, 재인코딩)하고 (Base64 문자열, MIME 타입) 반환
+    with open(image_path, "rb") as image_file:
+        data = image_file.read()
+    mime_type = 'image/webp'
+    try:
+        normalized, mime_type = image_preprocess.normalize_image(data)
+        logging.info(f"Image normalized: {len(data)} -> {len(normalized)} bytes ({mime_type})")
+        data = normalized
+    except Exception as e:
+        # 디코딩할 수 없는 형식이면 원본 그대로 전송
+        logging.error(f"Error normalizing image {image_path}, sending original: {type(e).__name__}: {e}")
+    return base64.b64encode(data).decode('utf-8'), mime_type
+
+def sanitize_member_id(member_id: str) -> str:
+    # 허용할 문자 패턴을 정의 (예: 알파벳 소문자, 숫자, 언더스코어)
+    sanitized = re.sub(r'[^a-zA-Z0-9_]', '', member_id)
+    logging.info(f"Sanitized memberId: {sanitized}")
+    return sanitized
+
+def build_object_name(member_id: str, filename: str, date: Optional[str] = None, is_profile: bool = True) -> Optional[str]:
+    # S3에 저장할 객체 이름 설정 (posixpath 사용)
+    if is_profile:
+        # 프로필 이미지의 경우, 'temp_profile.webp'로 명명
+        return posixpath.join(DEFAULT_PATH, member_id, "temp_profile.webp")
+    elif date:
+        # 웹툰 이미지의 경우, 날짜 폴더 안에 저장
+        return posixpath.join(DEFAULT_PATH, member_id, date, filename)
+    logging.error("Invalid parameters: either date should be provided for webtoon images or is_profile should be True.")
+    return None
+
+def upload_image_to_s3(file_path: str, member_id: str, date: Optional[str] = None, is_profile: bool = True) -> Optional[str]:
+    logging.info(f"Original member_id: {member_id}")
+    member_id = sanitize_member_id(member_id)
+    logging.info(f"Sanitized member_id: {member_id}")
+
+    logging.info(f"Uploading {'profile' if is_profile else 'webtoon'} image for member_id: {member_id}")
+    logging.info(f"DEFAULT_PATH: {DEFAULT_PATH}")
+    logging.info(f"File Path: {file_path}")
+
+    if not BUCKET_NAME:
+        logging.error("BUCKET_NAME is not set. Cannot upload to S3.")
+        return None
+
+    if not isinstance(file_path, str):
+        logging.error(f"Invalid file_path type: {type(file_path)}. Expected str.")
+        return None
+
+    if not os.path.isfile(file_path):
+        logging.error(f"Error: File {file_path} does not exist.")
+        return None
+
+    object_name = build_object_name(member_id, os.path.basename(file_path), date, is_profile)
+    if not object_name:
+        return None
+
+    logging.info(f"Object Name: {object_name}")
+
+    try:
+        with metrics.track('upload'):
+            resilience.s3.call(
+                s3_client.upload_file,
+                file_path,
+                BUCKET_NAME,
+                object_name,
+                ExtraArgs={'ContentType': 'image/webp'}
+            )
+
+        s3_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+        logging.info(f"Image successfully uploaded to S3: {s3_url}")
+        return s3_url
+    except Exception as e:
+        logging.error(f"Error uploading image to S3: {type(e).__name__}: {e}")
+        return None
+
+def fetch_image(url: str):
+    response = http_client.get(url)
+    response.raise_for_status()  # 요청 에러가 있는 경우 예외 발생
+    return response
+
+def download_webp(url: str, imgName: str) -> Optional[str]:
+    # 현재 잡의 작업 디렉터리에 저장 (동시에 도는 다른 잡의 같은 이름 파일과 겹치지 않음)
+    try:
+        with metrics.track('download'):
+            response = resilience.download.call(fetch_image, url)
+            file_path = workspace.current().write(f'{imgName}.webp', response.content)
+        logging.info(f"File downloaded successfully and saved to {file_path}")
+        return file_path
+    except Exception as e:
+        logging.error(f"Error downloading file from {url}: {type(e).__name__}: {e}")
+        return None
+
+def transfer_image_to_s3(url: str, member_id: str, imgName: str, date: Optional[str] = None, is_profile: bool = True) -> Optional[str]:
+    # 생성된 이미지를 Replicate에서 S3로 바로 스트리밍하고, 실패하면 로컬 디스크 경유 방식으로 재시도
+    job_control.check('transfer')
+    if workspace.current() is None:
+        # 잡 밖에서 직접 호출된 경우에도 다른 호출과 파일이 겹치지 않도록 임시 작업 디렉터리 사용
+        with workspace.manager.open():
+            return transfer_image_to_s3(url, member_id, imgName, date, is_profile)
+    if image_transfer.S3_STREAMING_TRANSFER and BUCKET_NAME:
+        member_id_sanitized = sanitize_member_id(member_id)
+        object_name = build_object_name(member_id_sanitized, f"{imgName}.webp", date, is_profile)
+        if object_name:
+            try:
+                with metrics.track('transfer'):
+                    resilience.transfer.call(image_transfer.stream_url_to_s3, s3_client, url, BUCKET_NAME, object_name)
+                s3_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
+                logging.info(f"Image successfully streamed to S3: {s3_url}")
+                return s3_url
+            except Exception as e:
+                logging.error(f"Error streaming {url} to S3, falling back to local download: {type(e).__name__}: {e}")
+
+    local_image_path = download_webp(url, imgName)
+    if not local_image_path:
+        logging.error(f"Failed to download image from {url}")
+        return None
+
+    logging.info(f"Uploading {'profile' if is_profile else 'webtoon'} image: {local_image_path} for memberId: {member_id}")
+    s3_url = upload_image_to_s3(local_image_path, member_id, date=date, is_profile=is_profile)
+    if s3_url:
+        # 로컬 파일 삭제
+        workspace.current().remove(local_image_path)
+        logging.info(f"Local file {local_image_path} deleted after successful upload.")
+    return s3_url
+
+def post_webhook(url: str, data: dict, job_id: Optional[str] = None, batch_url: Optional[str] = None, event_key: str = '',
+                 sequenced: bool = False):
+    # 콜백은 바로 보내지 않고 아웃박스에 기록 (전송과 재시도는 webhook_outbox 전송기가 담당)
+    # 수신 측에서 같은 트레이스로 이어 볼 수 있도록 traceparent 헤더도 함께 기록
+    webhook_outbox.enqueue(url, data, job_id, batch_url=batch_url, headers=tracing.inject(), event_key=event_key, sequenced=sequenced)
+
+class PanelEvents:
+    # 진행형 콜백: 패널이 업로드될 때마다 작은 이벤트를, 잡이 끝나면 요약 이벤트를 /webtoon/panel로 보냄
+    # 전송은 순서를 보장하지 않으므로 이벤트마다 잡 안에서 증가하는 sequence를 붙임 (수신 측은 정렬/중복 제거에 사용)
+    # 패널 이벤트는 잡이 재실행돼도 한 번만 보내지만, 요약 이벤트는 실행마다 보냄 (마지막 실행의 결과가 가장 큰 sequence를 가짐)
+
+    def __init__(self, apiDomainUrl: str, memberId: str, date: str, job_id: Optional[str] = None):
+        self.url = f"http://{apiDomainUrl}/api/v1/webhook/ai/webtoon/panel"
+        self.memberId = memberId
+        self.date = date
+        self.job_id = job_id
+        self.run_id = uuid.uuid4().hex[:12]
+
+    def _send(self, event: str, event_key: str, **data):
+        try:
+            post_webhook(self.url, {"event": event, "jobId": self.job_id, "memberId": self.memberId, "date": self.date, **data},
+                         self.job_id, event_key=event_key, sequenced=True)
+        except Exception as e:
+            # 진행 이벤트를 기록하지 못해도 패널/잡은 계속 처리 (최종 결과 콜백은 따로 전송)
+            logging.error(f"Error recording {event} event for job {self.job_id}: {type(e).__name__}: {e}")
+
+    def panel(self, index: int, image_index: int, scenario: str, image: str):
+        self._send('panel', f"panel-{index}-{image_index}", panelIndex=index, scenario=scenario, image=image)
+
+    def finish(self, status: str, panels: int = 0, error: Optional[str] = None):
+        # status: completed | failed | canceled (이 이벤트 뒤에는 이벤트가 오지 않음)
+        self._send(status, f"summary-{self.run_id}", panels=panels, **({"error": error} if error else {}))
+
+def report(job_id: Optional[str], stage: str, **data):
+    # 잡 레지스트리에 진행 단계를 기록 (job_id 없이 직접 호출된 경우는 무시)
+    if not job_id:
+        return
+    try:
+        job_registry.registry.emit(job_id, stage, **data)
+    except Exception as e:
+        logging.error(f"Error reporting stage {stage} for job {job_id}: {e}")
+
+def report_failure(job_id: Optional[str], error: str):
+    # API로 취소된 잡은 실패가 아니라 canceled 상태로 기록
+    reason = job_control.cancel_reason(job_id)
+    if reason is None:
+        metrics.failure('job')
+    if not job_id:
+        return
+    try:
+        if reason is not None:
+            job_registry.registry.cancel(job_id, reason)
+        else:
+            job_registry.registry.fail(job_id, error)
+    except Exception as e:
+        logging.error(f"Error reporting failure for job {job_id}: {e}")
+
+def will_retry(error: Exception) -> bool:
+    # 워커가 잡을 다시 실행할 오류인지: 일시적인 오류(연결 실패, 5xx, 열린 회로 등)이고 재시도 기회가 남았을 때
+    if not job_control.retryable():
+        return False
+    return isinstance(error, resilience.CircuitOpenError) or resilience.is_retryable(error)
+
+def report_success(job_id: Optional[str], result: dict):
+    if not job_id:
+        return
+    try:
+        job_registry.registry.complete(job_id, result)
+    except Exception as e:
+        logging.error(f"Error reporting result for job {job_id}: {e}")
+
+def process_profile_background(memberId: str, file_path: str, characterStyle: str, apiDomainUrl: str, job_id: Optional[str] = None,
+                               imageSha256: Optional[str] = None):
+    try:
+        logging.info(f"Processing profile for memberId: {memberId}")
+        version = model_registry.registry.version(characterStyle)
+
+        # 이미지 Base64 인코딩
+        base64_image, mime_type = encode_image(file_path)
+
+        # extract_profile 모듈을 사용해 GPT 응답 받기
+        report(job_id, 'gpt_extraction')
+        user_id_response, gpt = extract_profile.get_gpt_response(memberId, base64_image, mime_type, imageSha256)
+        logging.info(f"Character Info: {gpt}")
+
+        if user_id_response != memberId:
+            logging.error("User ID mismatch")
+            report_failure(job_id, "User ID mismatch")
+            return
+
+        # make_profile 모듈을 사용해 프로필 생성
+        report(job_id, 'prediction')
+        seed, image = make_profile.create_profile(version.id, gpt)
+        logging.info(f"Seed: {seed}")
+        logging.info(f"Image: {image}")
+
+        # image는 단일 URL 문자열로 가정
+        image_url = image
+
+        if not image_url:
+            logging.error("No image URL returned from create_profile")
+            report_failure(job_id, "No image URL returned from create_profile")
+            return
+
+        # 이미지 S3에 업로드 (Replicate에서 바로 스트리밍)
+        report(job_id, 'transfer')
+        s3_url = transfer_image_to_s3(image_url, memberId, "temp_profile", is_profile=True)
+        if s3_url:
+            logging.info(f"Profile image uploaded to S3: {s3_url}")
+            report(job_id, 'upload', image=s3_url)
+        else:
+            logging.error("Failed to upload profile image to S3.")
+
+        # 원본 파일 삭제
+        os.remove(file_path)
+        logging.info(f"Local file {file_path} deleted after successful upload.")
+
+        # 결과 데이터 준비
+        result_data = {
+            "memberId": sanitize_member_id(memberId),
+            "characterInfo": gpt,
+            "characterStyle": "romance",
+            "seedNum": seed,
+            "characterProfileImageUrl": s3_url
+        }
+        # 콜백을 먼저 아웃박스에 기록한 뒤 결과를 저장 (수신 측이 느리거나 내려가도 워커는 기다리지 않음)
+        # 순서가 반대면 그 사이에 프로세스가 죽었을 때 잡은 성공으로 끝났는데 콜백은 영영 나가지 않음.
+        # 이 순서에서는 잡이 재실행되고, 같은 잡의 콜백은 아웃박스에 한 번만 기록되므로 중복 전송도 없음
+        post_webhook(f"http://{apiDomainUrl}/api/v1/webhook/ai/character", result_data, job_id)
+        report_success(job_id, result_data)
+
+    except Exception as e:
+        logging.error(f"Error in process_profile_background: {e}")
+        # 일시적인 오류는 워커로 넘겨서 지연 후 재시도 (마지막 시도이거나 다시 해도 안 되는 오류면 여기서 실패 처리)
+        if will_retry(e):
+            raise
+        report_failure(job_id, f"{type(e).__name__}: {e}")
+
+def render_webtoon_panel(i: int, scene: str, memberId: str, date: str, characterInfo: str, seedNum: int, version_id: str, job_id: Optional[str] = None,
+                         events: Optional[PanelEvents] = None) -> list:
+    # 패널마다 스팬 하나 (병렬로 실행되는 형제 스팬)
+    with tracing.span('panel', **{"panel.index": i}):
+        return _render_webtoon_panel(i, scene, memberId, date, characterInfo, seedNum, version_id, job_id, events)
+
+def _render_webtoon_panel(i: int, scene: str, memberId: str, date: str, characterInfo: str, seedNum: int, version_id: str, job_id: Optional[str] = None,
+                          events: Optional[PanelEvents] = None) -> list:
+    logging.info(f"Processing scenario {i}: {scene}")
+    report(job_id, 'panel_prediction', index=i)
+    image_urls = make_webtoon.create_webtoon(memberId, characterInfo, seedNum, scene, version_id)
+    logging.info(f"Webtoon images created: {image_urls}")
+
+    results = []
+    # image_urls는 리스트라고 가정합니다.
+    for j, image_url in enumerate(image_urls or []):
+        logging.info(f"Processing image {j} for scenario {i}: {image_url}")
+
+        # S3에 이미지 업로드 (Replicate에서 바로 스트리밍)
+        report(job_id, 'transfer', index=i)
+        s3_url = transfer_image_to_s3(image_url, memberId, f"{i+1}", date=date, is_profile=False)
+        if s3_url:
+            logging.info(f"Webtoon image uploaded to S3: {s3_url}")
+            report(job_id, 'upload', index=i, scenario=scene, image=s3_url)
+            results.append({"scenario": scene, "image": s3_url})
+            if events:
+                events.panel(i, j, scene, s3_url)
+        else:
+            logging.error(f"Failed to upload webtoon image {j} for scenario {i} to S3.")
+    return results
+
+def render_webtoon(memberId: str, date: str, content: str, characterInfo: str, seedNum: int, characterStyle: str, job_id: Optional[str] = None,
+                   events: Optional[PanelEvents] = None) -> dict:
+    # 시나리오 생성부터 패널 업로드까지 처리하고 웹훅으로 보낼 결과를 반환
+    logging.info(f"Processing webtoon for memberId: {memberId}, date: {date}")
+    version = model_registry.registry.version(characterStyle)
+
+    # 시나리오 생성: 장면이 나오는 대로 패널을 제출해서 GPT 응답 대기와 이미지 생성을 겹침
+    # (SCENARIO_STREAMING=false면 4장면을 모두 받은 뒤 한 번에 제출)
+    report(job_id, 'scenario')
+    if make_scenario.SCENARIO_STREAMING:
+        scenes = make_scenario.stream_scenario(memberId, content)
+    else:
+        scenes = make_scenario.get_gpt_response(memberId, content)[1]
+
+    # 패널은 끝나는 순서대로 다운로드/업로드
+    futures = {}
+    max_workers = min(WEBTOON_PANEL_CONCURRENCY, make_scenario.SCENE_COUNT)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"panel-{memberId}") as executor:
+        try:
+            for i, scene in enumerate(scenes):
+                logging.info(f"Scene {i} ready: {scene}")
+                report(job_id, 'scene_ready', index=i)
+                # 패널 스레드에도 현재 잡의 지표 라벨(characterStyle)과 트레이스 컨텍스트가 전달되도록 컨텍스트 복사
+                future = executor.submit(contextvars.copy_context().run, render_webtoon_panel, i, scene, memberId, date, characterInfo, seedNum, version.id, job_id, events)
+                futures[future] = i
+        except BaseException as e:
+            # 시나리오 생성이 실패하면 아직 시작하지 않은 패널은 취소하고, 진행 중인 예측도 Replicate에서 취소한 뒤 잡 실패로 처리
+            for future in futures:
+                future.cancel()
+            job_control.abort(f"scenario generation failed: {type(e).__name__}")
+            raise
+        report(job_id, 'scenario_ready', scenes=len(futures))
+
+        panel_results = [[] for _ in futures]
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                panel_results[i] = future.result()
+            except Exception as e:
+                # 패널 하나가 실패해도 나머지 패널은 계속 처리
+                logging.error(f"Error rendering panel {i} for memberId: {memberId}: {type(e).__name__}: {e}")
+                report(job_id, 'panel_failed', index=i, error=f"{type(e).__name__}: {e}")
+                if not isinstance(e, job_control.JobCancelledError):
+                    metrics.failure('panel')
+
+    # 잡이 취소됐거나 잡 마감이 지났으면 끝난 패널이 있어도 결과를 보내지 않음
+    job_control.check('panel')
+
+    # 웹훅에는 시나리오 순서대로 전달
+    results = [item for panel in panel_results for item in panel]
+
+    return {
+        "memberId": memberId,
+        "date": date,
+        "webtoonFolderUrl": f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{DEFAULT_PATH}{memberId}/{date}/",
+        "webtoonImages": results
+    }
+
+def process_webtoon_background(memberId: str, date: str, content: str, characterInfo: str, seedNum: int, characterStyle: str, apiDomainUrl: str, job_id: Optional[str] = None,
+                               progressiveCallbacks: Optional[bool] = None):
+    # progressiveCallbacks면 최종 콜백과 별도로 패널별 이벤트와 요약 이벤트도 보냄 (최종 콜백 형식은 그대로)
+    if progressiveCallbacks is None:
+        progressiveCallbacks = WEBTOON_PROGRESSIVE_CALLBACKS
+    events = PanelEvents(apiDomainUrl, memberId, date, job_id) if progressiveCallbacks else None
+    try:
+        result_data = render_webtoon(memberId, date, content, characterInfo, seedNum, characterStyle, job_id, events)
+
+        # 콜백을 아웃박스에 기록한 뒤 결과를 저장 (WEBHOOK_BATCH_MAX > 1이면 다른 일기의 콜백과 묶어서 /webtoon/batch로 전송)
+        post_webhook(f"http://{apiDomainUrl}/api/v1/webhook/ai/webtoon", result_data, job_id,
+                     batch_url=f"http://{apiDomainUrl}/api/v1/webhook/ai/webtoon/batch")
+        report_success(job_id, result_data)
+        if events:
+            events.finish('completed', panels=len(result_data["webtoonImages"]))
+
+    except Exception as e:
+        logging.error(f"Error in process_webtoon_background: {e}")
+        # 재시도할 잡은 요약 이벤트도 보내지 않음 (요약은 잡의 마지막 이벤트)
+        if will_retry(e):
+            raise
+        report_failure(job_id, f"{type(e).__name__}: {e}")
+        if events:
+            events.finish('canceled' if job_control.cancel_reason(job_id) is not None else 'failed', error=f"{type(e).__name__}: {e}")
+
+def render_batch_item(item: dict, characterInfo: str, characterStyle: str) -> dict:
+    # 배치 안의 일기는 패널 파일 이름(1.webp ...)이 겹치므로 일기마다 작업 디렉터리를 따로 사용
+    # 마감과 취소도 일기별로 관리 (배치 잡이 취소되면 함께 취소)
+    with job_control.control.job(item["jobId"], 'webtoon'), workspace.manager.open(item["jobId"]):
+        job_control.check()
+        return render_webtoon(item["memberId"], item["date"], item["content"], characterInfo, item["seedNum"], characterStyle, item["jobId"])
+
+def process_webtoon_batch(batchId: str, items: list, characterStyle: str, characterInfo: str, apiDomainUrl: str, memberId: str = '',
+                          job_id: Optional[str] = None):
+    # 한 회원이 같은 모델/캐릭터로 보낸 일기 묶음: 결과는 웹훅 한 번으로 모아서 전송
+    # items: [{"jobId", "memberId", "date", "content", "seedNum"}] (jobId는 일기별 잡 레지스트리 ID)
+    try:
+        # 모델 버전을 먼저 조회해서 캐시에 올려 둠 (조회가 안 되면 일기별로 시도하지 않고 묶음 전체를 실패 처리)
+        model_registry.registry.version(characterStyle)
+    except Exception as e:
+        logging.error(f"Error resolving model version for batch {batchId}: {type(e).__name__}: {e}")
+        for item in items:
+            report_failure(item["jobId"], f"{type(e).__name__}: {e}")
+        report_failure(job_id, f"{type(e).__name__}: {e}")
+        return
+
+    webtoons, failed = [], []
+    with ThreadPoolExecutor(max_workers=min(WEBTOON_BATCH_CONCURRENCY, len(items)) or 1, thread_name_prefix=f"batch-{batchId[:8]}") as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, render_batch_item, item, characterInfo, characterStyle)
+            for item in items
+        ]
+        # 콜백에는 요청 순서대로 담음
+        for item, future in zip(items, futures):
+            try:
+                webtoons.append((item, future.result()))
+            except Exception as e:
+                logging.error(f"Error rendering webtoon for memberId: {item['memberId']}, date: {item['date']} in batch {batchId}: {e}")
+                report_failure(item["jobId"], f"{type(e).__name__}: {e}")
+                failed.append({"jobId": item["jobId"], "memberId": item["memberId"], "date": item["date"],
+                               "error": f"{type(e).__name__}: {e}"})
+
+    # 묶음 전체가 취소되면 콜백을 보내지 않음
+    reason = job_control.cancel_reason(job_id)
+    if reason is not None:
+        for item, _ in webtoons:
+            report_failure(item["jobId"], f"JobCancelledError: {reason}")
+        report_failure(job_id, f"JobCancelledError: {reason}")
+        return
+
+    # 일기별 결과는 /webtoon 웹훅과 같은 형식으로 묶어서 전송
+    # 콜백을 먼저 아웃박스에 기록한 뒤 결과를 저장 (배치 콜백의 전송 결과는 배치 잡에 기록)
+    result_data = {"batchId": batchId, "webtoons": [result for _, result in webtoons], "failed": failed}
+    post_webhook(f"http://{apiDomainUrl}/api/v1/webhook/ai/webtoon/batch", result_data, job_id)
+    for item, result in webtoons:
+        report_success(item["jobId"], result)
+    report_success(job_id, {"batchId": batchId, "succeeded": [item["jobId"] for item, _ in webtoons],
+                            "failed": [item["jobId"] for item in failed]})
@@ -0,0 +1,443 @@
+import asyncio
+import base64
+import concurrent.futures
+import contextlib
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+import http_client
+import admission
+import job_control
+import metrics
+import resilience
+import tracing
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# Replicate API 설정 (REPLICATE_BASE_URL을 바꾸면 가짜 서버로 테스트 가능)
+REPLICATE_BASE_URL = os.getenv('REPLICATE_BASE_URL', 'https://api.replicate.com')
+REPLICATE_API_TOKEN = os.getenv('REPLICATE_API_TOKEN')
+
+if not REPLICATE_API_TOKEN:
+    logging.error("REPLICATE_API_TOKEN이 설정되지 않았습니다. 환경 변수를 확인하세요.")
+    raise ValueError("REPLICATE_API_TOKEN is not set. Please set it in the environment variables.")
+
+# 적응형 폴링 설정: 처음엔 짧게, 이후 지수적으로 늘림
+PREDICTION_POLL_FIRST_INTERVAL = float(os.getenv('PREDICTION_POLL_FIRST_INTERVAL', 0.5))
+PREDICTION_POLL_MAX_INTERVAL = float(os.getenv('PREDICTION_POLL_MAX_INTERVAL', 5))
+PREDICTION_POLL_BACKOFF = float(os.getenv('PREDICTION_POLL_BACKOFF', 1.5))
+
+# 완료 웹훅을 받을 공개 URL (예: https://ai.example.com/replicate/webhook). 없으면 폴링만 사용
+# 서명 키(REPLICATE_WEBHOOK_SECRET)가 없으면 누구나 예측 결과를 보낼 수 있으므로 웹훅을 쓰지 않고 폴링만 사용
+REPLICATE_WEBHOOK_URL = os.getenv('REPLICATE_WEBHOOK_URL')
+REPLICATE_WEBHOOK_SECRET = os.getenv('REPLICATE_WEBHOOK_SECRET')
+REPLICATE_WEBHOOK_TOLERANCE = float(os.getenv('REPLICATE_WEBHOOK_TOLERANCE', 300))  # webhook-timestamp 허용 오차 (초, 이보다 오래된 웹훅은 재전송 공격으로 보고 거절)
+
+# 헤지 예측 설정: 느린 예측(콜드 워커 등)이 이 백분위 지연을 넘기면 같은 입력(같은 seed)으로 하나 더 만들고 먼저 끝난 쪽을 사용
+PREDICTION_HEDGE_PERCENTILE = float(os.getenv('PREDICTION_HEDGE_PERCENTILE', 90))
+PREDICTION_HEDGE_MIN_DELAY = float(os.getenv('PREDICTION_HEDGE_MIN_DELAY', 5))  # 임계값 하한 (초)
+PREDICTION_HEDGE_MIN_SAMPLES = int(os.getenv('PREDICTION_HEDGE_MIN_SAMPLES', 20))  # 모델 버전별 소요 시간 표본이 이만큼 쌓이기 전에는 헤지하지 않음
+PREDICTION_HEDGE_WINDOW = int(os.getenv('PREDICTION_HEDGE_WINDOW', 200))  # 모델 버전별로 기억하는 최근 소요 시간 수
+# 비용 상한: 최근 PREDICTION_HEDGE_BUDGET_WINDOW초 동안 헤지 예측 수를 (최소값 + 비율 * 헤지 대상 예측 수) 이하로 제한
+PREDICTION_HEDGE_BUDGET_RATIO = float(os.getenv('PREDICTION_HEDGE_BUDGET_RATIO', 0.1))
+PREDICTION_HEDGE_BUDGET_MIN = int(os.getenv('PREDICTION_HEDGE_BUDGET_MIN', 1))
+PREDICTION_HEDGE_BUDGET_WINDOW = float(os.getenv('PREDICTION_HEDGE_BUDGET_WINDOW', 300))
+
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+
+class PredictionFailedError(RuntimeError):
+    # status=failed로 끝난 예측 (모델 쪽 결과이므로 재실행하지 않고 회로 실패로도 세지 않음)
+    def __init__(self, prediction: dict):
+        super().__init__(f"Prediction {prediction.get('id')} failed: {prediction.get('error')}")
+        self.prediction = prediction
+
+
+class PredictionCreateError(RuntimeError):
+    # 생성 요청이 Replicate에 전달된 뒤 실패 (예측이 이미 만들어졌을 수 있어 재시도하면 과금되는 중복 예측이 생김)
+    pass
+
+
+def create_not_sent(error: Exception) -> bool:
+    # 연결 단계에서 실패했거나 429로 거절된 생성 요청만 다시 보내도 안전함
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+
+def _try_limit(*keys: str):
+    # 슬롯을 바로 잡을 수 있으면 잡힌 상태의 컨텍스트를, 아니면 None
+    limit = admission.controller.limit(*keys, timeout=0)
+    try:
+        limit.__enter__()
+    except admission.AdmissionTimeoutError:
+        return None
+    return limit
+
+
+def _release_limit(task: asyncio.Future):
+    if not task.cancelled() and task.exception() is None and task.result() is not None:
+        task.result().__exit__(None, None, None)
+
+
+class PredictionManager:
+    # 모든 진행 중인 예측을 하나의 이벤트 루프에서 다중화해서 기다린다.
+    # 워커 스레드는 run_sync로 결과만 기다리고, 폴링/웹훅 처리는 루프 스레드가 담당한다.
+
+    def __init__(self, base_url: str = REPLICATE_BASE_URL, api_token: Optional[str] = REPLICATE_API_TOKEN,
+                 first_interval: float = PREDICTION_POLL_FIRST_INTERVAL,
+                 max_interval: float = PREDICTION_POLL_MAX_INTERVAL,
+                 backoff: float = PREDICTION_POLL_BACKOFF,
+                 webhook_url: Optional[str] = REPLICATE_WEBHOOK_URL,
+                 webhook_secret: Optional[str] = REPLICATE_WEBHOOK_SECRET):
+        if webhook_url and not webhook_secret:
+            logging.error("REPLICATE_WEBHOOK_SECRET is not set: ignoring REPLICATE_WEBHOOK_URL and polling predictions instead")
+            webhook_url = None
+        self.base_url = base_url.rstrip('/')
+        self.api_token = api_token
+        self.first_interval = first_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.webhook_url = webhook_url
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._waiters: dict = {}
+        self._background: set = set()  # 진행 중인 취소 요청 등 백그라운드 태스크 (GC 방지용 참조)
+        self._latencies: dict = {}  # 모델 버전 → 최근 예측 소요 시간 (루프 스레드에서만 접근)
+        self._hedge_budget = resilience.RetryBudget(PREDICTION_HEDGE_BUDGET_RATIO, PREDICTION_HEDGE_BUDGET_MIN,
+                                                    PREDICTION_HEDGE_BUDGET_WINDOW)
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                headers = {"Authorization": f"Bearer {self.api_token}"} if self.api_token else {}
+                self._client = http_client.create_async_client(base_url=self.base_url, headers=headers)
+                ready.set()
+                loop.run_forever()
+
+            thread = threading.Thread(target=run, name="prediction-manager", daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+            logging.info(f"Prediction manager started (base_url: {self.base_url}, webhook: {self.webhook_url})")
+
+    def stop(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            except Exception as e:
+                logging.error(f"Error closing prediction manager client: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+            self._loop, self._thread, self._client = None, None, None
+            logging.info("Prediction manager stopped")
+
+    async def create(self, version: str, input: dict) -> dict:
+        body = {"version": version, "input": input}
+        if self.webhook_url:
+            body["webhook"] = self.webhook_url
+            body["webhook_events_filter"] = ["completed"]
+        try:
+            prediction = await resilience.replicate.acall(self._request, "POST", "/v1/predictions", json=body,
+                                                          retry_if=create_not_sent)
+        except Exception as e:
+            # 바깥 재실행(resilience.prediction)도 다시 만들지 않도록 재시도 대상이 아닌 오류로 바꿔서 올림
+            if resilience.is_retryable(e) and not create_not_sent(e):
+                raise PredictionCreateError(f"Prediction create failed after the request was sent: {type(e).__name__}: {e}") from e
+            raise
+        logging.info(f"Prediction created: {prediction.get('id')}")
+        return prediction
+
+    async def get(self, prediction_id: str) -> dict:
+        return await resilience.replicate.acall(self._request, "GET", f"/v1/predictions/{prediction_id}")
+
+    async def cancel(self, prediction_id: str) -> dict:
+        prediction = await resilience.replicate.acall(self._request, "POST", f"/v1/predictions/{prediction_id}/cancel")
+        logging.info(f"Prediction canceled: {prediction_id}")
+        return prediction
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        response = await self._client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def wait(self, prediction: dict) -> dict:
+        if prediction.get("status") in TERMINAL_STATUSES:
+            return prediction
+
+        prediction_id = prediction["id"]
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[prediction_id] = waiter
+        interval = self.first_interval
+        try:
+            while True:
+                try:
+                    # 웹훅이 먼저 도착하면 폴링 간격을 기다리지 않고 바로 반환
+                    return await asyncio.wait_for(asyncio.shield(waiter), timeout=interval)
+                except asyncio.TimeoutError:
+                    pass
+                prediction = await self.get(prediction_id)
+                if prediction.get("status") in TERMINAL_STATUSES:
+                    return prediction
+                interval = min(interval * self.backoff, self.max_interval)
+        finally:
+            self._waiters.pop(prediction_id, None)
+            if not waiter.done():
+                waiter.cancel()
+
+    async def run(self, version: str, input: dict, hedge: bool = False) -> dict:
+        # hedge: 느린 예측을 같은 입력으로 한 번 더 실행해도 되는 호출 (같은 seed여야 같은 그림이 나오므로 seed가 없으면 무시)
+        hedge = hedge and input.get("seed") is not None
+
+        async def attempt():
+            started = time.monotonic()
+            prediction = await (self._race(version, input) if hedge else self._run_once(version, input))
+            if prediction.get("status") == "failed":
+                raise PredictionFailedError(prediction)
+            if prediction.get("status") == "succeeded":
+                self._latencies.setdefault(version, deque(maxlen=PREDICTION_HEDGE_WINDOW)).append(time.monotonic() - started)
+            return prediction
+
+        try:
+            prediction = await resilience.prediction.acall(attempt)
+        except PredictionFailedError as e:
+            prediction = e.prediction
+        if prediction.get("status") != "succeeded":
+            logging.error(f"Prediction {prediction.get('id')} ended with status {prediction.get('status')}: {prediction.get('error')}")
+        return prediction
+
+    async def _run_once(self, version: str, input: dict, state: Optional[dict] = None) -> dict:
+        prediction = await self._create_or_abandon(version, input)
+        if state is not None:
+            state["prediction"] = prediction
+        try:
+            return await self.wait(prediction)
+        except asyncio.CancelledError:
+            # 기다리던 쪽이 포기(잡 취소, 마감 초과, 헤지 경쟁에서 짐)하면 Replicate에서도 취소해서 GPU 과금을 멈춘다
+            self._abandon(prediction["id"])
+            raise
+
+    def hedge_threshold(self, version: str) -> Optional[float]:
+        # 최근 소요 시간의 PREDICTION_HEDGE_PERCENTILE 백분위 (표본이 모자라면 None: 헤지하지 않음)
+        samples = self._latencies.get(version)
+        if not samples or len(samples) < PREDICTION_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * PREDICTION_HEDGE_PERCENTILE / 100))
+        return max(PREDICTION_HEDGE_MIN_DELAY, ordered[index])
+
+    async def _race(self, version: str, input: dict) -> dict:
+        # 임계값 안에 끝나지 않으면 같은 입력으로 예측을 하나 더 만들고, 먼저 성공한 쪽을 쓰고 나머지는 취소
+        self._hedge_budget.record_request()
+        primary_state = {}
+        primary = asyncio.ensure_future(self._run_once(version, input, primary_state))
+        tasks = [primary]
+        try:
+            threshold = self.hedge_threshold(version)
+            if threshold is None:
+                return await primary
+            await asyncio.wait(tasks, timeout=threshold)
+            if primary.done():
+                return primary.result()
+            with contextlib.ExitStack() as slot:
+                if not await self._hedge_allowed(version, slot):
+                    return await primary
+                logging.info(f"Hedging prediction {primary_state.get('prediction', {}).get('id')} after {threshold:.1f}s")
+                backup = asyncio.ensure_future(self._run_once(version, input))
+                tasks.append(backup)
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None and task.result().get("status") == "succeeded":
+                            metrics.prediction_hedge('won' if task is backup else 'lost')
+                            if task is backup:
+                                self._spawn(self._observe_saved(task.result(), primary_state.get("prediction")))
+                            return task.result()
+                # 둘 다 실패하면 원래 예측의 결과로 처리
+                metrics.prediction_hedge('lost')
+                return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _hedge_allowed(self, version: str, slot: contextlib.ExitStack) -> bool:
+        # 헤지 예산과 처리량 한도에 여유가 있을 때만 (기다리지 않고 바로 확인)
+        if not self._hedge_budget.try_spend():
+            metrics.prediction_hedge('skipped')
+            return False
+        # 한도 확인은 스레드 락을 잡고 한도 파일을 다시 읽을 수도 있으므로 이벤트 루프 밖에서
+        acquiring = asyncio.ensure_future(asyncio.to_thread(_try_limit, f"replicate:{version}", "replicate"))
+        try:
+            limit = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # 기다리는 쪽이 먼저 취소돼도 스레드에서 잡은 슬롯은 돌려줌
+            acquiring.add_done_callback(_release_limit)
+            raise
+        if limit is None:
+            metrics.prediction_hedge('skipped')
+            return False
+        slot.push(limit.__exit__)
+        return True
+
+    async def _observe_saved(self, winner: dict, loser: Optional[dict]):
+        # 줄어든 지연의 하한 추정: 진 예측도 시작 후 이긴 예측만큼은 실행돼야 끝난다고 보고 (아직 시작 전이면 지금부터) 남은 시간을 계산
+        _, started, completed = prediction_times(winner)
+        run_seconds = completed - started if started and completed else 0.0
+        loser_started = None
+        if loser:
+            try:
+                loser_started = prediction_times(await self.get(loser["id"]))[1]
+            except Exception as e:
+                logging.error(f"Error fetching hedged prediction {loser['id']}: {type(e).__name__}: {e}")
+        now = time.time()
+        metrics.observe_hedge_saved(max(0.0, (loser_started or now) + run_seconds - now))
+
+    async def _create_or_abandon(self, version: str, input: dict) -> dict:
+        created = asyncio.ensure_future(self.create(version, input))
+        try:
+            return await asyncio.shield(created)
+        except asyncio.CancelledError:
+            # 생성 요청이 이미 나갔으면 응답을 받는 대로 취소
+            created.add_done_callback(self._abandon_created)
+            raise
+
+    def _abandon_created(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is None:
+            self._abandon(task.result()["id"])
+
+    def _abandon(self, prediction_id: str):
+        async def cancel():
+            try:
+                await self.cancel(prediction_id)
+                metrics.prediction_canceled()
+            except Exception as e:
+                logging.error(f"Error canceling abandoned prediction {prediction_id}: {type(e).__name__}: {e}")
+
+        self._spawn(cancel())
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def run_sync(self, version: str, input: dict, timeout: Optional[float] = None, hedge: bool = False) -> dict:
+        # 워커 스레드에서 호출: 공유 루프에 예측을 맡기고 결과만 기다림
+        # timeout을 주지 않으면 현재 잡의 prediction 단계 마감(잡의 남은 시간 이내)까지 기다림
+        self.start()
+        context = job_control.current()
+        if timeout is None:
+            timeout = job_control.timeout('prediction')
+        deadline = time.monotonic() + timeout
+        # 모델 버전별 한도와 Replicate 계정 전체 한도를 모두 통과해야 예측 생성
+        with admission.controller.limit(f"replicate:{version}", "replicate",
+                                        timeout=min(admission.ADMISSION_ACQUIRE_TIMEOUT, timeout)), \
+                tracing.span('replicate.prediction', version=version):
+            job_control.check('prediction')
+            future = asyncio.run_coroutine_threadsafe(self.run(version, input, hedge), self._loop)
+            # 잡이 취소되거나 마감이 지나면 기다리던 코루틴을 취소 (run이 Replicate 예측도 취소)
+            with context.on_cancel(future.cancel) if context else contextlib.nullcontext():
+                try:
+                    prediction = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+                    if context and context.done:
+                        raise context.error('prediction')
+                    raise job_control.DeadlineExceededError(f"Prediction did not finish within {timeout:.0f}s")
+                except concurrent.futures.CancelledError:
+                    raise context.error('prediction') if context else job_control.JobCancelledError("Prediction canceled")
+            self._instrument(prediction)
+        return prediction
+
+    @staticmethod
+    def _instrument(prediction: dict):
+        # 대기/실행 구간을 지표와 트레이스에 기록 (Replicate가 준 시각 기준)
+        created, started, completed = prediction_times(prediction)
+        metrics.observe_prediction(created, started, completed, prediction.get("status") == "succeeded")
+        tracing.set_attributes(**{"prediction.id": prediction.get("id"), "prediction.status": prediction.get("status")})
+        if created and started:
+            tracing.record_span('replicate.queue', created, started)
+        if started and completed:
+            tracing.record_span('replicate.run', started, completed)
+
+    def handle_webhook(self, payload: dict) -> bool:
+        # 어느 스레드에서든 호출 가능. 기다리는 예측이 있으면 True
+        loop = self._loop
+        if loop is None or payload.get("status") not in TERMINAL_STATUSES:
+            return False
+        if payload.get("id") not in self._waiters:
+            return False
+        loop.call_soon_threadsafe(self._resolve, payload)
+        return True
+
+    def _resolve(self, payload: dict):
+        waiter = self._waiters.get(payload.get("id"))
+        if waiter is not None and not waiter.done():
+            waiter.set_result(payload)
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def prediction_times(prediction: dict) -> tuple:
+    # (created_at, started_at, completed_at)을 epoch 초로 변환 (없으면 None)
+    return tuple(_timestamp(prediction.get(field)) for field in ("created_at", "started_at", "completed_at"))
+
+
+def verify_webhook_signature(body: bytes, webhook_id: str, timestamp: str, signature: str,
+                             secret: Optional[str] = REPLICATE_WEBHOOK_SECRET,
+                             tolerance: float = REPLICATE_WEBHOOK_TOLERANCE, now: Optional[float] = None) -> bool:
+    # Replicate 웹훅 서명 검증. secret이 없으면 항상 거절 (매니저도 이때는 웹훅을 등록하지 않고 폴링만 사용)
+    # 서명이 맞아도 timestamp가 tolerance초 넘게 차이 나면 가로챈 웹훅의 재전송으로 보고 거절
+    if not secret:
+        return False
+    if not (webhook_id and timestamp and signature):
+        return False
+    try:
+        sent_at = float(timestamp)
+    except ValueError:
+        return False
+    if abs((time.time() if now is None else now) - sent_at) > tolerance:
+        return False
+    key = base64.b64decode(secret.split('_', 1)[1] if secret.startswith('whsec_') else secret)
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    return any(hmac.compare_digest(expected, sig.split(',', 1)[-1]) for sig in signature.split())
+
+
+# 프로세스 전체에서 공유하는 매니저
+manager = PredictionManager()
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+import job_control
+import metrics
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+
+def _setting(prefix: str, dependency: str, name: str, default):
+    # 의존성별 설정(RETRY_OPENAI_MAX_ATTEMPTS)이 있으면 우선, 없으면 공통 설정(RETRY_MAX_ATTEMPTS)
+    return type(default)(os.getenv(f'{prefix}_{dependency.upper()}_{name}', os.getenv(f'{prefix}_{name}', default)))
+
+
+# 재시도할 HTTP 상태 코드
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+# 재시도할 S3(botocore) 오류 코드
+RETRYABLE_S3_ERROR_CODES = ('RequestTimeout', 'RequestTimeoutException', 'Throttling', 'ThrottlingException',
+                            'SlowDown', 'InternalError', 'ServiceUnavailable', 'RequestLimitExceeded')
+
+
+class CircuitOpenError(RuntimeError):
+    # 회로가 열려 있어 호출하지 않고 바로 실패
+    def __init__(self, dependency: str, retry_in: float):
+        super().__init__(f"{dependency} circuit is open (retry in {retry_in:.1f}s)")
+        self.dependency = dependency
+        self.retry_in = retry_in
+
+
+class RetryableError(Exception):
+    # 응답은 받았지만 재시도해야 하는 경우 (예: 웹훅 수신 측 5xx)
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # 연속 실패가 failure_threshold에 닿으면 reset_timeout 동안 호출을 막고(open),
+    # 이후 한 번만 시험 호출을 허용(half-open)해서 성공하면 다시 닫는다.
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self.state == self.OPEN and elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit {self.name} closed")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    logging.error(f"Circuit {self.name} opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def release(self):
+        # 결과를 모른 채 끝난 호출(취소 등)이 차지한 반열림 시험 기회를 돌려줌 (돌려주지 않으면 half-open에서 영원히 막힘)
+        with self._lock:
+            self._trial_running = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures}
+
+
+class RetryBudget:
+    # 최근 window초 동안 재시도 수를 (minimum + ratio * 요청 수) 이하로 제한
+    # 장애 중에 모든 호출이 재시도로 부하를 몇 배로 키우는 것을 막는다.
+
+    def __init__(self, ratio: float, minimum: int, window: float):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class Dependency:
+    # 외부 의존성 하나에 대한 재시도 정책 + 재시도 예산 + 회로 차단기
+
+    def __init__(self, name: str, max_attempts: int = 3):
+        self.name = name
+        self.max_attempts = max(1, _setting('RETRY', name, 'MAX_ATTEMPTS', max_attempts))
+        self.base_delay = _setting('RETRY', name, 'BASE_DELAY', 0.5)
+        self.max_delay = _setting('RETRY', name, 'MAX_DELAY', 20.0)
+        self.deadline = _setting('RETRY', name, 'DEADLINE', 120.0)  # 재시도 대기를 포함한 호출 전체 시간 한도
+        self.budget = RetryBudget(_setting('RETRY', name, 'BUDGET_RATIO', 0.2), _setting('RETRY', name, 'BUDGET_MIN', 10), 60.0)
+        self.breaker = CircuitBreaker(name, _setting('CIRCUIT', name, 'FAILURE_THRESHOLD', 5),
+                                      _setting('CIRCUIT', name, 'RESET_TIMEOUT', 30.0))
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        # full jitter 지수 백오프. 서버가 Retry-After를 주면 그 값을 하한으로 사용
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _next_delay(self, attempt: int, started: float, error: Exception,
+                    retry_if: Optional[Callable] = None) -> Optional[float]:
+        # 재시도하지 않을 경우 None. retry_if로 호출별 재시도 조건을 더 좁힐 수 있음 (예: 중복 생성이 생기는 요청)
+        if isinstance(error, CircuitOpenError) or not (retry_if or is_retryable)(error) or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt, error)
+        # 재시도 대기 중에 잡 마감이 지나면 재시도하지 않음
+        remaining = job_control.remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        if time.monotonic() - started + delay > self.deadline or not self.budget.try_spend():
+            return None
+        return delay
+
+    def _failed(self, error: Exception):
+        # 재시도 대상인 오류만 의존성 장애로 셈
+        # 재시도 대상이 아닌 오류(잘못된 요청, 모델이 거절한 예측, 잡 취소/마감 등)는 회로 상태를 바꾸지 않고 시험 기회만 돌려줌
+        if is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    def call(self, func: Callable, *args, retry_if: Optional[Callable] = None, **kwargs):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                metrics.dependency_call(self.name, 'rejected')
+                raise
+            self.budget.record_request()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    self.breaker.release()
+                    raise
+                self._failed(e)
+                delay = self._next_delay(attempt, started, e, retry_if)
+                if delay is None:
+                    metrics.dependency_call(self.name, 'failure')
+                    raise
+                metrics.dependency_call(self.name, 'retry')
+                logging.error(f"{self.name} call failed (attempt {attempt}/{self.max_attempts}), "
+                              f"retrying in {delay:.2f}s: {type(e).__name__}: {e}")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            metrics.dependency_call(self.name, 'success')
+            return result
+
+    async def acall(self, func: Callable, *args, retry_if: Optional[Callable] = None, **kwargs):
+        # call과 같지만 코루틴 함수용 (이벤트 루프를 막지 않고 대기)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                metrics.dependency_call(self.name, 'rejected')
+                raise
+            self.budget.record_request()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException as e:
+                # 취소(잡 취소, 마감 초과, 헤지 경쟁에서 짐)는 실패가 아니므로 시험 기회만 돌려주고 그대로 전파
+                if not isinstance(e, Exception):
+                    self.breaker.release()
+                    raise
+                self._failed(e)
+                delay = self._next_delay(attempt, started, e, retry_if)
+                if delay is None:
+                    metrics.dependency_call(self.name, 'failure')
+                    raise
+                metrics.dependency_call(self.name, 'retry')
+                logging.error(f"{self.name} call failed (attempt {attempt}/{self.max_attempts}), "
+                              f"retrying in {delay:.2f}s: {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            metrics.dependency_call(self.name, 'success')
+            return result
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    # requests/httpx/openai/replicate 예외에서 HTTP 상태 코드 추출
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RetryableError):
+        return True
+    if isinstance(error, (CircuitOpenError, job_control.JobCancelledError, job_control.DeadlineExceededError)):
+        return False
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+
+    # botocore: ClientError는 오류 코드로, 연결 오류는 항상 재시도
+    s3_error = getattr(error, 'response', None)
+    if isinstance(s3_error, dict):
+        code = s3_error.get('Error', {}).get('Code')
+        http_status = s3_error.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        return code in RETRYABLE_S3_ERROR_CODES or http_status in RETRYABLE_STATUS_CODES
+
+    # 상태 코드가 없는 예외는 이름으로 네트워크 오류 여부 판단 (라이브러리마다 클래스가 달라서)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & {
+        'ConnectionError', 'Timeout', 'TimeoutError', 'TransportError', 'TimeoutException',  # requests / httpx
+        'APIConnectionError', 'APITimeoutError',  # openai
+        'EndpointConnectionError', 'ConnectionClosedError', 'ReadTimeoutError', 'ConnectTimeoutError',  # botocore
+    })
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    # Retry-After 헤더(초 또는 HTTP 날짜)를 초 단위로 변환
+    if isinstance(error, RetryableError):
+        return error.retry_after
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    return parse_retry_after(value)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def snapshot() -> dict:
+    return {dependency.name: dependency.breaker.snapshot()
+            for dependency in (openai, replicate, prediction, download, transfer, s3, webhook)}
+
+
+# 프로세스 전체에서 공유하는 의존성별 정책 (회로 상태도 프로세스 단위)
+openai = Dependency('openai')
+replicate = Dependency('replicate')
+# 예측 전체(생성~완료 대기)를 감싸는 정책. status=failed로 끝난 예측은 모델 쪽 결과(거절된 프롬프트 등)라서 재실행하지도,
+# 회로 실패로 세지도 않음. 재실행은 GPU 비용이 들어서 기본으로 끄고 RETRY_PREDICTION_MAX_ATTEMPTS로 켬
+prediction = Dependency('prediction', max_attempts=1)
+download = Dependency('download')
+transfer = Dependency('transfer')  # Replicate → S3 스트리밍 전송 (다시 보내면 같은 객체를 덮어쓰므로 재시도해도 안전)
+s3 = Dependency('s3')
+webhook = Dependency('webhook')
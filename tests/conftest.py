@@ -0,0 +1,69 @@
+import os
+import socket
+import sys
+import tempfile
+
+import pytest
+
+# 모듈이 import 시점에 환경 변수를 읽으므로, 앱 모듈을 import하기 전에 테스트용 값과 임시 경로를 설정
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix='webtoon-ai-test-')
+os.environ.update({
+    'OPENAI_KEY': 'test',
+    'REPLICATE_API_TOKEN': 'test',
+    'AWS_ACCESS_KEY_ID': 'test',
+    'AWS_SECRET_ACCESS_KEY': 'test',
+    'AWS_REGION': 'ap-northeast-2',
+    'AWS_DEFAULT_REGION': 'ap-northeast-2',
+    'BUCKET_NAME': 'test-bucket',
+    'JOB_QUEUE_PATH': os.path.join(DATA_DIR, 'jobs.db'),
+    'LLM_CACHE_PATH': os.path.join(DATA_DIR, 'llm_cache.db'),
+    'ADMISSION_LIMITS_PATH': os.path.join(DATA_DIR, 'admission_limits.json'),
+    'WORKSPACE_ROOT': os.path.join(DATA_DIR, 'workspaces'),
+    'UPLOAD_FOLDER': os.path.join(DATA_DIR, 'uploads'),
+    'TRACING_EXPORTER': 'memory',
+    'JOB_CANCEL_POLL_INTERVAL': '0.1',
+})
+sys.path.insert(0, ROOT)
+
+from benchmarks import fake_replicate  # noqa: E402
+from benchmarks.run_load import start_server  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='session')
+def fake_replicate_server():
+    port = free_port()
+    fake_replicate.FAKE_REPLICATE_PUBLIC_URL = f"http://127.0.0.1:{port}"
+    server = start_server(fake_replicate.app, port)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+
+
+@pytest.fixture
+def fake_replicate_url(fake_replicate_server, monkeypatch):
+    # 테스트마다 예측 기록을 비우고 짧은 처리 시간으로 설정
+    fake_replicate.predictions.clear()
+    for key in fake_replicate.stats:
+        fake_replicate.stats[key] = 0
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 0.3)
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_JITTER', 0.0)
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_FAILURE_RATE', 0.0)
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_SLOW_RATE', 0.0)
+    return fake_replicate_server
+
+
+@pytest.fixture
+def api(tmp_path_factory, monkeypatch):
+    # main은 import 시 작업 디렉터리에 app.log를 만들므로 임시 디렉터리에서 import
+    # 수명 주기(임베디드 워커, 예측 매니저)는 시작하지 않고 요청 처리만 확인
+    from fastapi.testclient import TestClient
+    monkeypatch.chdir(tmp_path_factory.getbasetemp())
+    import main
+    monkeypatch.setattr(main, 'JOB_EVENTS_POLL_INTERVAL', 0.02)
+    return TestClient(main.app)
@@ -0,0 +1,22 @@
+import admission
+
+
+def test_account_limits_are_split_across_processes(tmp_path):
+    limits = {"replicate": {"concurrency": 8, "rate": 5, "burst": 10}, "openai": {"concurrency": 1}}
+    controller = admission.AdmissionController(limits, path=str(tmp_path / 'limits.json'), process_count=4)
+
+    # 프로세스 4개가 나눠 쓰면 합이 계정 한도를 넘지 않음
+    assert controller.limiter('replicate').snapshot() == {"concurrency": 2, "rate": 1.25, "burst": 2, "inUse": 0, "waiting": 0}
+    # 나눠서 0이 되는 한도는 1로 남김 (0은 제한 없음을 뜻함)
+    assert controller.limiter('openai').concurrency == 1
+
+
+def test_runtime_update_keeps_process_share(tmp_path):
+    controller = admission.AdmissionController({}, path=str(tmp_path / 'limits.json'), process_count=2)
+    limiter = controller.limiter('replicate')
+    assert limiter.concurrency == 0
+
+    controller.update({"replicate": {"concurrency": 6, "rate": 4}})
+
+    assert (limiter.concurrency, limiter.rate) == (3, 2.0)
+    assert controller.snapshot()["limits"]["replicate"]["concurrency"] == 6
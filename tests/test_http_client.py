@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import http_client
+
+
+def counts(client: str) -> dict:
+    return dict(http_client.stats().get(client, {"requests": 0, "connections": 0}))
+
+
+def test_shared_session_reuses_connections(fake_replicate_url):
+    before = counts("sync")
+
+    for _ in range(5):
+        assert http_client.get(f"{fake_replicate_url}/files/a.webp").status_code == 200
+
+    after = counts("sync")
+    assert after["requests"] - before["requests"] == 5
+    assert after["connections"] - before["connections"] <= 1
+
+
+def test_session_is_shared_across_threads():
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(http_client.get_session())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(session) for session in sessions}) == 1
+
+
+def test_async_client_reuses_connections(fake_replicate_url):
+    async def fetch_all():
+        async with http_client.create_async_client() as client:
+            for _ in range(5):
+                response = await client.get(f"{fake_replicate_url}/files/a.webp")
+                assert response.status_code == 200
+
+    before = counts("async")
+    asyncio.run(fetch_all())
+    after = counts("async")
+
+    assert after["requests"] - before["requests"] == 5
+    assert after["connections"] - before["connections"] == 1
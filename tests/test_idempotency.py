@@ -0,0 +1,60 @@
+import uuid
+
+import pytest
+
+import idempotency
+import job_registry
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = idempotency.SQLiteIdempotencyStore(str(tmp_path / 'idempotency.db'))
+    monkeypatch.setattr(idempotency, 'store', store)
+    return store
+
+
+def new_job(kind: str = 'webtoon', member_id: str = 'm1') -> str:
+    job_id = uuid.uuid4().hex
+    job_registry.registry.create(job_id, kind, member_id)
+    return job_id
+
+
+def test_client_keys_are_scoped_by_endpoint_and_member():
+    keys = {
+        idempotency.client_key('webtoon', 'm1', 'abc'),
+        idempotency.client_key('profile', 'm1', 'abc'),
+        idempotency.client_key('webtoon', 'm2', 'abc'),
+    }
+    assert len(keys) == 3
+
+
+def test_same_key_and_body_attaches_to_existing_job(store):
+    key = idempotency.client_key('webtoon', 'm1', 'abc')
+    first = new_job()
+    assert idempotency.resolve(key, first, 'body-1') is None
+
+    existing = idempotency.resolve(key, uuid.uuid4().hex, 'body-1')
+
+    assert existing["jobId"] == first
+
+
+def test_same_key_with_different_body_is_rejected(store):
+    key = idempotency.client_key('webtoon', 'm1', 'abc')
+    first = new_job()
+    assert idempotency.resolve(key, first, 'body-1') is None
+
+    with pytest.raises(idempotency.IdempotencyKeyReusedError):
+        idempotency.resolve(key, uuid.uuid4().hex, 'body-2')
+    # 거절된 요청이 기존 잡의 키를 풀지 않음
+    assert idempotency.resolve(key, uuid.uuid4().hex, 'body-1')["jobId"] == first
+
+
+def test_failed_job_key_moves_to_new_job(store):
+    key = idempotency.client_key('webtoon', 'm1', 'abc')
+    first = new_job()
+    idempotency.resolve(key, first, 'body-1')
+    job_registry.registry.fail(first, 'boom')
+
+    second = uuid.uuid4().hex
+    assert idempotency.resolve(key, second, 'body-1') is None
+    assert store.claim(key, uuid.uuid4().hex, 'body-1') == (second, 'body-1')
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+from PIL import Image
+
+import extract_profile
+import image_preprocess
+import llm_cache
+
+
+def make_jpeg(width: int, height: int, orientation: int = None) -> bytes:
+    output = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new('RGB', (width, height), (200, 120, 40)).save(output, format='JPEG', exif=exif)
+    return output.getvalue()
+
+
+def decode(data: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def test_normalize_downscales_long_edge_and_reencodes():
+    data, mime_type = image_preprocess.normalize_image(make_jpeg(3000, 1500), max_edge=1024, image_format='WEBP')
+
+    img = decode(data)
+    assert mime_type == 'image/webp' and img.format == 'WEBP'
+    assert img.size == (1024, 512)
+
+
+def test_normalize_applies_exif_rotation():
+    # orientation 6: 90도 회전해서 보여야 하는 세로 사진
+    data, _ = image_preprocess.normalize_image(make_jpeg(400, 200, orientation=6), max_edge=1024, image_format='JPEG')
+
+    assert decode(data).size == (200, 400)
+
+
+def test_normalize_keeps_small_images_and_converts_mode():
+    output = io.BytesIO()
+    Image.new('RGBA', (64, 32), (0, 0, 0, 0)).save(output, format='PNG')
+
+    data, mime_type = image_preprocess.normalize_image(output.getvalue(), max_edge=1024, image_format='JPEG')
+
+    img = decode(data)
+    assert mime_type == 'image/jpeg'
+    assert img.size == (64, 32) and img.mode == 'RGB'
+
+
+def test_normalize_rejects_undecodable_bytes():
+    with pytest.raises(Exception):
+        image_preprocess.normalize_image(b'not an image')
+
+
+def test_profile_cache_key_follows_preprocessing_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'cache', llm_cache.LLMCache(str(tmp_path / 'cache.db')))
+    calls = []
+    monkeypatch.setattr(extract_profile, 'request_gpt_response',
+                        lambda prompt, user_img, mime_type: calls.append(user_img) or {"hair": len(calls)})
+
+    assert extract_profile.get_gpt_response('m1', 'img-a', image_sha256='abc') == ('m1', {"hair": 1})
+    # 같은 원본이면 전처리 결과가 달라도(base64 문자열) 캐시 사용
+    assert extract_profile.get_gpt_response('m1', 'img-b', image_sha256='abc') == ('m1', {"hair": 1})
+    # 전처리 설정이 바뀌면 모델이 보는 이미지가 달라지므로 다시 요청
+    monkeypatch.setattr(image_preprocess, 'IMAGE_MAX_EDGE', 512)
+    assert extract_profile.get_gpt_response('m1', 'img-c', image_sha256='abc') == ('m1', {"hair": 2})
+    monkeypatch.setattr(image_preprocess, 'IMAGE_FACE_CROP', True)
+    assert extract_profile.get_gpt_response('m1', 'img-d', image_sha256='abc') == ('m1', {"hair": 3})
+    assert calls == ['img-a', 'img-c', 'img-d']
@@ -0,0 +1,106 @@
+import os
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from fastapi import FastAPI, Response
+from moto.server import ThreadedMotoServer
+
+import image_transfer
+import pipeline
+import workspace
+from benchmarks import fake_replicate
+from benchmarks.run_load import start_server
+from conftest import free_port
+
+BUCKET = os.environ['BUCKET_NAME']
+
+
+@pytest.fixture(scope='module')
+def s3_endpoint():
+    port = free_port()
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(s3_endpoint, monkeypatch):
+    client = boto3.client('s3', region_name='ap-northeast-2', endpoint_url=s3_endpoint)
+    client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-2'})
+    monkeypatch.setattr(pipeline, 's3_client', client)
+    monkeypatch.setattr(pipeline, 'BUCKET_NAME', BUCKET)
+    yield client
+    for item in client.list_objects_v2(Bucket=BUCKET).get('Contents', []):
+        client.delete_object(Bucket=BUCKET, Key=item['Key'])
+    client.delete_bucket(Bucket=BUCKET)
+
+
+def test_transfer_streams_replicate_output_into_s3(fake_replicate_url, s3):
+    with workspace.manager.open('transfer-test') as job_workspace:
+        url = pipeline.transfer_image_to_s3(f"{fake_replicate_url}/files/abc.webp", 'member_1', '1', date='2024-01-01', is_profile=False)
+        # 스트리밍 전송은 작업 디렉터리에 파일을 남기지 않음
+        assert os.listdir(job_workspace.path) == []
+
+    assert url == f"https://{BUCKET}.s3.{pipeline.AWS_REGION}.amazonaws.com/webtoon-ai/member_1/2024-01-01/1.webp"
+    stored = s3.get_object(Bucket=BUCKET, Key='webtoon-ai/member_1/2024-01-01/1.webp')
+    assert stored['Body'].read() == fake_replicate.WEBP_BYTES
+    assert stored['ContentType'] == 'image/webp'
+
+
+def test_transfer_falls_back_to_local_download(fake_replicate_url, s3, monkeypatch):
+    def broken_stream(*args, **kwargs):
+        raise ConnectionError("stream interrupted")
+
+    monkeypatch.setattr(image_transfer, 'stream_url_to_s3', broken_stream)
+
+    url = pipeline.transfer_image_to_s3(f"{fake_replicate_url}/files/abc.webp", 'member_1', 'temp_profile', is_profile=True)
+
+    assert url.endswith('/webtoon-ai/member_1/temp_profile.webp')
+    assert s3.get_object(Bucket=BUCKET, Key='webtoon-ai/member_1/temp_profile.webp')['Body'].read() == fake_replicate.WEBP_BYTES
+
+
+def test_stream_uses_multipart_upload_for_large_bodies(s3, monkeypatch):
+    # 파트 크기(5MB)보다 큰 본문도 전체를 메모리에 올리지 않고 파트 단위로 전송
+    body = os.urandom(12 * 1024 * 1024)
+    source = FastAPI()
+
+    @source.get('/large.webp')
+    async def large():
+        return Response(content=body, media_type='image/webp')
+
+    port = free_port()
+    server = start_server(source, port)
+    part_size = 5 * 1024 * 1024
+    monkeypatch.setattr(image_transfer, 'transfer_config',
+                        TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size, max_concurrency=1, use_threads=False))
+    try:
+        sent = image_transfer.stream_url_to_s3(s3, f"http://127.0.0.1:{port}/large.webp", BUCKET, 'large.webp')
+    finally:
+        server.should_exit = True
+
+    assert sent == len(body)
+    stored = s3.get_object(Bucket=BUCKET, Key='large.webp')
+    assert stored['Body'].read() == body
+    assert stored['ETag'].strip('"').endswith('-3')  # 멀티파트 업로드(파트 3개)의 ETag
+
+
+def test_stream_is_retried_through_resilience_layer(fake_replicate_url, s3, monkeypatch):
+    calls = []
+    stream = image_transfer.stream_url_to_s3
+
+    def flaky_stream(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return stream(*args, **kwargs)
+
+    monkeypatch.setattr(image_transfer, 'stream_url_to_s3', flaky_stream)
+    monkeypatch.setattr(pipeline, 'download_webp', lambda *args: pytest.fail("fell back to local download"))
+
+    url = pipeline.transfer_image_to_s3(f"{fake_replicate_url}/files/abc.webp", 'member_1', '2', date='2024-01-01', is_profile=False)
+
+    assert len(calls) == 2
+    assert s3.get_object(Bucket=BUCKET, Key='webtoon-ai/member_1/2024-01-01/2.webp')['Body'].read() == fake_replicate.WEBP_BYTES
+    assert url.endswith('/2024-01-01/2.webp')
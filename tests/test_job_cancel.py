@@ -0,0 +1,81 @@
+import threading
+import time
+import types
+
+import pytest
+
+import job_control
+import job_queue
+import job_registry
+import make_scenario
+import model_registry
+import prediction_manager
+import worker
+from benchmarks import fake_replicate
+
+SCENES = ["scene 1", "scene 2"]
+
+
+@pytest.fixture
+def webtoon_job(fake_replicate_url, tmp_path, monkeypatch):
+    # 시나리오(OpenAI)와 모델 조회만 고정하고, 패널 예측은 가짜 Replicate에서 실제로 생성/폴링/취소
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 30)
+    manager = prediction_manager.PredictionManager(base_url=fake_replicate_url, api_token='test', first_interval=0.05, webhook_url=None)
+    monkeypatch.setattr(prediction_manager, 'manager', manager)
+    monkeypatch.setattr(make_scenario, 'SCENARIO_STREAMING', False)
+    monkeypatch.setattr(make_scenario, 'get_gpt_response', lambda memberId, content: (memberId, SCENES))
+    monkeypatch.setattr(model_registry.registry, 'version', lambda style: types.SimpleNamespace(id='test-version'))
+    queue = job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'))
+
+    def start():
+        payload = {"memberId": "member_1", "date": "2024-01-01", "content": "diary", "characterInfo": "info", "seedNum": 1,
+                   "characterStyle": "romance", "apiDomainUrl": "example.com", "progressiveCallbacks": False}
+        job_id = queue.enqueue('webtoon', payload)
+        job_registry.registry.create(job_id, 'webtoon', 'member_1')
+        thread = threading.Thread(target=worker.Worker(queue, concurrency=1).process, args=(queue.dequeue(60),))
+        thread.start()
+        return job_id, thread
+
+    yield start
+    manager.stop()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def running_predictions():
+    return [p for p in fake_replicate.predictions.values() if p["status"] not in ("succeeded", "failed", "canceled")]
+
+
+def test_cancel_stops_running_predictions(webtoon_job):
+    job_id, thread = webtoon_job()
+    wait_for(lambda: len(running_predictions()) == len(SCENES))
+
+    started = time.monotonic()
+    job_control.control.cancel(job_id, 'user canceled')
+    thread.join(timeout=10)
+
+    # 패널 예측(30초)을 기다리지 않고 끝나고, Replicate에도 취소 요청이 감
+    assert not thread.is_alive()
+    assert time.monotonic() - started < 5
+    wait_for(lambda: fake_replicate.stats["canceled"] == len(SCENES))
+    assert running_predictions() == []
+    job = job_registry.registry.get(job_id)
+    assert job["status"] == job_registry.CANCELED
+
+
+def test_deadline_cancels_predictions_and_fails_job(webtoon_job, monkeypatch):
+    monkeypatch.setitem(job_control.JOB_DEADLINES, 'webtoon', 1.5)
+    job_id, thread = webtoon_job()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    wait_for(lambda: fake_replicate.stats["canceled"] == len(SCENES))
+    assert running_predictions() == []
+    job = job_registry.registry.get(job_id)
+    assert job["status"] == job_registry.FAILED
+    assert job["error"].startswith("DeadlineExceededError")
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+import uuid
+
+import job_registry
+
+
+def new_job(kind: str = 'webtoon') -> str:
+    job_id = uuid.uuid4().hex
+    job_registry.registry.create(job_id, kind, 'm1')
+    return job_id
+
+
+def read_events(response) -> list:
+    events = []
+    for block in response.text.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_job_status_follows_stages(api):
+    job_id = new_job()
+    assert api.get(f'/jobs/{job_id}').json()["status"] == job_registry.QUEUED
+
+    job_registry.registry.emit(job_id, 'scenario')
+    job = api.get(f'/jobs/{job_id}').json()
+    assert (job["status"], job["stage"]) == (job_registry.RUNNING, 'scenario')
+
+    job_registry.registry.complete(job_id, {"images": ["a.webp"]})
+    job = api.get(f'/jobs/{job_id}').json()
+    assert (job["status"], job["stage"], job["result"]) == (job_registry.SUCCEEDED, 'completed', {"images": ["a.webp"]})
+
+
+def test_unknown_job_is_404(api):
+    assert api.get('/jobs/missing').status_code == 404
+    assert api.get('/jobs/missing/events').status_code == 404
+
+
+def test_event_stream_follows_job_until_terminal(api):
+    job_id = new_job()
+
+    def progress():
+        time.sleep(0.1)
+        job_registry.registry.emit(job_id, 'scenario')
+        job_registry.registry.emit(job_id, 'panel', index=0)
+        time.sleep(0.1)
+        job_registry.registry.complete(job_id, {"images": []})
+
+    thread = threading.Thread(target=progress)
+    thread.start()
+    response = api.get(f'/jobs/{job_id}/events')
+    thread.join()
+
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = read_events(response)
+    assert [(stage, event["status"]) for _, stage, event in events] == [
+        ('queued', job_registry.QUEUED), ('scenario', job_registry.RUNNING), ('panel', job_registry.RUNNING),
+        ('completed', job_registry.SUCCEEDED),
+    ]
+    assert events[2][2]["data"] == {"index": 0}
+    assert [seq for seq, _, _ in events] == sorted(seq for seq, _, _ in events)
+
+
+def test_event_stream_resumes_after_last_event_id(api):
+    job_id = new_job()
+    job_registry.registry.emit(job_id, 'scenario')
+    job_registry.registry.fail(job_id, 'boom')
+    first = read_events(api.get(f'/jobs/{job_id}/events'))
+
+    resumed = read_events(api.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': str(first[0][0])}))
+
+    assert [stage for _, stage, _ in resumed] == ['scenario', 'failed']
+    assert resumed == first[1:]
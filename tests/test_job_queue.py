@@ -0,0 +1,102 @@
+import time
+import uuid
+
+import fakeredis
+import pytest
+import redis
+
+import job_queue
+
+
+@pytest.fixture
+def redis_queue(monkeypatch):
+    # Lua 스크립트(DRR)까지 실행하는 인메모리 Redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return job_queue.RedisJobQueue(name=f"test-{uuid.uuid4().hex[:8]}", max_attempts=1)
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def queue(request, tmp_path):
+    if request.param == 'redis':
+        return request.getfixturevalue('redis_queue')
+    return job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'), max_attempts=1)
+
+
+def drain(queue):
+    order = []
+    while (job := queue.dequeue(60)) is not None:
+        order.append(job)
+        queue.ack(job.id)
+    return order
+
+
+def test_higher_priority_class_goes_first(queue):
+    queue.enqueue('webtoon_batch', {"memberId": "a"})
+    queue.enqueue('webtoon', {"memberId": "a"})
+    queue.enqueue('profile', {"memberId": "a"})
+    queue.enqueue('webtoon', {"memberId": "b"}, priority='interactive')
+
+    assert [job.priority_class for job in drain(queue)] == ['interactive', 'interactive', 'standard', 'backfill']
+
+
+def test_members_alternate_within_a_class(queue):
+    # 먼저 잡을 많이 넣은 회원이 있어도 나중에 들어온 회원과 번갈아 처리
+    for _ in range(4):
+        queue.enqueue('profile', {"memberId": "heavy"})
+    for _ in range(2):
+        queue.enqueue('profile', {"memberId": "light"})
+
+    assert [job.member_id for job in drain(queue)] == ['heavy', 'light', 'heavy', 'light', 'heavy', 'heavy']
+
+
+def test_deficit_carries_over_until_expensive_job_fits(queue):
+    # 비용 4인 웹툰은 차례마다 1씩 적립해서 네 번째 차례에 처리되고, 그 사이 비용 1인 잡이 먼저 나감
+    queue.enqueue('webtoon', {"memberId": "heavy"}, priority='standard')
+    for _ in range(5):
+        queue.enqueue('profile', {"memberId": "light"}, priority='standard')
+
+    order = [(job.member_id, job.kind) for job in drain(queue)]
+
+    assert order == [('light', 'profile')] * 3 + [('heavy', 'webtoon')] + [('light', 'profile')] * 2
+
+
+def test_retried_job_is_dequeued_again(queue):
+    job_id = queue.enqueue('profile', {"memberId": "a"})
+    queue.max_attempts = 2
+    job = queue.dequeue(60)
+    queue.nack(job.id, error='boom', delay=0)
+
+    retried = queue.dequeue(60)
+    assert (retried.id, retried.attempts) == (job_id, 2)
+
+
+def test_sqlite_prune_drops_finished_jobs_and_idle_members(tmp_path):
+    queue = job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'), max_attempts=1)
+    done = queue.enqueue('profile', {"memberId": "idle"})
+    queue.ack(queue.dequeue(60).id)
+    waiting = queue.enqueue('profile', {"memberId": "busy"})
+    queue.enqueue('profile', {"memberId": "busy"})
+    queue.dequeue(60)
+    conn = queue._connect()
+    conn.execute("UPDATE jobs SET updated_at = updated_at - 7200 WHERE id = ?", (done,))
+
+    queue.prune(max_age=3600)
+
+    # 대기/처리 중인 잡은 남기고, 오래된 끝난 잡과 대기 잡이 없는 회원의 DRR 상태는 지움
+    remaining = {row[0] for row in conn.execute("SELECT id FROM jobs")}
+    assert done not in remaining and waiting in remaining and len(remaining) == 2
+    assert [row[0] for row in conn.execute("SELECT member_id FROM fair_share")] == ['busy']
+
+
+def test_redis_prune_drops_failed_jobs(redis_queue):
+    queue = redis_queue
+    job_id = queue.enqueue('profile', {"memberId": "a"})
+    queue.nack(queue.dequeue(60).id, error='boom')
+    assert queue.redis.hexists(queue.jobs_key, job_id)
+
+    queue.prune(max_age=3600)
+    assert queue.redis.hexists(queue.jobs_key, job_id)
+    queue.redis.zadd(queue.finished_key, {job_id: time.time() - 7200})
+    queue.prune(max_age=3600)
+    assert not queue.redis.hexists(queue.jobs_key, job_id)
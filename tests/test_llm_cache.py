@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return llm_cache.LLMCache(str(tmp_path / 'cache.db'), ttl=60, max_entries=3)
+
+
+def counter():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"n": len(calls)}
+    return calls, compute
+
+
+def test_same_content_is_computed_once(cache):
+    calls, compute = counter()
+
+    first = cache.get_or_compute('scenario', '일기 내용', 'v1', 'gpt-4o', compute)
+    second = cache.get_or_compute('scenario', '일기 내용', 'v1', 'gpt-4o', compute)
+
+    assert first == second == {"n": 1}
+    assert len(calls) == 1
+    assert cache.stats()['scenario'] == {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+
+def test_key_covers_content_prompt_version_and_model(cache):
+    calls, compute = counter()
+
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+    cache.get_or_compute('scenario', b'a', 'v1', 'gpt-4o', compute)  # bytes와 str은 같은 내용이면 같은 키
+    cache.get_or_compute('scenario', 'b', 'v1', 'gpt-4o', compute)
+    cache.get_or_compute('scenario', 'a', 'v2', 'gpt-4o', compute)
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o-mini', compute)
+    cache.get_or_compute('extract_profile', 'a', 'v1', 'gpt-4o', compute)
+
+    assert len(calls) == 5
+
+
+def test_uncacheable_results_are_not_stored(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute, cacheable=bool)
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute, cacheable=bool)
+
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_misses(cache):
+    calls, compute = counter()
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+    cache.ttl = 0.01
+    time.sleep(0.02)
+
+    assert cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute) == {"n": 2}
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    calls, compute = counter()
+    for content in ('a', 'b', 'c'):
+        cache.get_or_compute('scenario', content, 'v1', 'gpt-4o', compute)
+        time.sleep(0.01)
+    # a를 다시 읽어서 b가 가장 오래 안 쓴 항목이 됨
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+    cache.get_or_compute('scenario', 'd', 'v1', 'gpt-4o', compute)
+
+    assert len(calls) == 4
+    assert cache.stats()['scenario']['evictions'] == 1
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+    assert len(calls) == 4
+    cache.get_or_compute('scenario', 'b', 'v1', 'gpt-4o', compute)
+    assert len(calls) == 5
+
+
+def test_disabled_cache_always_computes(tmp_path):
+    cache = llm_cache.LLMCache(str(tmp_path / 'cache.db'), enabled=False)
+    calls, compute = counter()
+
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+    cache.get_or_compute('scenario', 'a', 'v1', 'gpt-4o', compute)
+
+    assert len(calls) == 2
+    assert not (tmp_path / 'cache.db').exists()
@@ -0,0 +1,146 @@
+import json
+import types
+import uuid
+
+import pytest
+
+import llm_cache
+import make_scenario
+
+SCENES = [{"scene": f"scene {n} with {{braces}} and \"quotes\" \\ and \\n", "background": f"background {n}"} for n in range(4)]
+DOCUMENT = json.dumps({"scenes": SCENES})
+
+
+def feed_in_chunks(text, size):
+    parser = make_scenario.SceneStreamParser()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return parser, items
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_parser_yields_each_scene_regardless_of_chunking(size):
+    # 청크 경계가 문자열 안, 이스케이프 문자 사이에 걸려도 같은 장면이 나옴
+    parser, items = feed_in_chunks(DOCUMENT, size)
+    assert items == SCENES
+    assert parser.done
+
+
+def test_parser_yields_scene_as_soon_as_it_closes():
+    parser = make_scenario.SceneStreamParser()
+    first = json.dumps(SCENES[0])
+    assert parser.feed('{"scenes": [' + first[:-1]) == []
+    assert parser.feed('}, {"scene": "partial') == [SCENES[0]]
+    assert parser.feed('", "background"') == []
+    assert not parser.done
+
+
+def test_parser_ignores_text_before_scenes_and_after_array():
+    parser = make_scenario.SceneStreamParser()
+    assert parser.feed('{"note": "[{not a scene}]", ') == []
+    assert parser.feed('"scenes": [' + json.dumps(SCENES[0]) + '], "extra": [{"x": 1}]}') == [SCENES[0]]
+    assert parser.done
+
+
+def test_parser_rejects_malformed_scene():
+    parser = make_scenario.SceneStreamParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"scenes": [{"scene": "a", "background": }]}')
+
+
+def formatted(n):
+    return make_scenario.format_scene(f"scene {n}", f"background {n}")
+
+
+def cached(diary):
+    key = llm_cache.cache.make_key('make_scenario', diary, f"{make_scenario.PROMPT_VERSION}-structured", make_scenario.SCENARIO_MODEL)
+    return llm_cache.cache.get('make_scenario', key)
+
+
+def test_stream_failure_after_scenes_fails_and_is_not_cached(monkeypatch):
+    diary = uuid.uuid4().hex
+
+    def structured(diary_text):
+        yield formatted(0)
+        yield formatted(1)
+        raise ConnectionError("stream interrupted")
+
+    chained = []
+    monkeypatch.setattr(make_scenario, 'stream_structured_scenario', structured)
+    monkeypatch.setattr(make_scenario, 'iter_chained_scenes', lambda diary_text: chained.append(1) or iter([]))
+
+    emitted = []
+    with pytest.raises(ConnectionError):
+        for scene in make_scenario.stream_scenario('member_1', diary, mode='structured'):
+            emitted.append(scene)
+
+    # 이미 내보낸 장면에 다른 방식으로 만든 장면을 이어 붙이지 않음
+    assert emitted == [formatted(0), formatted(1)]
+    assert chained == []
+    assert cached(diary) is None
+
+
+def test_stream_failure_before_first_scene_falls_back_to_chained(monkeypatch):
+    diary = uuid.uuid4().hex
+
+    def structured(diary_text):
+        raise ValueError("invalid response")
+        yield
+
+    monkeypatch.setattr(make_scenario, 'stream_structured_scenario', structured)
+    monkeypatch.setattr(make_scenario, 'iter_chained_scenes', lambda diary_text: iter([formatted(n) for n in range(4)]))
+
+    scenes = list(make_scenario.stream_scenario('member_1', diary, mode='structured'))
+
+    assert scenes == [formatted(n) for n in range(4)]
+    assert cached(diary) == scenes
+
+
+def fake_client(monkeypatch, content):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        usage = types.SimpleNamespace(prompt_tokens=100, completion_tokens=50)
+        return types.SimpleNamespace(usage=usage, choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+    completions = types.SimpleNamespace(create=create)
+    monkeypatch.setattr(make_scenario, 'client', types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    return calls
+
+
+def test_structured_scenario_uses_one_schema_call(monkeypatch):
+    calls = fake_client(monkeypatch, DOCUMENT)
+    before = make_scenario.get_scenario_stats()["structured"]
+
+    scenario = make_scenario.get_structured_scenario('diary')
+
+    assert scenario == [make_scenario.format_scene(scene["scene"], scene["background"]) for scene in SCENES]
+    [call] = calls
+    assert call["response_format"] == {"type": "json_schema", "json_schema": make_scenario.SCENARIO_SCHEMA}
+    after = make_scenario.get_scenario_stats()["structured"]
+    assert (after["requests"] - before["requests"], after["prompt_tokens"] - before["prompt_tokens"]) == (1, 100)
+
+
+@pytest.mark.parametrize('content', [
+    json.dumps({"scenes": SCENES[:3]}),
+    json.dumps({"scenes": SCENES[:3] + [{"scene": " ", "background": "b"}]}),
+    json.dumps([SCENES]),
+    '{"scenes": [',
+])
+def test_invalid_structured_response_is_rejected(content):
+    with pytest.raises(ValueError):
+        make_scenario.parse_structured_scenario(content)
+
+
+def test_invalid_structured_response_falls_back_to_chained(monkeypatch):
+    diary = uuid.uuid4().hex
+    calls = fake_client(monkeypatch, json.dumps({"scenes": SCENES[:2]}))
+    monkeypatch.setattr(make_scenario, 'iter_chained_scenes', lambda diary_text: iter([formatted(n) for n in range(4)]))
+
+    assert make_scenario.get_gpt_response('member_1', diary, mode='structured') == ('member_1', [formatted(n) for n in range(4)])
+    assert len(calls) == 1
+    # 두 번째 요청은 캐시에서
+    assert make_scenario.get_gpt_response('member_1', diary, mode='structured')[1] == [formatted(n) for n in range(4)]
+    assert len(calls) == 1
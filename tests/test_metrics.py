@@ -0,0 +1,57 @@
+import pytest
+
+import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.METRICS_ENABLED, reason="prometheus_client is not installed")
+
+
+def sample(name: str, **labels) -> float:
+    import prometheus_client
+    return prometheus_client.REGISTRY.get_sample_value(f"{metrics.METRICS_NAMESPACE}_{name}", labels) or 0.0
+
+
+def test_track_records_latency_and_failures_with_job_style():
+    count = sample('stage_duration_seconds_count', stage='unit_stage', character_style='romance')
+    failed = sample('failures_total', stage='unit_stage', character_style='romance')
+
+    with metrics.job('webtoon', 'romance'):
+        assert sample('jobs_in_flight', kind='webtoon', character_style='romance') == 1
+        with metrics.track('unit_stage'):
+            pass
+        with pytest.raises(RuntimeError):
+            with metrics.track('unit_stage'):
+                raise RuntimeError("boom")
+
+    assert sample('stage_duration_seconds_count', stage='unit_stage', character_style='romance') == count + 2
+    assert sample('failures_total', stage='unit_stage', character_style='romance') == failed + 1
+    assert sample('jobs_in_flight', kind='webtoon', character_style='romance') == 0
+
+
+def test_track_as_decorator_uses_unknown_style_outside_jobs():
+    @metrics.track('unit_decorated')
+    def work():
+        return 42
+
+    count = sample('stage_duration_seconds_count', stage='unit_decorated', character_style='unknown')
+    assert work() == 42
+    assert sample('stage_duration_seconds_count', stage='unit_decorated', character_style='unknown') == count + 1
+
+
+def test_prediction_split_into_queue_and_run_time():
+    queued = sample('stage_duration_seconds_sum', stage='replicate_queue', character_style='unknown')
+    run = sample('stage_duration_seconds_sum', stage='replicate_run', character_style='unknown')
+
+    metrics.observe_prediction(100.0, 102.0, 107.0, succeeded=True)
+
+    assert sample('stage_duration_seconds_sum', stage='replicate_queue', character_style='unknown') == pytest.approx(queued + 2)
+    assert sample('stage_duration_seconds_sum', stage='replicate_run', character_style='unknown') == pytest.approx(run + 5)
+
+
+def test_render_exposes_prometheus_text():
+    metrics.observe('unit_render', 0.1)
+
+    body, content_type = metrics.render()
+
+    assert content_type.startswith('text/plain')
+    line = f'{metrics.METRICS_NAMESPACE}_stage_duration_seconds_bucket{{character_style="unknown",le="0.25",stage="unit_render"}} 1.0'
+    assert line.encode() in body
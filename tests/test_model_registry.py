@@ -0,0 +1,84 @@
+import threading
+import time
+import types
+
+import pytest
+
+import model_registry
+
+MODELS = {"romance": {"model": "owner/romance", "version": "v1"}}
+
+
+@pytest.fixture
+def fetches():
+    return []
+
+
+@pytest.fixture
+def registry(tmp_path, fetches, monkeypatch):
+    registry = model_registry.ModelRegistry(MODELS, path=str(tmp_path / 'models.json'), ttl=60)
+
+    def fetch(model_name, version_id):
+        fetches.append((model_name, version_id))
+        time.sleep(0.05)
+        return types.SimpleNamespace(id=version_id)
+
+    monkeypatch.setattr(registry, '_fetch', fetch)
+    return registry
+
+
+def test_version_is_fetched_once_per_ttl(registry, fetches):
+    assert registry.version('romance').id == 'v1'
+    assert registry.version('romance').id == 'v1'
+    assert fetches == [("owner/romance", "v1")]
+
+    registry.ttl = 0
+    registry.version('romance')
+    assert len(fetches) == 2
+
+
+def test_concurrent_lookups_share_one_fetch(registry, fetches):
+    threads = [threading.Thread(target=registry.version, args=('romance',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fetches) == 1
+
+
+def test_failed_refresh_falls_back_to_cached_version(registry, monkeypatch):
+    registry.version('romance')
+    registry.ttl = 0
+
+    def down(*args):
+        raise ConnectionError("replicate down")
+
+    monkeypatch.setattr(registry, '_fetch', down)
+    assert registry.version('romance').id == 'v1'
+
+    registry._versions.clear()
+    with pytest.raises(ConnectionError):
+        registry.version('romance')
+
+
+def test_unknown_style(registry):
+    with pytest.raises(model_registry.UnknownStyleError):
+        registry.version('noir')
+
+
+def test_reload_validates_and_persists_models(registry, fetches, tmp_path):
+    registry.version('romance')
+
+    with pytest.raises(ValueError):
+        registry.reload({"pixar": {"model": "owner/pixar"}})
+    registry.reload({"pixar": {"model": "owner/pixar", "version": "p1"}, "romance": None})
+
+    assert registry.styles() == ["pixar"]
+    # 다른 프로세스의 레지스트리도 파일에서 같은 목록을 읽음
+    other = model_registry.ModelRegistry({}, path=str(tmp_path / 'models.json'))
+    assert other.models == {"pixar": {"model": "owner/pixar", "version": "p1"}}
+    # 버전 캐시를 비웠으므로 다음 조회는 새로 가져옴
+    fetches.clear()
+    assert registry.version('pixar').id == 'p1'
+    assert fetches == [("owner/pixar", "p1")]
@@ -0,0 +1,211 @@
+import base64
+import hashlib
+import hmac
+import time
+
+import pytest
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse
+
+import prediction_manager
+from benchmarks import fake_replicate
+from benchmarks.run_load import start_server
+from conftest import free_port
+
+SECRET = 'whsec_' + base64.b64encode(b'test-secret').decode()
+
+
+def sign(body: bytes, webhook_id: str, timestamp: str, secret: str = SECRET) -> str:
+    key = base64.b64decode(secret.split('_', 1)[1])
+    digest = hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()
+    return 'v1,' + base64.b64encode(digest).decode()
+
+
+@pytest.fixture
+def manager_factory():
+    managers = []
+
+    def create(**kwargs):
+        manager = prediction_manager.PredictionManager(**kwargs)
+        manager.start()
+        managers.append(manager)
+        return manager
+
+    yield create
+    for manager in managers:
+        manager.stop()
+
+
+def test_run_sync_polls_fake_replicate(fake_replicate_url, manager_factory):
+    manager = manager_factory(base_url=fake_replicate_url, api_token='test', first_interval=0.05, webhook_url=None)
+
+    prediction = manager.run_sync('test-version', {"prompt": "a cat", "seed": 1}, timeout=10)
+
+    assert prediction["status"] == "succeeded"
+    assert prediction["output"][0].endswith('.webp')
+    assert fake_replicate.stats["created"] == 1
+    assert fake_replicate.stats["polled"] >= 1
+
+
+def test_run_sync_multiplexes_concurrent_predictions(fake_replicate_url, manager_factory):
+    from concurrent.futures import ThreadPoolExecutor
+    manager = manager_factory(base_url=fake_replicate_url, api_token='test', first_interval=0.05, webhook_url=None)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        predictions = list(executor.map(lambda n: manager.run_sync('test-version', {"seed": n}, timeout=10), range(4)))
+
+    assert [p["status"] for p in predictions] == ["succeeded"] * 4
+    # 하나의 루프에서 함께 기다리므로 4건이 순차 실행(4 * 0.3초)보다 빨리 끝남
+    assert time.monotonic() - started < 1.2
+
+
+def test_webhook_resolves_prediction_without_waiting_for_poll(fake_replicate_url, manager_factory):
+    # 폴링 간격을 길게 두고, 가짜 Replicate가 보낸 완료 웹훅으로 대기가 풀리는지 확인
+    receiver = FastAPI()
+    port = free_port()
+    manager = manager_factory(base_url=fake_replicate_url, api_token='test', first_interval=30,
+                              webhook_url=f"http://127.0.0.1:{port}/replicate/webhook", webhook_secret=SECRET)
+
+    @receiver.post('/replicate/webhook')
+    async def receive(payload: dict = Body(...)):
+        manager.handle_webhook(payload)
+        return {}
+
+    server = start_server(receiver, port)
+    try:
+        started = time.monotonic()
+        prediction = manager.run_sync('test-version', {"seed": 1}, timeout=10)
+    finally:
+        server.should_exit = True
+
+    assert prediction["status"] == "succeeded"
+    assert time.monotonic() - started < 5
+    assert fake_replicate.stats["polled"] == 0
+
+
+def test_webhook_url_ignored_without_secret():
+    manager = prediction_manager.PredictionManager(webhook_url='https://example.com/replicate/webhook', webhook_secret=None)
+    assert manager.webhook_url is None
+
+
+def test_verify_webhook_signature():
+    body = b'{"id": "abc", "status": "succeeded"}'
+    now = time.time()
+    timestamp = str(int(now))
+    signature = sign(body, 'msg_1', timestamp)
+
+    assert prediction_manager.verify_webhook_signature(body, 'msg_1', timestamp, signature, secret=SECRET, now=now)
+    # 본문이 바뀌었거나 서명 키가 없으면 거절
+    assert not prediction_manager.verify_webhook_signature(body + b' ', 'msg_1', timestamp, signature, secret=SECRET, now=now)
+    assert not prediction_manager.verify_webhook_signature(body, 'msg_1', timestamp, signature, secret=None, now=now)
+    assert not prediction_manager.verify_webhook_signature(body, 'msg_1', timestamp, None, secret=SECRET, now=now)
+    # 서명이 맞아도 오래된 웹훅(재전송)은 거절
+    assert not prediction_manager.verify_webhook_signature(body, 'msg_1', timestamp, signature, secret=SECRET,
+                                                           now=now + prediction_manager.REPLICATE_WEBHOOK_TOLERANCE + 1)
+
+
+def test_create_is_not_retried_after_request_was_sent(manager_factory):
+    # 생성 요청이 서버에 닿은 뒤의 실패를 재시도하면 과금되는 중복 예측이 생김
+    received = []
+    server_app = FastAPI()
+
+    @server_app.post('/v1/predictions')
+    async def create(body: dict = Body(...)):
+        received.append(body)
+        if len(received) == 1:
+            return JSONResponse(status_code=429, content={"detail": "throttled"}, headers={"Retry-After": "0"})
+        return JSONResponse(status_code=502, content={"detail": "bad gateway"})
+
+    port = free_port()
+    server = start_server(server_app, port)
+    manager = manager_factory(base_url=f"http://127.0.0.1:{port}", api_token='test', webhook_url=None)
+    try:
+        with pytest.raises(prediction_manager.PredictionCreateError):
+            manager.run_sync('test-version', {"seed": 1}, timeout=10)
+    finally:
+        server.should_exit = True
+
+    # 429(거절)는 다시 보내지만, 502 이후에는 생성 재시도도 예측 재실행도 하지 않음
+    assert len(received) == 2
+
+
+def test_failed_predictions_are_not_rerun_or_counted_by_breaker(fake_replicate_url, manager_factory, monkeypatch):
+    # 모델이 거절한 예측(status=failed)이 이어져도 다른 회원의 예측을 막지 않음
+    import resilience
+    breaker = resilience.CircuitBreaker('prediction', failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(resilience.prediction, 'breaker', breaker)
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_FAILURE_RATE', 1.0)
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 0.05)
+    manager = manager_factory(base_url=fake_replicate_url, api_token='test', first_interval=0.05, webhook_url=None)
+
+    statuses = [manager.run_sync('test-version', {"seed": n}, timeout=10)["status"] for n in range(3)]
+
+    assert statuses == ["failed"] * 3
+    assert fake_replicate.stats["created"] == 3
+    assert breaker.state == resilience.CircuitBreaker.CLOSED
+
+
+def _hedging_manager(manager_factory, fake_replicate_url, monkeypatch, threshold: float):
+    # 최근 소요 시간 표본을 채워 두어 threshold초 뒤에 바로 헤지하도록 함
+    from collections import deque
+    monkeypatch.setattr(prediction_manager, 'PREDICTION_HEDGE_MIN_DELAY', 0.0)
+    manager = manager_factory(base_url=fake_replicate_url, api_token='test', first_interval=0.05, max_interval=0.1,
+                              webhook_url=None)
+    manager._latencies['test-version'] = deque([threshold] * prediction_manager.PREDICTION_HEDGE_MIN_SAMPLES)
+    return manager
+
+
+def _wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_hedge_wins_and_slow_original_is_canceled(fake_replicate_url, manager_factory, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 5.0)
+    manager = _hedging_manager(manager_factory, fake_replicate_url, monkeypatch, threshold=0.2)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(manager.run_sync, 'test-version', {"seed": 1}, 10, True)
+        _wait_for(lambda: fake_replicate.stats["created"] == 2)
+        original, hedge = list(fake_replicate.predictions.values())
+        hedge["_state"]["duration"] = 0
+        prediction = future.result()
+
+    assert prediction["id"] == hedge["id"]
+    assert prediction["status"] == "succeeded"
+    _wait_for(lambda: original["status"] == "canceled")
+
+
+def test_original_wins_and_hedge_is_canceled(fake_replicate_url, manager_factory, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 0.6)
+    manager = _hedging_manager(manager_factory, fake_replicate_url, monkeypatch, threshold=0.2)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(manager.run_sync, 'test-version', {"seed": 1}, 10, True)
+        _wait_for(lambda: fake_replicate.stats["created"] == 2)
+        original, hedge = list(fake_replicate.predictions.values())
+        hedge["_state"]["duration"] = 60
+        prediction = future.result()
+
+    assert prediction["id"] == original["id"]
+    assert prediction["status"] == "succeeded"
+    _wait_for(lambda: hedge["status"] == "canceled")
+    assert fake_replicate.stats["canceled"] == 1
+
+
+def test_hedge_skipped_when_budget_is_spent(fake_replicate_url, manager_factory, monkeypatch):
+    import resilience
+    monkeypatch.setattr(fake_replicate, 'FAKE_REPLICATE_LATENCY', 0.5)
+    manager = _hedging_manager(manager_factory, fake_replicate_url, monkeypatch, threshold=0.1)
+    manager._hedge_budget = resilience.RetryBudget(ratio=0, minimum=0, window=60)
+
+    prediction = manager.run_sync('test-version', {"seed": 1}, timeout=10, hedge=True)
+
+    assert prediction["status"] == "succeeded"
+    assert fake_replicate.stats["created"] == 1
+    assert fake_replicate.stats["canceled"] == 0
@@ -0,0 +1,80 @@
+import threading
+import time
+import types
+
+import pytest
+
+import make_scenario
+import make_webtoon
+import model_registry
+import pipeline
+
+SCENES = [f"scene {n}" for n in range(4)]
+
+
+@pytest.fixture
+def panels(monkeypatch):
+    # 패널 예측은 시간만 흘려보내는 대역으로 바꾸고 동시에 실행 중인 패널 수를 기록
+    state = {"running": 0, "peak": 0, "delays": {n: 0.3 for n in range(4)}, "fail": set()}
+    lock = threading.Lock()
+
+    def create_webtoon(user_id, character_info, seed_num, scene, version_id):
+        index = SCENES.index(scene)
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        try:
+            time.sleep(state["delays"][index])
+            if index in state["fail"]:
+                raise RuntimeError("prediction failed")
+            return [f"https://replicate.example/{index}.webp"]
+        finally:
+            with lock:
+                state["running"] -= 1
+
+    monkeypatch.setattr(make_webtoon, 'create_webtoon', create_webtoon)
+    monkeypatch.setattr(pipeline, 'transfer_image_to_s3', lambda url, member_id, name, date=None, is_profile=False: f"s3://{name}.webp")
+    monkeypatch.setattr(make_scenario, 'SCENARIO_STREAMING', False)
+    monkeypatch.setattr(make_scenario, 'get_gpt_response', lambda member_id, content: (member_id, SCENES))
+    monkeypatch.setattr(model_registry.registry, 'version', lambda style: types.SimpleNamespace(id='test-version'))
+    return state
+
+
+def render():
+    return pipeline.render_webtoon('member_1', '2024-01-01', 'diary', 'info', 1, 'romance')
+
+
+def test_panels_render_concurrently(panels):
+    started = time.monotonic()
+    result = render()
+
+    assert panels["peak"] == 4
+    # 4패널을 순차 실행(1.2초)하지 않고 함께 기다림
+    assert time.monotonic() - started < 0.9
+    assert len(result["webtoonImages"]) == 4
+
+
+def test_results_keep_scene_order_when_panels_finish_out_of_order(panels):
+    panels["delays"] = {0: 0.4, 1: 0.1, 2: 0.3, 3: 0.0}
+
+    result = render()
+
+    assert [image["scenario"] for image in result["webtoonImages"]] == SCENES
+    assert [image["image"] for image in result["webtoonImages"]] == [f"s3://{n + 1}.webp" for n in range(4)]
+
+
+def test_failed_panel_does_not_fail_the_others(panels):
+    panels["fail"] = {2}
+
+    result = render()
+
+    assert [image["scenario"] for image in result["webtoonImages"]] == [SCENES[0], SCENES[1], SCENES[3]]
+
+
+def test_panel_fan_out_is_limited(panels, monkeypatch):
+    monkeypatch.setattr(pipeline, 'WEBTOON_PANEL_CONCURRENCY', 2)
+    panels["delays"] = {n: 0.1 for n in range(4)}
+
+    render()
+
+    assert panels["peak"] == 2
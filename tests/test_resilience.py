@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+import resilience
+
+
+def guarded(name='unit'):
+    dep = resilience.Dependency(name, max_attempts=1)
+    dep.breaker = resilience.CircuitBreaker(name, failure_threshold=1, reset_timeout=0.05)
+    return dep
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def ok():
+    return 'ok'
+
+
+def test_breaker_opens_and_rejects():
+    dep = guarded()
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await dep.acall(fail)
+        with pytest.raises(resilience.CircuitOpenError):
+            await dep.acall(ok)
+
+    asyncio.run(scenario())
+    assert dep.breaker.state == resilience.CircuitBreaker.OPEN
+
+
+def test_cancelled_half_open_trial_is_released():
+    # 반열림 상태의 시험 호출이 취소돼도 다음 호출이 다시 시험할 수 있어야 함
+    dep = guarded()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await dep.acall(fail)
+        time.sleep(0.06)
+        trial = asyncio.ensure_future(dep.acall(hang))
+        await asyncio.sleep(0.01)
+        assert dep.breaker.state == resilience.CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await dep.acall(ok)
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert dep.breaker.state == resilience.CircuitBreaker.CLOSED
+
+
+def test_cancelled_sync_trial_is_released():
+    dep = guarded()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(ConnectionError):
+        dep.call(lambda: (_ for _ in ()).throw(ConnectionError("down")))
+    time.sleep(0.06)
+    with pytest.raises(KeyboardInterrupt):
+        dep.call(interrupted)
+    assert dep.call(lambda: 'ok') == 'ok'
+
+
+def test_non_retryable_error_leaves_breaker_unchanged():
+    dep = resilience.Dependency('unit', max_attempts=1)
+    dep.breaker = resilience.CircuitBreaker('unit', failure_threshold=2, reset_timeout=0.05)
+
+    def rejected():
+        raise ValueError("bad request")
+
+    def down():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        dep.call(down)
+    # 잘못된 요청은 성공으로도 실패로도 세지 않음 (연속 실패 수 유지)
+    with pytest.raises(ValueError):
+        dep.call(rejected)
+    assert dep.breaker.snapshot() == {"state": resilience.CircuitBreaker.CLOSED, "consecutive_failures": 1}
+
+    with pytest.raises(ConnectionError):
+        dep.call(down)
+    time.sleep(0.06)
+    # 반열림 시험 호출이 거절로 끝나면 회로는 닫히지 않고 다음 호출이 다시 시험
+    with pytest.raises(ValueError):
+        dep.call(rejected)
+    assert dep.breaker.state == resilience.CircuitBreaker.HALF_OPEN
+    assert dep.call(lambda: 'ok') == 'ok'
+    assert dep.breaker.state == resilience.CircuitBreaker.CLOSED
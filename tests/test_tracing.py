@@ -0,0 +1,69 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import job_queue
+import prediction_manager
+import tracing
+import worker
+
+
+@pytest.fixture
+def spans():
+    tracing.setup()
+    assert tracing.memory_exporter is not None, "tests run with TRACING_EXPORTER=memory"
+    tracing.memory_exporter.clear()
+    return tracing.memory_exporter
+
+
+def test_job_trace_continues_from_request_through_panels_and_predictions(fake_replicate_url, spans, tmp_path, monkeypatch):
+    manager = prediction_manager.PredictionManager(base_url=fake_replicate_url, api_token='test', first_interval=0.05, webhook_url=None)
+    manager.start()
+
+    def render(memberId: str, job_id: str = None, **_):
+        # 패널 스레드로 컨텍스트를 복사해서 넘기는 pipeline.render_webtoon과 같은 방식
+        def panel(i):
+            with tracing.span('panel', **{"panel.index": i}):
+                return manager.run_sync('test-version', {"seed": i}, timeout=10)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, panel, i) for i in range(2)]
+            for future in futures:
+                future.result()
+
+    monkeypatch.setitem(worker.HANDLERS, 'webtoon', render)
+    queue = job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'))
+    try:
+        # API 요청 스팬 안에서 잡을 등록하고, 워커는 페이로드의 트레이스 컨텍스트를 이어받음
+        with tracing.span('POST /webtoon') as request_span:
+            job_id = queue.enqueue('webtoon', {"memberId": "m1", tracing.PAYLOAD_KEY: tracing.inject()})
+        worker.Worker(queue, concurrency=1).process(queue.dequeue(60))
+    finally:
+        manager.stop()
+
+    # 같은 프로세스에서 도는 가짜 Replicate 서버의 요청 스팬은 별도 트레이스이므로 제외
+    trace_id = request_span.get_span_context().trace_id
+    by_name = {}
+    for span in spans.get_finished_spans():
+        if span.context.trace_id == trace_id:
+            by_name.setdefault(span.name, []).append(span)
+
+    job_span = by_name['job webtoon'][0]
+    assert job_span.parent.span_id == request_span.get_span_context().span_id
+    assert job_span.attributes["job.id"] == job_id
+
+    panels = by_name['panel']
+    assert sorted(span.attributes["panel.index"] for span in panels) == [0, 1]
+    assert all(span.parent.span_id == job_span.context.span_id for span in panels)
+
+    panel_ids = {span.context.span_id for span in panels}
+    predictions = by_name['replicate.prediction']
+    assert len(predictions) == 2
+    assert all(span.parent.span_id in panel_ids for span in predictions)
+    assert all(span.attributes["prediction.status"] == "succeeded" for span in predictions)
+
+    # Replicate가 준 시각으로 기록한 실행 구간은 예측 스팬의 자식
+    prediction_ids = {span.context.span_id for span in predictions}
+    assert len(by_name['replicate.run']) == 2
+    assert all(span.parent.span_id in prediction_ids for span in by_name['replicate.run'])
@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+import upload_intake
+from benchmarks import fake_replicate
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def upload(data: bytes, filename: str = 'photo.jpg') -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+@pytest.mark.parametrize('head, expected', [
+    (b'\xff\xd8\xff\xe0' + b'\x00' * 12, ('image/jpeg', '.jpg')),
+    (PNG_BYTES[:16], ('image/png', '.png')),
+    (b'GIF89a' + b'\x00' * 10, ('image/gif', '.gif')),
+    (fake_replicate.WEBP_BYTES[:16], ('image/webp', '.webp')),
+    (b'\x00\x00\x00\x18ftypheic\x00\x00\x00\x00', None),  # Pillow가 디코딩하지 못하는 HEIC는 받지 않음
+    (b'\x00\x00\x00\x18ftypmif1\x00\x00\x00\x00', None),
+    (b'XXXXXXXXWEBP' + b'\x00' * 4, None),
+    (b'%PDF-1.7' + b'\x00' * 8, None),
+])
+def test_sniff_image_type(head, expected):
+    assert upload_intake.sniff_image_type(head) == expected
+
+
+def test_save_upload_streams_to_unique_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_intake, 'UPLOAD_CHUNK_SIZE', 16)
+    data = PNG_BYTES * 4
+
+    # 확장자는 파일 이름이 아니라 내용으로 정함
+    first = asyncio.run(upload_intake.save_upload(upload(data, 'photo.jpg'), str(tmp_path)))
+    second = asyncio.run(upload_intake.save_upload(upload(data, 'photo.jpg'), str(tmp_path)))
+
+    assert first.path != second.path
+    assert first.path.endswith('.png') and first.mime_type == 'image/png'
+    assert first.size == len(data)
+    assert first.sha256 == second.sha256 == hashlib.sha256(data).hexdigest()
+    with open(first.path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_save_upload_rejects_unsupported_format(tmp_path):
+    heic = b'\x00\x00\x00\x18ftypheic' + b'\x00' * 64
+
+    with pytest.raises(upload_intake.UnsupportedImageError):
+        asyncio.run(upload_intake.save_upload(upload(heic, 'photo.heic'), str(tmp_path)))
+    assert not tmp_path.exists() or os.listdir(tmp_path) == []
+
+
+def test_save_upload_over_limit_leaves_no_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_intake, 'UPLOAD_CHUNK_SIZE', 16)
+
+    with pytest.raises(upload_intake.UploadTooLargeError):
+        asyncio.run(upload_intake.save_upload(upload(PNG_BYTES * 4), str(tmp_path), max_bytes=100))
+    assert os.listdir(tmp_path) == []
+
+
+def test_size_limit_middleware_rejects_large_body_before_form_parsing():
+    from fastapi import FastAPI, File
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.add_middleware(upload_intake.UploadSizeLimitMiddleware, paths=('/upload',), max_bytes=1024)
+
+    @app.post('/upload')
+    async def receive(image: UploadFile = File(...)):
+        return {"size": len(await image.read())}
+
+    client = TestClient(app)
+    assert client.post('/upload', files={"image": ('a.png', PNG_BYTES)}).json() == {"size": len(PNG_BYTES)}
+    assert client.post('/upload', files={"image": ('a.png', PNG_BYTES * 64)}).status_code == 413
@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+
+import job_registry
+import pipeline
+import webhook_outbox
+
+
+class Crash(BaseException):
+    pass
+
+
+def outbox_rows(job_id):
+    return webhook_outbox.outbox._connect().execute(
+        "SELECT url, event_key, payload FROM webhook_outbox WHERE job_id=? ORDER BY id", (job_id,)).fetchall()
+
+
+def test_callback_survives_crash_before_result_is_saved(monkeypatch):
+    job_id = uuid.uuid4().hex
+    result = {"memberId": "member_1", "date": "2024-01-01", "webtoonImages": []}
+    monkeypatch.setattr(pipeline, 'render_webtoon', lambda *args, **kwargs: result)
+
+    def crash(job_id, result):
+        raise Crash()
+
+    # 결과를 저장하기 직전에 프로세스가 죽어도 콜백은 이미 아웃박스에 있음
+    monkeypatch.setattr(pipeline, 'report_success', crash)
+    with pytest.raises(Crash):
+        pipeline.process_webtoon_background('member_1', '2024-01-01', 'diary', 'info', 1, 'style', 'example.com', job_id,
+                                            progressiveCallbacks=False)
+    assert [row[0] for row in outbox_rows(job_id)] == ["http://example.com/api/v1/webhook/ai/webtoon"]
+
+    # 재실행된 잡은 결과를 저장하고, 콜백은 다시 기록하지 않음
+    saved = []
+    monkeypatch.setattr(pipeline, 'report_success', lambda job_id, result: saved.append(job_id))
+    pipeline.process_webtoon_background('member_1', '2024-01-01', 'diary', 'info', 1, 'style', 'example.com', job_id,
+                                        progressiveCallbacks=False)
+    assert saved == [job_id]
+    assert len(outbox_rows(job_id)) == 1
+
+
+def test_sequence_keeps_increasing_after_prune(tmp_path):
+    store = webhook_outbox.OutboxStore(str(tmp_path / 'outbox.db'))
+    url = "http://example.com/api/v1/webhook/ai/webtoon/panel"
+    assert store.add(url, {"event": "panel"}, 'job1', event_key='panel-1-1', sequenced=True)
+    assert store.add(url, {"event": "panel"}, 'job1', event_key='panel-2-1', sequenced=True)
+    # 이미 기록한 이벤트는 번호를 쓰지 않음
+    assert not store.add(url, {"event": "panel"}, 'job1', event_key='panel-2-1', sequenced=True)
+    store.delivered([row[0] for row in store._connect().execute("SELECT id FROM webhook_outbox")])
+    # 전송을 끝낸 패널 이벤트만 보관 기간이 지나 정리된 상태
+    store._connect().execute("UPDATE webhook_outbox SET updated_at=updated_at-7200")
+    store.prune(max_age=3600)
+    assert store._connect().execute("SELECT COUNT(*) FROM webhook_outbox").fetchone()[0] == 0
+
+    store.add(url, {"event": "completed"}, 'job1', event_key='summary-b', sequenced=True)
+
+    payload = store.claim()[0][0]["payload"]
+    assert payload["sequence"] == 3
+
+
+def test_retried_run_sends_its_own_summary(monkeypatch):
+    job_id = uuid.uuid4().hex
+    url = "http://example.com/api/v1/webhook/ai/webtoon/panel"
+    pipeline.PanelEvents('example.com', 'member_1', '2024-01-01', job_id).finish('failed', error='boom')
+    pipeline.PanelEvents('example.com', 'member_1', '2024-01-01', job_id).finish('completed', panels=4)
+
+    summaries = [row for row in outbox_rows(job_id) if row[0] == url]
+    assert len(summaries) == 2
+    assert '"completed"' in summaries[-1][2] and '"sequence": 2' in summaries[-1][2]
+
+
+def test_delivery_before_result_does_not_change_job_status():
+    # 결과 저장 전에 콜백 전송이 끝나도 잡은 running으로 남고, 이후 결과 저장으로 succeeded가 됨
+    job_id = uuid.uuid4().hex
+    job_registry.registry.create(job_id, 'webtoon', 'member_1')
+    job_registry.registry.emit(job_id, 'started')
+    item = {"jobId": job_id, "eventKey": ''}
+
+    webhook_outbox.OutboxDispatcher._record([item], 'webhook_delivered')
+    job = job_registry.registry.get(job_id)
+    assert (job["status"], job["stage"], job["result"]) == (job_registry.RUNNING, 'started', None)
+
+    job_registry.registry.complete(job_id, {"ok": True})
+    webhook_outbox.OutboxDispatcher._record([item], 'webhook_failed', error='Webhook returned 500', attempts=12)
+    job = job_registry.registry.get(job_id)
+    assert (job["status"], job["stage"], job["result"]) == (job_registry.SUCCEEDED, 'completed', {"ok": True})
+    events = job_registry.registry.events(job_id)
+    assert [(event["stage"], event["status"]) for event in events[-3:]] == [
+        ('webhook_delivered', job_registry.RUNNING), ('completed', job_registry.SUCCEEDED),
+        ('webhook_failed', job_registry.SUCCEEDED)]
@@ -0,0 +1,110 @@
+import json
+import types
+import uuid
+
+import pytest
+
+import idempotency
+import job_queue
+import job_registry
+import model_registry
+import pipeline
+
+
+def item(member_id: str = 'm1', date: str = '2024-01-01', **overrides) -> dict:
+    return {"memberId": member_id, "date": date, "content": f"diary {date}", "characterInfo": "info", "seedNum": 1,
+            "characterStyle": "romance", "apiDomainUrl": "example.com", **overrides}
+
+
+def ndjson(*items) -> bytes:
+    return b''.join(line if isinstance(line, bytes) else json.dumps(line).encode() + b'\n' for line in items)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(job_queue, 'queue', queue)
+    monkeypatch.setattr(idempotency, 'store', idempotency.SQLiteIdempotencyStore(str(tmp_path / 'idempotency.db')))
+    return queue
+
+
+def queued_jobs(queue) -> list:
+    jobs = []
+    while (job := queue.dequeue(60)) is not None:
+        jobs.append(job)
+    return jobs
+
+
+def test_batch_groups_items_per_member_and_character(api, queue):
+    response = api.post('/webtoon/batch', content=ndjson(
+        item('m1', '2024-01-01'), item('m2', '2024-01-01'), item('m1', '2024-01-02'), item('m1', '2024-01-03', characterInfo='other'),
+    ))
+
+    body = response.json()
+    assert (body["accepted"], body["duplicate"], body["rejected"]) == (4, 0, 0)
+    assert [outcome["line"] for outcome in body["items"]] == [1, 2, 3, 4]
+    jobs = queued_jobs(queue)
+    assert sorted((job.member_id, len(job.payload["items"])) for job in jobs) == [('m1', 1), ('m1', 2), ('m2', 1)]
+    assert {job.kind for job in jobs} == {'webtoon_batch'}
+    assert {job.priority_class for job in jobs} == {'backfill'}
+    # 일기별 잡도 레지스트리에 등록돼 상태를 조회할 수 있음
+    for outcome in body["items"]:
+        assert job_registry.registry.get(outcome["jobId"])["status"] == job_registry.QUEUED
+
+
+def test_batch_rejects_bad_lines_and_skips_duplicates(api, queue):
+    first = api.post('/webtoon/batch', content=ndjson(item('m1', '2024-01-01'))).json()
+
+    body = api.post('/webtoon/batch', content=ndjson(
+        item('m1', '2024-01-01'), b'not json\n', {"memberId": "m1"}, item('m1', '2024-01-02', characterStyle='noir'),
+        item('m1', '2024-01-03', seedNum='x'), b'\n', item('m1', '2024-01-04'),
+    )).json()
+
+    statuses = {outcome["line"]: outcome["status"] for outcome in body["items"]}
+    assert statuses == {1: 200, 2: 400, 3: 400, 4: 400, 5: 400, 7: 202}
+    assert body["items"][0]["jobId"] == first["items"][0]["jobId"]
+    assert (body["accepted"], body["duplicate"], body["rejected"]) == (1, 1, 4)
+
+
+def test_batch_splits_groups_at_group_size(api, queue, monkeypatch):
+    import main
+    monkeypatch.setattr(main, 'WEBTOON_BATCH_GROUP_SIZE', 2)
+
+    body = api.post('/webtoon/batch', content=ndjson(*(item('m1', f'2024-01-0{day}') for day in range(1, 6)))).json()
+
+    assert body["accepted"] == 5
+    assert sorted(len(job.payload["items"]) for job in queued_jobs(queue)) == [1, 2, 2]
+
+
+def test_batch_unknown_priority(api, queue):
+    assert api.post('/webtoon/batch?priority=urgent', content=ndjson(item())).status_code == 400
+
+
+def test_batch_job_sends_one_callback_with_per_item_results(monkeypatch):
+    monkeypatch.setattr(model_registry.registry, 'version', lambda style: types.SimpleNamespace(id='test-version'))
+
+    def render(item, characterInfo, characterStyle):
+        if item["date"] == 'bad':
+            raise RuntimeError("render failed")
+        return {"memberId": item["memberId"], "date": item["date"], "images": [f"{item['date']}.webp"]}
+
+    callbacks = []
+    monkeypatch.setattr(pipeline, 'render_batch_item', render)
+    monkeypatch.setattr(pipeline, 'post_webhook', lambda url, data, job_id=None, **kwargs: callbacks.append((url, data, job_id)))
+    batch_job = uuid.uuid4().hex
+    items = []
+    for date in ('2024-01-01', 'bad', '2024-01-02'):
+        items.append({"jobId": uuid.uuid4().hex, "memberId": "m1", "date": date, "content": "diary", "seedNum": 1})
+        job_registry.registry.create(items[-1]["jobId"], 'webtoon', 'm1')
+    job_registry.registry.create(batch_job, 'webtoon_batch', 'm1')
+
+    pipeline.process_webtoon_batch('batch-1', items, 'romance', 'info', 'example.com', 'm1', job_id=batch_job)
+
+    [(url, data, job_id)] = callbacks
+    assert url == 'http://example.com/api/v1/webhook/ai/webtoon/batch'
+    assert job_id == batch_job
+    assert [webtoon["date"] for webtoon in data["webtoons"]] == ['2024-01-01', '2024-01-02']
+    assert [failure["jobId"] for failure in data["failed"]] == [items[1]["jobId"]]
+    assert [job_registry.registry.get(entry["jobId"])["status"] for entry in items] == [
+        job_registry.SUCCEEDED, job_registry.FAILED, job_registry.SUCCEEDED]
+    assert job_registry.registry.get(batch_job)["result"]["failed"] == [items[1]["jobId"]]
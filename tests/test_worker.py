@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+import job_queue
+import job_registry
+import pipeline
+import worker
+
+RESULT = {"memberId": "member_1", "date": "2024-01-01", "webtoonImages": []}
+PAYLOAD = {"memberId": "member_1", "date": "2024-01-01", "content": "diary", "characterInfo": "info", "seedNum": 1,
+           "characterStyle": "romance", "apiDomainUrl": "example.com", "progressiveCallbacks": False}
+
+
+@pytest.fixture
+def run_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, 'JOB_RETRY_DELAY', 0)
+    queue = job_queue.SQLiteJobQueue(str(tmp_path / 'jobs.db'), max_attempts=2)
+
+    def run(render):
+        monkeypatch.setattr(pipeline, 'render_webtoon', render)
+        job_id = queue.enqueue('webtoon', dict(PAYLOAD), job_id=uuid.uuid4().hex)
+        job_registry.registry.create(job_id, 'webtoon', 'member_1')
+        # 재시도로 다시 큐에 들어오면 이어서 처리
+        while (job := queue.dequeue(60)) is not None:
+            worker.Worker(queue, concurrency=1).process(job)
+        return job_id
+
+    return run
+
+
+def stages(job_id):
+    return [event["stage"] for event in job_registry.registry.events(job_id)]
+
+
+def test_transient_failure_is_retried_by_worker(run_job):
+    calls = []
+
+    def render(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        return RESULT
+
+    job_id = run_job(render)
+
+    assert len(calls) == 2
+    assert 'retry_scheduled' in stages(job_id)
+    job = job_registry.registry.get(job_id)
+    assert job["status"] == job_registry.SUCCEEDED
+    assert job["result"] == RESULT
+
+
+def test_permanent_failure_is_not_retried(run_job):
+    calls = []
+
+    def render(*args, **kwargs):
+        calls.append(1)
+        raise ValueError("bad scenario")
+
+    job_id = run_job(render)
+
+    assert len(calls) == 1
+    assert job_registry.registry.get(job_id)["status"] == job_registry.FAILED
+
+
+def test_transient_failure_on_last_attempt_fails_job(run_job):
+    calls = []
+
+    def render(*args, **kwargs):
+        calls.append(1)
+        raise ConnectionError("connection reset")
+
+    job_id = run_job(render)
+
+    assert len(calls) == 2
+    job = job_registry.registry.get(job_id)
+    assert job["status"] == job_registry.FAILED
+    assert job["error"] == "ConnectionError: connection reset"
@@ -0,0 +1,33 @@
+import os
+import time
+
+import workspace
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_sweep_removes_only_old_directories(tmp_path):
+    manager = workspace.WorkspaceManager(str(tmp_path), quota=1024, instance_id='self')
+    # 같은 루트를 쓰는 다른 프로세스(다른 컨테이너라 PID가 같을 수 있음)의 디렉터리
+    recent = tmp_path / 'other-job1'
+    stale = tmp_path / 'other-job2'
+    recent.mkdir()
+    stale.mkdir()
+    age(stale, 7200)
+
+    manager.sweep(max_age=3600)
+
+    assert sorted(os.listdir(tmp_path)) == ['other-job1']
+
+
+def test_sweep_keeps_directories_this_process_is_using(tmp_path):
+    manager = workspace.WorkspaceManager(str(tmp_path), quota=1024, instance_id='self')
+    with manager.open('job1') as job_workspace:
+        assert os.path.basename(job_workspace.path) == 'self-job1'
+        age(job_workspace.path, 7200)
+        manager.sweep(max_age=3600)
+        assert os.path.isdir(job_workspace.path)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,131 @@
+import importlib.util
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+try:
+    from opentelemetry import trace, propagate  # 선택 의존성: 없으면 스팬을 만들지 않음
+except ImportError:
+    trace = propagate = None
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 트레이싱 설정
+# TRACING_EXPORTER: none | otlp (OTEL_EXPORTER_OTLP_ENDPOINT 사용) | console | memory (테스트용)
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none').lower()
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'webtoon-ai')
+
+# 최신 FastAPI는 요청 스팬을 직접 만든다. 이 경우 앱에서 따로 서버 스팬을 만들지 않음
+FRAMEWORK_SERVER_SPANS = importlib.util.find_spec('fastapi.telemetry') is not None
+
+# 잡 페이로드에 트레이스 컨텍스트를 담는 키 (워커가 꺼내서 부모 스팬으로 사용)
+PAYLOAD_KEY = 'traceContext'
+
+# TRACING_EXPORTER=memory 일 때 끝난 스팬이 쌓이는 곳
+memory_exporter = None
+
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def setup():
+    # 프로세스 시작 시 한 번 호출. 익스포터를 설정하지 않으면 OpenTelemetry 기본(no-op) 트레이서를 사용
+    global _configured, memory_exporter
+    with _setup_lock:
+        if _configured or trace is None or TRACING_EXPORTER == 'none':
+            return
+        try:
+            from opentelemetry.sdk.resources import Resource  # 선택 의존성: opentelemetry-sdk
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, ConsoleSpanExporter
+        except ImportError:
+            logging.error("TRACING_EXPORTER is set but opentelemetry-sdk is not installed. Tracing disabled.")
+            return
+
+        provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+        if TRACING_EXPORTER == 'memory':
+            from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+            memory_exporter = InMemorySpanExporter()
+            provider.add_span_processor(SimpleSpanProcessor(memory_exporter))
+        elif TRACING_EXPORTER == 'console':
+            provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+        elif TRACING_EXPORTER == 'otlp':
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter  # 선택 의존성
+            except ImportError:
+                logging.error("TRACING_EXPORTER=otlp but opentelemetry-exporter-otlp-proto-http is not installed. Tracing disabled.")
+                return
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        else:
+            logging.error(f"Unknown TRACING_EXPORTER: {TRACING_EXPORTER}. Tracing disabled.")
+            return
+        trace.set_tracer_provider(provider)
+        _configured = True
+        logging.info(f"Tracing enabled (exporter: {TRACING_EXPORTER}, service: {TRACING_SERVICE_NAME})")
+
+
+def shutdown():
+    # 배치 익스포터에 남은 스팬을 내보냄
+    if _configured:
+        trace.get_tracer_provider().shutdown()
+
+
+def _tracer():
+    return trace.get_tracer(TRACING_SERVICE_NAME)
+
+
+@contextmanager
+def span(name: str, context=None, start_time: Optional[int] = None, **attributes):
+    # 현재 컨텍스트(또는 넘겨받은 context)의 자식 스팬. 예외는 스팬에 기록하고 다시 던짐
+    if trace is None:
+        yield None
+        return
+    with _tracer().start_as_current_span(name, context=context, start_time=start_time,
+                                         attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def record_span(name: str, start_time: float, end_time: float, **attributes):
+    # 이미 끝난 구간을 현재 스팬의 자식으로 기록 (시각은 epoch 초)
+    if trace is None:
+        return
+    child = _tracer().start_span(name, start_time=int(start_time * 1e9), attributes=_attributes(attributes))
+    child.end(end_time=int(end_time * 1e9))
+
+
+def set_attributes(**attributes):
+    if trace is None:
+        return
+    trace.get_current_span().set_attributes(_attributes(attributes))
+
+
+def _attributes(attributes: dict) -> dict:
+    # OpenTelemetry 속성은 None을 허용하지 않음
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def inject(carrier: Optional[dict] = None) -> dict:
+    # 현재 트레이스 컨텍스트를 헤더/페이로드용 dict에 기록 (W3C traceparent)
+    carrier = {} if carrier is None else carrier
+    if propagate is not None:
+        propagate.inject(carrier)
+    return carrier
+
+
+def extract(carrier: Optional[dict]):
+    if propagate is None or not carrier:
+        return None
+    return propagate.extract(carrier)
+
+
+def finished_spans() -> list:
+    # 테스트용: TRACING_EXPORTER=memory 일 때 끝난 스팬 목록
+    return list(memory_exporter.get_finished_spans()) if memory_exporter else []
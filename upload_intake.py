@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import UploadFile
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 업로드 이미지 설정
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+# multipart 경계와 폼 필드를 위한 여유분 (요청 본문 전체 크기 제한 = UPLOAD_MAX_BYTES + 여유분)
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# 허용하는 이미지 형식의 매직 바이트 (파일 이름/Content-Type은 클라이언트가 바꿀 수 있어서 내용으로 판별)
+# HEIC/HEIF는 Pillow가 디코딩하지 못해 전처리에서 변환할 수 없으므로 받지 않음
+IMAGE_SIGNATURES = (
+    ('image/jpeg', '.jpg', 0, b'\xff\xd8\xff'),
+    ('image/png', '.png', 0, b'\x89PNG\r\n\x1a\n'),
+    ('image/gif', '.gif', 0, b'GIF87a'),
+    ('image/gif', '.gif', 0, b'GIF89a'),
+    ('image/webp', '.webp', 8, b'WEBP'),  # RIFF....WEBP
+)
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UnsupportedImageError(ValueError):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str  # 원본 바이트의 해시 (멱등 키, 캐시 키에 사용)
+    mime_type: str
+
+
+def sniff_image_type(head: bytes) -> Optional[tuple]:
+    # (MIME 타입, 확장자). 허용하지 않는 형식이면 None
+    for mime_type, extension, offset, signature in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if mime_type == 'image/webp' and not head.startswith(b'RIFF'):
+                continue
+            return mime_type, extension
+    return None
+
+
+async def save_upload(upload: UploadFile, folder: str, max_bytes: int = UPLOAD_MAX_BYTES) -> StoredUpload:
+    # 업로드를 청크 단위로 읽으면서 형식 확인, 크기 제한, 해시 계산을 하고 고유한 이름으로 저장
+    # 파일 쓰기는 이벤트 루프를 막지 않도록 스레드에서 실행
+    first = await upload.read(UPLOAD_CHUNK_SIZE)
+    detected = sniff_image_type(first[:16])
+    if detected is None:
+        raise UnsupportedImageError("Unsupported image format (expected JPEG, PNG, GIF or WebP)")
+    mime_type, extension = detected
+
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}{extension}")
+    digest = hashlib.sha256()
+    size = 0
+    output = await asyncio.to_thread(open, path, 'wb')
+    try:
+        chunk = first
+        while chunk:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+            digest.update(chunk)
+            await asyncio.to_thread(output.write, chunk)
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        await asyncio.to_thread(output.close)
+        await asyncio.to_thread(discard, path)
+        raise
+    await asyncio.to_thread(output.close)
+    logging.info(f"Upload saved to {path} ({size} bytes, {mime_type})")
+    return StoredUpload(path, size, digest.hexdigest(), mime_type)
+
+
+def discard(path: Optional[str]):
+    # 잡으로 넘기지 않은 업로드 파일 삭제
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.error(f"Error removing upload {path}: {e}")
+
+
+class UploadSizeLimitMiddleware:
+    # 지정한 경로의 요청 본문이 max_bytes를 넘으면 폼 파싱(임시 파일 저장)이 끝나기 전에 413으로 끊는다.
+    # Content-Length가 있으면 바로 확인하고, 없으면(chunked) 받은 바이트를 세면서 확인한다.
+
+    def __init__(self, app, paths: tuple, max_bytes: int = UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b'content-length', b'0'))
+        except ValueError:
+            declared = 0
+        if declared > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        too_large = False
+        rejected = False
+
+        async def limited_receive():
+            # 한도를 넘으면 더 읽지 않고 연결이 끊긴 것처럼 알림 (앱은 본문 파싱 오류로 응답하게 됨)
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b''))
+                if received > self.max_bytes:
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def replacing_send(message):
+            # 한도를 넘은 요청은 앱이 만든 응답 대신 413을 보냄
+            nonlocal rejected
+            if not too_large:
+                await send(message)
+            elif not rejected:
+                rejected = True
+                await self._reject(send)
+
+        try:
+            await self.app(scope, limited_receive, replacing_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large:
+            logging.error(f"Rejected {scope['path']} request body over {self.max_bytes} bytes")
+            if not rejected:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"message": f"Upload exceeds {UPLOAD_MAX_BYTES} bytes"}).encode('utf-8')
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
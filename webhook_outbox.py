@@ -0,0 +1,416 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+import http_client
+import job_queue
+import job_registry
+import metrics
+import resilience
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 웹훅 아웃박스 설정 (기본값은 잡 큐와 같은 DB 파일)
+WEBHOOK_OUTBOX_PATH = os.getenv('WEBHOOK_OUTBOX_PATH', job_queue.JOB_QUEUE_PATH)
+WEBHOOK_OUTBOX_POLL_INTERVAL = float(os.getenv('WEBHOOK_OUTBOX_POLL_INTERVAL', 1))  # 새 콜백은 바로 깨우고, 재시도 시각은 이 주기로 확인
+WEBHOOK_OUTBOX_RETENTION = float(os.getenv('WEBHOOK_OUTBOX_RETENTION', 7 * 24 * 3600))  # 전송을 끝낸 콜백을 남겨 두는 시간
+WEBHOOK_DELIVERY_LEASE = float(os.getenv('WEBHOOK_DELIVERY_LEASE', 120))  # 전송 중 표시 시간 (프로세스가 죽으면 지난 뒤 다시 전송)
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 12))
+WEBHOOK_RETRY_BASE_DELAY = float(os.getenv('WEBHOOK_RETRY_BASE_DELAY', 2))
+WEBHOOK_RETRY_MAX_DELAY = float(os.getenv('WEBHOOK_RETRY_MAX_DELAY', 600))
+WEBHOOK_DESTINATION_CONCURRENCY = max(1, int(os.getenv('WEBHOOK_DESTINATION_CONCURRENCY', 4)))  # 수신 서버별 동시 전송 수
+
+# 묶음 전송: batch_url이 있는 콜백(웹툰)은 같은 수신 주소끼리 최대 WEBHOOK_BATCH_MAX개를 한 번에 보냄 (1이면 묶지 않음)
+# 가장 오래된 콜백이 WEBHOOK_BATCH_LINGER초 기다렸거나 WEBHOOK_BATCH_MAX개가 모이면 전송
+WEBHOOK_BATCH_MAX = max(1, int(os.getenv('WEBHOOK_BATCH_MAX', 1)))
+WEBHOOK_BATCH_LINGER = float(os.getenv('WEBHOOK_BATCH_LINGER', 0.5))
+
+# 콜백 상태 값
+PENDING = 'pending'
+DELIVERED = 'delivered'
+DEAD = 'dead'  # 재시도를 모두 실패했거나 수신 측이 거절(4xx)
+
+
+class OutboxStore:
+    # 보낼 콜백을 먼저 디스크에 기록하는 SQLite 아웃박스
+    # 같은 잡의 같은 주소 콜백은 한 번만 기록되므로, 잡이 재실행돼도 중복 전송하지 않는다.
+
+    def __init__(self, path: str = WEBHOOK_OUTBOX_PATH):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT,"
+            " url TEXT NOT NULL,"
+            " batch_url TEXT,"
+            " payload TEXT NOT NULL,"
+            " headers TEXT,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " lease_until REAL NOT NULL DEFAULT 0,"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        # 같은 잡이 같은 주소로 여러 이벤트를 보내는 경우(패널별 콜백)를 구분하는 키 (이전 버전 DB에는 없으므로 추가)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(webhook_outbox)")}
+        if 'event_key' not in columns:
+            conn.execute("ALTER TABLE webhook_outbox ADD COLUMN event_key TEXT NOT NULL DEFAULT ''")
+        conn.execute("DROP INDEX IF EXISTS webhook_outbox_job")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS webhook_outbox_event ON webhook_outbox (job_id, url, event_key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS webhook_outbox_due ON webhook_outbox (status, next_attempt_at)")
+        # sequenced 콜백의 잡/주소별 마지막 번호 (전송을 끝낸 콜백을 prune해도 번호가 되돌아가지 않도록 따로 보관)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_sequences ("
+            " job_id TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " last_sequence INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, url))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def add(self, url: str, payload: dict, job_id: Optional[str] = None, batch_url: Optional[str] = None,
+            headers: Optional[dict] = None, event_key: str = '', sequenced: bool = False) -> bool:
+        # 새로 기록했으면 True (같은 잡의 같은 주소, 같은 event_key 콜백이 이미 있으면 False)
+        # sequenced면 같은 잡의 같은 주소로 기록한 순서대로 payload["sequence"]에 1부터 번호를 붙임 (잡이 재실행되거나 prune 뒤에도 이어서 증가)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if sequenced:
+                # 번호 테이블이 생기기 전에 기록한 잡은 남아 있는 콜백 수에서 이어감
+                row = conn.execute("SELECT last_sequence FROM webhook_sequences WHERE job_id=? AND url=?", (job_id, url)).fetchone()
+                last = row[0] if row else conn.execute(
+                    "SELECT COUNT(*) FROM webhook_outbox WHERE job_id=? AND url=?", (job_id, url)).fetchone()[0]
+                payload = dict(payload, sequence=last + 1)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO webhook_outbox (job_id, url, event_key, batch_url, payload, headers, status, next_attempt_at,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, url, event_key, batch_url, json.dumps(payload, ensure_ascii=False), json.dumps(headers or {}), PENDING,
+                 now, now, now),
+            )
+            if sequenced and cursor.rowcount > 0:
+                conn.execute(
+                    "INSERT INTO webhook_sequences (job_id, url, last_sequence, updated_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (job_id, url) DO UPDATE SET last_sequence=excluded.last_sequence, updated_at=excluded.updated_at",
+                    (job_id, url, payload["sequence"], now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    def claim(self, limit: int = 100, lease: float = WEBHOOK_DELIVERY_LEASE, batch_max: int = WEBHOOK_BATCH_MAX,
+              linger: float = WEBHOOK_BATCH_LINGER) -> list:
+        # 보낼 차례인 콜백을 전송 단위(묶음)로 나눠 리스를 걸고 반환: [[row, ...], ...]
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, job_id, url, batch_url, payload, headers, attempts, created_at, event_key FROM webhook_outbox"
+                " WHERE status=? AND next_attempt_at<=? AND lease_until<=? ORDER BY id LIMIT ?",
+                (PENDING, now, now, limit),
+            ).fetchall()
+            deliveries = []
+            batches = {}
+            for row in rows:
+                item = {"id": row[0], "jobId": row[1], "url": row[2], "batchUrl": row[3], "payload": json.loads(row[4]),
+                        "headers": json.loads(row[5] or '{}'), "attempts": row[6], "createdAt": row[7], "eventKey": row[8]}
+                if batch_max > 1 and item["batchUrl"]:
+                    batches.setdefault(item["batchUrl"], []).append(item)
+                else:
+                    deliveries.append([item])
+            for items in batches.values():
+                # 충분히 모였거나 오래 기다린 것만 보내고, 나머지는 다음 확인 때까지 더 모음
+                if len(items) < batch_max and now - items[0]["createdAt"] < linger:
+                    continue
+                deliveries.extend(items[i:i + batch_max] for i in range(0, len(items), batch_max))
+            ids = [item["id"] for items in deliveries for item in items]
+            if ids:
+                conn.execute(
+                    f"UPDATE webhook_outbox SET lease_until=?, updated_at=? WHERE id IN ({','.join('?' * len(ids))})",
+                    [now + lease, now, *ids],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deliveries
+
+    def delivered(self, ids: list):
+        now = time.time()
+        self._connect().execute(
+            f"UPDATE webhook_outbox SET status=?, attempts=attempts+1, lease_until=0, last_error=NULL, updated_at=?"
+            f" WHERE id IN ({','.join('?' * len(ids))})",
+            [DELIVERED, now, *ids],
+        )
+
+    def failed(self, ids: list, error: str, delay: Optional[float]) -> bool:
+        # delay 후 재시도하도록 되돌림. delay가 None이거나 재시도 횟수를 넘기면 dead로 두고 True
+        now = time.time()
+        conn = self._connect()
+        placeholders = ','.join('?' * len(ids))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            attempts = max(row[0] for row in conn.execute(
+                f"SELECT attempts FROM webhook_outbox WHERE id IN ({placeholders})", ids).fetchall()) + 1
+            dead = delay is None or attempts >= WEBHOOK_MAX_ATTEMPTS
+            conn.execute(
+                f"UPDATE webhook_outbox SET status=?, attempts=attempts+1, next_attempt_at=?, lease_until=0, last_error=?,"
+                f" updated_at=? WHERE id IN ({placeholders})",
+                [DEAD if dead else PENDING, now + (delay or 0), error, now, *ids],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dead
+
+    def defer(self, ids: list, delay: float):
+        # 시도하지 않고 리스만 풀어서 delay 뒤에 다시 전송
+        now = time.time()
+        self._connect().execute(
+            f"UPDATE webhook_outbox SET next_attempt_at=?, lease_until=0, updated_at=? WHERE id IN ({','.join('?' * len(ids))})",
+            [now + delay, now, *ids],
+        )
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM webhook_outbox WHERE status=?", (PENDING,)).fetchone()[0]
+        return {
+            "pending": counts.get(PENDING, 0),
+            "delivered": counts.get(DELIVERED, 0),
+            "dead": counts.get(DEAD, 0),
+            "oldestPendingSeconds": time.time() - oldest if oldest else None,
+        }
+
+    def prune(self, max_age: float = WEBHOOK_OUTBOX_RETENTION):
+        # 번호는 그 잡/주소의 콜백이 하나도 남지 않았을 때만 지움 (그 뒤로는 잡이 재실행되지 않음)
+        cutoff = time.time() - max_age
+        conn = self._connect()
+        conn.execute("DELETE FROM webhook_outbox WHERE status!=? AND updated_at<?", (PENDING, cutoff))
+        conn.execute(
+            "DELETE FROM webhook_sequences WHERE updated_at<? AND NOT EXISTS"
+            " (SELECT 1 FROM webhook_outbox o WHERE o.job_id=webhook_sequences.job_id AND o.url=webhook_sequences.url)",
+            (cutoff,),
+        )
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    # full jitter 지수 백오프. 수신 측이 Retry-After를 주면 그 값을 하한으로 사용
+    delay = random.uniform(0, min(WEBHOOK_RETRY_MAX_DELAY, WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, WEBHOOK_RETRY_MAX_DELAY))
+    return delay
+
+
+class OutboxDispatcher:
+    # 아웃박스를 비우는 비동기 전송기 (전용 이벤트 루프 스레드 + 공유 커넥션 풀)
+    # 렌더링 워커는 콜백을 기록만 하고 바로 다음 잡으로 넘어가므로, 수신 서버가 느리거나 내려가도 워커가 묶이지 않는다.
+
+    def __init__(self, store: OutboxStore, poll_interval: float = WEBHOOK_OUTBOX_POLL_INTERVAL,
+                 destination_concurrency: int = WEBHOOK_DESTINATION_CONCURRENCY):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.destination_concurrency = destination_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._deliveries: set = set()
+        self._limits: dict = {}  # 수신 서버(host:port) → 동시 전송 제한
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            try:
+                self.store.prune()
+            except Exception as e:
+                logging.error(f"Error pruning webhook outbox: {e}")
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._client = http_client.create_async_client()
+                self._wakeup = asyncio.Event()
+                self._runner = loop.create_task(self._run())
+                ready.set()
+                loop.run_forever()
+
+            thread = threading.Thread(target=run, name="webhook-outbox", daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+            logging.info(f"Webhook outbox dispatcher started (path: {self.store.path}, batch max: {WEBHOOK_BATCH_MAX})")
+
+    def stop(self, timeout: float = 10):
+        # 진행 중인 전송은 timeout까지 기다리고, 못 끝낸 콜백은 리스가 지나면 다음 실행 때 다시 전송
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None:
+                return
+
+            async def shutdown():
+                self._runner.cancel()
+                if self._deliveries:
+                    await asyncio.wait(self._deliveries, timeout=timeout)
+                await self._client.aclose()
+
+            try:
+                asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=timeout + 5)
+            except Exception as e:
+                logging.error(f"Error stopping webhook outbox dispatcher: {e}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+            self._loop, self._thread, self._client = None, None, None
+            logging.info("Webhook outbox dispatcher stopped")
+
+    def wake(self):
+        # 새 콜백이 기록됐을 때 다음 확인 주기를 기다리지 않고 바로 전송
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                for items in await asyncio.to_thread(self.store.claim):
+                    task = asyncio.ensure_future(self._deliver(items))
+                    self._deliveries.add(task)
+                    task.add_done_callback(self._deliveries.discard)
+            except Exception as e:
+                logging.error(f"Error claiming webhook callbacks: {type(e).__name__}: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _limit(self, url: str) -> asyncio.Semaphore:
+        destination = urlsplit(url).netloc
+        limit = self._limits.get(destination)
+        if limit is None:
+            limit = self._limits[destination] = asyncio.Semaphore(self.destination_concurrency)
+        return limit
+
+    async def _deliver(self, items: list):
+        if len(items) == 1:
+            url, body = items[0]["url"], items[0]["payload"]
+        else:
+            # 여러 일기의 웹툰 콜백은 /webtoon/batch 콜백과 같은 형식으로 묶음
+            url, body = items[0]["batchUrl"], {"batchId": uuid.uuid4().hex, "webtoons": [item["payload"] for item in items], "failed": []}
+        ids = [item["id"] for item in items]
+        attempt = max(item["attempts"] for item in items) + 1
+        # 수신 측 장애로 회로가 열려 있으면 시도 횟수를 쓰지 않고 회로가 다시 열릴 때까지 미룸
+        breaker = resilience.webhook.breaker
+        try:
+            breaker.allow()
+        except resilience.CircuitOpenError as e:
+            metrics.dependency_call('webhook', 'rejected')
+            await asyncio.to_thread(self.store.defer, ids, max(e.retry_in, self.poll_interval))
+            return
+
+        try:
+            async with self._limit(url):
+                started = time.perf_counter()
+                error, retry_after, retryable = None, None, True
+                try:
+                    response = await self._client.post(url, json=body, headers=items[0]["headers"])
+                    if response.status_code >= 300:
+                        error = f"Webhook returned {response.status_code}"
+                        retry_after = resilience.parse_retry_after(response.headers.get('retry-after'))
+                        retryable = response.status_code in resilience.RETRYABLE_STATUS_CODES
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                metrics.observe('webhook', time.perf_counter() - started)
+        except asyncio.CancelledError:
+            # 종료 중에 취소된 전송은 결과를 모르므로 회로의 시험 기회만 돌려줌 (콜백은 리스가 지나면 다시 전송)
+            breaker.release()
+            raise
+        # 거절(4xx)은 수신 측 장애로 보지 않음
+        if retryable and error is not None:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if error is None:
+            metrics.dependency_call('webhook', 'success')
+            logging.info(f"Webhook delivered to {url} ({len(items)} callbacks, attempt {attempt})")
+            await asyncio.to_thread(self._record, items, 'webhook_delivered', self.store.delivered, ids)
+            return
+
+        delay = retry_delay(attempt, retry_after) if retryable else None
+        dead = await asyncio.to_thread(self.store.failed, ids, error, delay)
+        if dead:
+            metrics.dependency_call('webhook', 'failure')
+            metrics.failure('webhook')
+            logging.error(f"Webhook to {url} gave up after {attempt} attempts ({len(items)} callbacks): {error}")
+            await asyncio.to_thread(self._record, items, 'webhook_failed', None, error=error, attempts=attempt)
+        else:
+            metrics.dependency_call('webhook', 'retry')
+            logging.error(f"Webhook to {url} failed (attempt {attempt}/{WEBHOOK_MAX_ATTEMPTS}), retrying in {delay:.1f}s: {error}")
+
+    @staticmethod
+    def _record(items: list, stage: str, update=None, *args, **data):
+        # 전송 결과를 아웃박스와 잡 레지스트리에 기록
+        # 콜백은 잡 결과보다 먼저 기록되므로 결과 저장 전에 전송이 끝날 수 있음: 잡 상태는 바꾸지 않고 이벤트만 추가
+        # 진행 중에 보내는 이벤트 콜백(event_key가 있는 것)은 레지스트리에 기록하지 않음
+        if update:
+            update(*args)
+        for item in items:
+            if not item["jobId"] or item["eventKey"]:
+                continue
+            try:
+                job_registry.registry.note(item["jobId"], stage, **data)
+            except Exception as e:
+                logging.error(f"Error reporting {stage} for job {item['jobId']}: {e}")
+
+
+# 프로세스 전체에서 공유하는 아웃박스와 전송기
+outbox = OutboxStore()
+dispatcher = OutboxDispatcher(outbox)
+
+
+def enqueue(url: str, payload: dict, job_id: Optional[str] = None, batch_url: Optional[str] = None,
+            headers: Optional[dict] = None, event_key: str = '', sequenced: bool = False):
+    # 잡 결과 콜백을 기록하고 전송기를 깨움 (이 프로세스에서 전송기가 돌지 않으면 다른 프로세스가 전송)
+    if outbox.add(url, payload, job_id, batch_url, headers, event_key, sequenced):
+        logging.info(f"Webhook to {url} recorded in outbox (job {job_id}{', ' + event_key if event_key else ''})")
+    dispatcher.wake()
@@ -0,0 +1,176 @@
+import logging
+import os
+import signal
+import threading
+import time
+import traceback
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import job_queue
+import job_registry
+import job_control
+import metrics
+import model_registry
+import tracing
+import workspace
+import http_client
+import pipeline
+import prediction_manager
+import webhook_outbox
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 워커 설정
+WORKER_CONCURRENCY = max(1, int(os.getenv('WORKER_CONCURRENCY', 4)))  # 동시에 처리할 잡 개수 (잡마다 작업 디렉터리가 분리되어 있음)
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 300))  # 가시성 타임아웃
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 30))
+
+# 잡 종류별 처리 함수
+HANDLERS = {
+    'profile': pipeline.process_profile_background,
+    'webtoon': pipeline.process_webtoon_background,
+    'webtoon_batch': pipeline.process_webtoon_batch,
+}
+
+
+class Worker:
+    # 큐에서 잡을 꺼내 처리하는 스레드 풀
+    # 처리 중에는 리스를 주기적으로 연장하고, 끝나면 ack, 예외가 나면 지연 후 재시도(nack)
+
+    def __init__(self, queue: job_queue.JobQueue, concurrency: int = WORKER_CONCURRENCY,
+                 lease_seconds: float = JOB_LEASE_SECONDS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stopping.clear()
+        for n in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Worker started (concurrency: {self.concurrency}, lease: {self.lease_seconds}s)")
+
+    def stop(self, timeout: Optional[float] = None):
+        # 진행 중인 잡은 끝까지 처리하고 종료
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logging.info("Worker stopped")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.dequeue(self.lease_seconds)
+            except Exception as e:
+                logging.error(f"Error dequeuing job: {type(e).__name__}: {e}")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def process(self, job: job_queue.Job):
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            logging.error(f"Unknown job kind: {job.kind} ({job.id})")
+            self.queue.nack(job.id, error=f"unknown job kind {job.kind}", delay=JOB_RETRY_DELAY)
+            return
+
+        # 큐에 있는 동안 취소된 잡은 처리하지 않음
+        canceled = job_registry.registry.cancel_requests([job.id])
+        if job.id in canceled:
+            logging.info(f"Skipping canceled job {job.id} ({job.kind}): {canceled[job.id]}")
+            self.queue.ack(job.id)
+            job_registry.registry.cancel(job.id, canceled[job.id])
+            return
+
+        # 잡이 끝날 때까지 리스 연장
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    self.queue.extend(job.id, self.lease_seconds)
+                except Exception as e:
+                    logging.error(f"Error extending lease for job {job.id}: {e}")
+
+        keeper = threading.Thread(target=heartbeat, name=f"lease-{job.id}", daemon=True)
+        keeper.start()
+        if job.enqueued_at:
+            metrics.queue_wait(job.priority_class, job.kind, time.time() - job.enqueued_at)
+        logging.info(f"Processing job {job.id} ({job.kind}, {job.priority_class}, attempt {job.attempts})")
+        job_registry.registry.emit(job.id, 'started', attempt=job.attempts)
+        # API 요청에서 이어지는 트레이스 컨텍스트는 핸들러 인자가 아니므로 분리
+        payload = dict(job.payload)
+        parent = tracing.extract(payload.pop(tracing.PAYLOAD_KEY, None))
+        style = payload.get('characterStyle')
+        try:
+            with tracing.span(f"job {job.kind}", context=parent, **{
+                "job.id": job.id, "job.attempt": job.attempts, "member.id": payload.get('memberId'), "character_style": style,
+            }), metrics.job(job.kind, style), workspace.manager.open(job.id), job_control.control.job(
+                job.id, job.kind, last_attempt=job.attempts >= self.queue.max_attempts):
+                handler(**payload, job_id=job.id)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logging.error(f"Job {job.id} failed: {error}\n{traceback.format_exc()}")
+            self.queue.nack(job.id, error=error, delay=JOB_RETRY_DELAY)
+            if job.attempts >= self.queue.max_attempts:
+                metrics.failure('job', style)
+                job_registry.registry.fail(job.id, error)
+            else:
+                metrics.retry(job.kind, style)
+                job_registry.registry.emit(job.id, 'retry_scheduled', attempt=job.attempts, error=error)
+        else:
+            self.queue.ack(job.id)
+            logging.info(f"Job {job.id} done")
+        finally:
+            done.set()
+            keeper.join()
+
+
+if __name__ == "__main__":
+    for handler in logging.root.handlers[:]:
+        logging.root.removeHandler(handler)
+
+    # 로깅 설정
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s',
+        handlers=[
+            logging.FileHandler("worker.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+    tracing.setup()
+    http_client.startup()
+    prediction_manager.manager.start()
+    webhook_outbox.dispatcher.start()
+    model_registry.registry.warm()
+    workspace.manager.sweep((pipeline.UPLOAD_FOLDER,))
+    metrics.start_server()
+    worker = Worker(job_queue.queue)
+    worker.start()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    stopping.wait()
+
+    worker.stop()
+    webhook_outbox.dispatcher.stop()
+    prediction_manager.manager.stop()
+    http_client.shutdown()
+    tracing.shutdown()
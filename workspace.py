@@ -0,0 +1,132 @@
+import contextvars
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+# 로컬 개발 환경에서만 .env 파일을 로드
+dotenv_path = '.env'
+if os.path.exists(dotenv_path):
+    load_dotenv(dotenv_path=dotenv_path)
+
+# 잡별 작업 디렉터리 설정
+WORKSPACE_ROOT = os.getenv('WORKSPACE_ROOT', './workspaces')
+WORKSPACE_QUOTA_BYTES = int(os.getenv('WORKSPACE_QUOTA_BYTES', 200 * 1024 * 1024))  # 잡 하나가 동시에 디스크에 둘 수 있는 양
+WORKSPACE_ORPHAN_AGE = float(os.getenv('WORKSPACE_ORPHAN_AGE', 24 * 3600))  # 시작 시 이보다 오래된 남은 파일은 삭제
+
+# 이 프로세스 실행마다 새로 정하는 ID. 작업 디렉터리 이름에 붙여서 같은 루트를 쓰는 다른 프로세스와 겹치지 않게 함
+# (프로세스 ID는 컨테이너마다 1이거나 재시작 후 재사용되어 구분에 쓸 수 없음)
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
+# 현재 스레드가 처리 중인 잡의 작업 디렉터리 (패널 스레드로는 컨텍스트를 복사해서 전달)
+current_workspace = contextvars.ContextVar('current_workspace', default=None)
+
+
+class WorkspaceQuotaError(RuntimeError):
+    pass
+
+
+class Workspace:
+    # 잡 하나가 쓰는 임시 디렉터리. 같은 잡 안의 파일만 두므로 파일 이름이 다른 잡과 겹치지 않는다.
+
+    def __init__(self, path: str, quota: int):
+        self.path = path
+        self.quota = quota
+        self.used = 0
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, os.path.basename(name))
+
+    def write(self, name: str, data: bytes) -> str:
+        # 할당량을 넘으면 쓰지 않고 WorkspaceQuotaError
+        path = self.file(name)
+        with self._lock:
+            used = self.used - self._sizes.get(path, 0) + len(data)
+            if used > self.quota:
+                raise WorkspaceQuotaError(f"Workspace {self.path} quota exceeded ({used} > {self.quota} bytes)")
+            self.used = used
+            self._sizes[path] = len(data)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def remove(self, path: str):
+        with self._lock:
+            self.used -= self._sizes.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class WorkspaceManager:
+    # 잡별 작업 디렉터리를 만들고, 잡이 끝나면(성공/실패 모두) 지운다.
+    # 프로세스가 죽어 남은 디렉터리는 WORKSPACE_ORPHAN_AGE가 지난 뒤 sweep으로 정리한다.
+    # 다른 프로세스가 살아 있는지는 알 수 없으므로(PID 네임스페이스가 다를 수 있음) 나이로만 판단하고, 이 프로세스가 연 디렉터리는 건너뛴다.
+
+    def __init__(self, root: str = WORKSPACE_ROOT, quota: int = WORKSPACE_QUOTA_BYTES, instance_id: str = INSTANCE_ID):
+        self.root = root
+        self.quota = quota
+        self.instance_id = instance_id
+        self._open = set()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def open(self, job_id: Optional[str] = None):
+        name = f"{self.instance_id}-{re.sub(r'[^a-zA-Z0-9_-]', '', job_id or '') or uuid.uuid4().hex}"
+        workspace = Workspace(os.path.join(self.root, name), self.quota)
+        with self._lock:
+            self._open.add(name)
+        os.makedirs(workspace.path, exist_ok=True)
+        token = current_workspace.set(workspace)
+        try:
+            yield workspace
+        finally:
+            current_workspace.reset(token)
+            shutil.rmtree(workspace.path, ignore_errors=True)
+            with self._lock:
+                self._open.discard(name)
+
+    def sweep(self, folders: tuple = (), max_age: float = WORKSPACE_ORPHAN_AGE):
+        # 시작 시 호출: max_age보다 오래 손대지 않은 작업 디렉터리와, folders 안의 오래된 파일(예: 잡이 끝내 실패한 업로드)을 삭제
+        now = time.time()
+        removed = 0
+        with self._lock:
+            in_use = set(self._open)
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name in in_use:
+                continue
+            if now - entry.stat().st_mtime > max_age:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            for entry in os.scandir(folder):
+                if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError as e:
+                        logging.error(f"Error removing orphaned file {entry.path}: {e}")
+        if removed:
+            logging.info(f"Workspace sweep removed {removed} orphaned entries")
+
+
+def current() -> Optional[Workspace]:
+    return current_workspace.get()
+
+
+# 프로세스 전체에서 공유하는 매니저
+manager = WorkspaceManager()